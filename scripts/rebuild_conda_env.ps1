@@ -78,4 +78,7 @@ poetry install
 #poetry install -E cuda
 #poetry install -E dml
 
+Write-Host "Warming template ROI cache from assets/screenshot..."
+python -m src.util.roi_cache_util
+
 Write-Host "`nInstallation completed."
@@ -1,8 +1,12 @@
 import logging
 import os
 import traceback
-import winreg
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Literal
+
+try:
+    import winreg
+except ImportError:  # 非Windows平台，只能以回放模式运行
+    winreg = None
 
 from omegaconf import OmegaConf
 from pydantic import BaseModel, Field
@@ -19,7 +23,31 @@ class AppConfig(BaseModel):
     AppPath: Optional[str] = Field(None, title="游戏路径")
     # ModelName: Optional[str] = Field("yolo", title="模型的名称,默认是yolo.onnx")
     OcrInterval: float = Field(0.5, title="OCR间隔时间", ge=0)
+    OcrFrameDiff: bool = Field(False, title="画面没有变化时跳过OCR，复用上次识别结果")
+    OcrFrameDiffThreshold: float = Field(1.0, title="画面变化阈值，分块平均灰度差超过即视为变化", ge=0)
+    OcrIncremental: bool = Field(False, title="分块增量OCR，只重新识别画面变化的区域")
+    OcrIncrementalMargin: int = Field(16, title="增量OCR变化区域外扩像素", ge=0)
     GameMonitorTime: int = Field(5, title="游戏窗口检测间隔时间")
+    FrameBus: bool = Field(False, title="多个任务同时运行时共用一个截图进程，通过共享内存读取画面")
+    FrameBusSlots: int = Field(4, title="帧总线环形槽位数", ge=2)
+    FrameBusFps: float = Field(30, title="帧总线截图帧率上限", gt=0)
+    FrameBusMaxAge: float = Field(1.0, title="帧总线画面最大延迟秒数，超过则回退为自行截图", gt=0)
+    OrtIntraOpThreads: int = Field(0, title="onnxruntime算子内线程数，0为默认（物理核数）", ge=0)
+    OrtInterOpThreads: int = Field(0, title="onnxruntime算子间线程数，0为默认，仅并行执行模式有效", ge=0)
+    OrtGraphOptimizationLevel: Literal["disable", "basic", "extended", "all"] = Field(
+        "all", title="onnxruntime图优化级别")
+    OrtExecutionMode: Literal["sequential", "parallel"] = Field("sequential", title="onnxruntime执行模式")
+    OrtCpuMemArena: bool = Field(True, title="onnxruntime CPU内存池")
+    OrtMemPattern: bool = Field(True, title="onnxruntime按固定输入尺寸预先规划内存")
+    OrtSaveOptimizedModel: bool = Field(False, title="将onnxruntime优化后的模型保存到temp目录")
+    OrtModelCache: bool = Field(True, title="缓存onnxruntime优化后的模型，加快任务启动")
+    YoloSessionMemory: int = Field(512, title="YOLO模型会话内存预算MB，超出时淘汰最久未用的模型", ge=0)
+    CapturePipeline: bool = Field(False, title="刷boss时后台线程截取下一帧，与当前帧的识别同时进行")
+    TickScheduler: bool = Field(True, title="刷boss时按状态限制帧率，画面不变时降低，操作后提高")
+    TickMinFps: float = Field(3.0, title="画面长时间不变时降到的最低帧率", gt=0)
+    Metrics: bool = Field(False, title="统计每帧各阶段耗时，定时汇总到主进程并输出日志")
+    MetricsInterval: float = Field(5.0, title="每帧耗时统计发送间隔秒数", gt=0)
+    TimeitLog: bool = Field(False, title="逐次输出函数耗时日志")
     # project_root: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     # LogFilePath: Optional[str] = Field(None, title="日志文件路径")
 
@@ -97,6 +125,8 @@ class AppConfig(BaseModel):
 
 
 def get_wuthering_waves_path():
+    if winreg is None:
+        return None
     key = None
     # 打开注册表项
     # key_path = r"SOFTWARE\WOW6432Node\Microsoft\Windows\CurrentVersion\Uninstall\KRInstall Wuthering Waves"
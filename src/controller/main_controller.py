@@ -1,7 +1,16 @@
 import logging
+import os
+import secrets
+import threading
 import time
 from enum import Enum
+import multiprocessing
 from multiprocessing import Event, Lock
+from multiprocessing.queues import Queue
+from typing import Any
+
+from src.util import metrics_util
+from src.util.frame_bus_util import ENV_FRAME_BUS_NAME
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +21,14 @@ class TaskOpsEnum(Enum):
 
 
 class MainController:
+    # 需要截图的任务，开启帧总线时共用一个截图进程
+    CAPTURE_TASKS = [
+        "AutoBossProcessTask",
+        "AutoPickupProcessTask",
+        "AutoStorySkipProcessTask",
+        "AutoStoryEnjoyProcessTask",
+        "DailyActivityProcessTask",
+    ]
 
     def __init__(self):
         from src.core.tasks import MouseResetProcessTask, AutoBossProcessTask, AutoPickupProcessTask, \
@@ -27,6 +44,12 @@ class MainController:
         }
         self.running_tasks: dict[str, tuple[ProcessTask, Event]] = {}
         self._lock: Lock = Lock()
+        self._frame_bus_name: str | None = None
+        self._frame_bus_task: tuple[ProcessTask, Event] | None = None
+        # 任务进程定时发来的每帧耗时统计，按任务名保留最新一份
+        self._metrics_queue: Queue | None = None
+        self._metrics: dict[str, dict[str, Any]] = {}
+        self._metrics_lock = threading.Lock()
 
     def execute(self, task_name: str, task_ops: str):
         logger.debug("task_name: %s, task_ops: %s", task_name, task_ops)
@@ -42,7 +65,12 @@ class MainController:
                 kwargs = {}
                 if task_name == "AutoStorySkipProcessTask":
                     kwargs["SKIP_IS_OPEN"] = "True"
-                task = task_builder.build(args=(stop_event,), kwargs=kwargs, daemon=True).start()
+                if task_name in self.CAPTURE_TASKS and (frame_bus_name := self._start_frame_bus()):
+                    kwargs[ENV_FRAME_BUS_NAME] = frame_bus_name
+                task_kwargs = dict(kwargs)
+                if task_name in self.CAPTURE_TASKS and (metrics_queue := self._get_metrics_queue()):
+                    task_kwargs["metrics_queue"] = metrics_queue
+                task = task_builder.build(args=(stop_event,), kwargs=task_kwargs, daemon=True).start()
                 self.running_tasks[task_name] = (task, stop_event)
                 if task_name in ["AutoBossProcessTask", "DailyActivityProcessTask"]:
                     from src.core.tasks import MouseResetProcessTask
@@ -65,11 +93,76 @@ class MainController:
                     # stop_event.set()
                     task.stop()
                     self.running_tasks.pop("MouseResetProcessTask")
+                if not any(name in self.running_tasks for name in self.CAPTURE_TASKS):
+                    self._stop_frame_bus()
                 logger.info("任务已停止: %s", task_name)
                 return True, "任务已停止"
             else:
                 raise NotImplementedError(f"不支持的类型{task_ops}")
 
+    def _get_metrics_queue(self) -> Queue | None:
+        """开启每帧耗时统计时创建队列，多个任务共用；未开启返回None"""
+        from src.config.app_config import AppConfig
+
+        app_config = AppConfig.build()
+        if self._metrics_queue is None and app_config.Metrics:
+            # 队列满时任务进程丢弃快照，不会阻塞
+            self._metrics_queue = multiprocessing.Queue(maxsize=64)
+            # 定时取出快照并输出日志，界面没有读取时队列也不会堆满
+            threading.Thread(target=self._metrics_log_loop, args=(app_config.MetricsInterval,),
+                             name="MetricsLog", daemon=True).start()
+        return self._metrics_queue
+
+    def _metrics_log_loop(self, interval: float):
+        logged: dict[str, float] = {}
+        while True:
+            time.sleep(interval)
+            for task, snapshot in list(self.get_metrics().items()):
+                if logged.get(task) != snapshot["time"]:
+                    logged[task] = snapshot["time"]
+                    logger.info("每帧耗时 %s", metrics_util.to_text(snapshot))
+
+    def get_metrics(self) -> dict[str, dict[str, Any]]:
+        """各任务最新的每帧耗时统计：任务名 -> 快照"""
+        with self._metrics_lock:
+            if self._metrics_queue is not None:
+                metrics_util.drain(self._metrics_queue, self._metrics)
+            return dict(self._metrics)
+
+    def get_metrics_json(self) -> str:
+        return metrics_util.to_json(self.get_metrics())
+
+    def get_metrics_prometheus(self) -> str:
+        return metrics_util.to_prometheus(self.get_metrics())
+
+    def _start_frame_bus(self) -> str | None:
+        """按需开启帧总线截图进程，已开启则复用，返回共享内存名称；未启用帧总线返回None"""
+        from src.config.app_config import AppConfig
+        from src.core.tasks import FrameBusProcessTask
+
+        if self._frame_bus_task is not None:
+            return self._frame_bus_name
+        app_config = AppConfig.build()
+        if not app_config.FrameBus:
+            return None
+        # 共享内存由截图进程按截到的窗口大小创建，任务进程按名称连接，连不上时先自行截图
+        self._frame_bus_name = f"wwa_frame_bus_{os.getpid()}_{secrets.token_hex(4)}"
+        stop_event = Event()
+        kwargs = {ENV_FRAME_BUS_NAME: self._frame_bus_name}
+        task = FrameBusProcessTask.build(args=(stop_event,), kwargs=kwargs, daemon=True).start()
+        self._frame_bus_task = (task, stop_event)
+        logger.info("帧总线已开启: %s", self._frame_bus_name)
+        return self._frame_bus_name
+
+    def _stop_frame_bus(self):
+        if self._frame_bus_task is not None:
+            task, stop_event = self._frame_bus_task
+            stop_event.set()
+            task.stop()
+            self._frame_bus_task = None
+            self._frame_bus_name = None
+            logger.info("帧总线已关闭")
+
 
 if __name__ == '__main__':
     from src.config import logging_config
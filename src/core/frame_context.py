@@ -0,0 +1,62 @@
+"""
+每帧上下文
+
+一帧画面在一次处理中会被多个页面、多个模板、OCR与YOLO反复使用，缩放图、灰度图、RGB图只在第一次用到时计算一次，之后共用。
+由 ImgService.capture_frame 创建时，原图与缩放图都是轮流复用的缓冲区，之后几次截图会覆盖它们；
+本帧需要跨越多次截图使用时（如执行了会截图的页面动作后继续匹配其他页面），先调用 detach 复制一份。
+"""
+from typing import Callable
+
+import numpy as np
+
+from src.util import img_util
+
+
+class FrameContext:
+    """一帧画面及其派生图片，只在一次处理中使用，画面变化后需新建"""
+
+    def __init__(self, src_img: np.ndarray, img: np.ndarray | None = None,
+                 resizer: Callable[[np.ndarray], np.ndarray] | None = None):
+        """
+        :param src_img: 原图截图
+        :param img: 缩放到标准尺寸的截图，为None时首次使用时由 resizer 缩放，没有 resizer 时与原图相同
+        :param resizer: 原图缩放到标准尺寸
+        """
+        self.src_img: np.ndarray = src_img
+        self._img: np.ndarray | None = img
+        self._resizer = resizer
+        self._gray: np.ndarray | None = None
+        self._rgb: np.ndarray | None = None
+        self._detached = False
+
+    @property
+    def img(self) -> np.ndarray:
+        """缩放到标准尺寸的截图，OCR、页面匹配使用"""
+        if self._img is None:
+            self._img = self.src_img if self._resizer is None else self._resizer(self.src_img)
+        return self._img
+
+    @property
+    def gray(self) -> np.ndarray:
+        """缩放图的灰度图"""
+        if self._gray is None:
+            self._gray = img_util.bgr2gray(self.img)
+        return self._gray
+
+    @property
+    def rgb(self) -> np.ndarray:
+        """缩放图的RGB图"""
+        if self._rgb is None:
+            self._rgb = img_util.bgr2rgb(self.img)
+        return self._rgb
+
+    def detach(self):
+        """复制原图与缩放图，之后的截图不会再覆盖本帧；已生成的灰度图、RGB图是新数组，无需复制；重复调用不会再复制"""
+        if self._detached:
+            return
+        self._detached = True
+        img = self.img
+        src_img = self.src_img.copy()
+        self._img = src_img if img is self.src_img else img.copy()
+        self.src_img = src_img
+        self._resizer = None
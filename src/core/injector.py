@@ -85,9 +85,31 @@ class Container(containers.DeclarativeContainer):
         super().__init__(**kwargs)
 
     @staticmethod
-    def build(context: Context) -> "Container":
+    def build(context: Context, replay_path: str | None = None, realtime: bool = False) -> "Container":
+        """
+        :param context: 上下文
+        :param replay_path: 回放模式，录制画面的图片目录或视频，窗口、截图、键鼠替换为回放实现，无需游戏窗口
+        :param realtime: 回放模式下按实时取帧，流程慢时跳帧，否则每次截图取下一帧
+        """
         container = Container()
         container.context.override(providers.Object(context))
+        if replay_path is not None:
+            Container._override_replay(container, replay_path, realtime)
         context._container = container
         container.init_resources()
         return container
+
+    @staticmethod
+    def _override_replay(container: "Container", replay_path: str, realtime: bool):
+        from src.service.replay_service import ReplayWindowService, ReplayImgService, RecordingControlService
+        from src.util.replay_util import ReplayFrames
+
+        logger.info("回放模式: %s", replay_path)
+        frames = ReplayFrames(replay_path, realtime=realtime)
+        container.window_service.override(providers.Singleton(
+            ReplayWindowService, context=container.context, frames=frames))
+        container.img_service.override(providers.Singleton(
+            ReplayImgService, context=container.context, window_service=container.window_service, frames=frames))
+        container.control_service.override(providers.Singleton(
+            RecordingControlService, context=container.context, window_service=container.window_service,
+            frames=frames, sleep=realtime))
@@ -4,8 +4,9 @@ from enum import Enum
 
 import numpy as np
 
+from src.core.frame_context import FrameContext
 from src.core.pages import Page, ConditionalAction
-from src.core.regions import Position, TextPosition, DynamicPosition
+from src.core.regions import Position, TextPosition, DynamicPosition, OcrResults
 
 
 class WindowService(ABC):
@@ -59,20 +60,57 @@ class ImgService(ABC):
 
     @abstractmethod
     def screenshot(self, region: tuple[float, float, float, float] | DynamicPosition | None = None) -> np.ndarray:
+        """
+        截图
+        :param region: 百分比区域，默认整个客户区
+        :return: BGR图片；后台截图时为截图器轮流复用的只读缓冲，只在下一次同尺寸截图前有效，需要保留时自行复制
+        """
+        pass
+
+    @abstractmethod
+    def screenshot_region(self, region: tuple[float, float, float, float] | DynamicPosition | None = None
+                          ) -> tuple[np.ndarray, Position]:
+        """
+        只截取指定区域
+        :param region: 百分比区域，默认整个客户区
+        :return: (区域图片, 区域在完整截图中的像素坐标)，区域内坐标加上 x1/y1 即为完整截图坐标；图片有效期同 screenshot
+        """
         pass
 
     @abstractmethod
     def set_capture_mode(self, capture_mode: CaptureEnum):
         pass
 
+    @abstractmethod
+    def capture_frame(self, src_img: np.ndarray | None = None) -> FrameContext:
+        """
+        本帧上下文，同一帧的各处理共用，缩放图在首次使用时写入预分配的缓冲区
+        :param src_img: 已截取的原图，为None时截图
+        """
+        pass
+
     @abstractmethod
     def match_template(self,
-                       img: np.ndarray | None,
+                       img: np.ndarray | FrameContext | None,
                        template_img: np.ndarray | str,
                        region: tuple[int, int, int, int] | None = None,
                        threshold: float = 0.8) -> None | Position:
         pass
 
+    @abstractmethod
+    def match_templates(self,
+                        img: np.ndarray | FrameContext | None,
+                        template_imgs: list[np.ndarray | str],
+                        region: tuple[int, int, int, int] | None = None,
+                        threshold: float = 0.8,
+                        scale: float = 1.0) -> list[Position | None]:
+        """
+        同一帧匹配多个模板，灰度图只转换一次
+        :param scale: 模板缩放比例，匹配未缩放到标准尺寸的截图时使用 template_match_util.client_scale
+        :return: 与 template_imgs 一一对应，低于阈值的为None
+        """
+        pass
+
     def resize(self, img: np.ndarray) -> np.ndarray:
         return self.resize_by_weight(img)
 
@@ -99,7 +137,10 @@ class ODService(ABC):
     """Object Detection（目标检测）"""
 
     @abstractmethod
-    def search_echo(self, img: np.ndarray | None = None) -> list[int, int, int, int] | None:
+    def search_echo(self, img: np.ndarray | FrameContext | None = None) -> list[int, int, int, int] | None:
+        """
+        :param img: 原图截图，传入帧上下文时使用其原图，为None时截图
+        """
         pass
 
     # @abstractmethod
@@ -107,7 +148,7 @@ class ODService(ABC):
     #     pass
 
     @abstractmethod
-    def search_reward(self, img: np.ndarray | None = None) -> tuple[int, int, int, int] | None:
+    def search_reward(self, img: np.ndarray | FrameContext | None = None) -> tuple[int, int, int, int] | None:
         pass
 
 
@@ -123,8 +164,11 @@ class OCRService(ABC):
         pass
 
     @abstractmethod
-    def find_text(self, targets: str | list[str], img: np.ndarray | None = None,
+    def find_text(self, targets: str | list[str], img: np.ndarray | FrameContext | None = None,
                   position: Position | DynamicPosition | None = None) -> TextPosition | None:
+        """
+        :param img: 原图截图，传入帧上下文时使用其原图，为None时截图
+        """
         pass
 
     # @abstractmethod
@@ -135,11 +179,38 @@ class OCRService(ABC):
     @abstractmethod
     def wait_text(self, targets: str | list[str], timeout: int = 3,
                   position: Position | DynamicPosition | None = None, wait_time: float = 0.1) -> TextPosition | None:
+        """
+        持续取帧，直到识别到任意一个文本
+        :param wait_time: 画面一直在变时两次识别的最短间隔秒数，画面稳定后只识别一次
+        :return: 原图坐标的文本位置，超时返回None
+        """
         pass
 
     @abstractmethod
     def ocr(self, img: np.ndarray, position: Position | DynamicPosition | None = None,
-            det=True, rec=True, cls=False) -> list[TextPosition]:
+            det=True, rec=True, cls=False) -> OcrResults:
+        pass
+
+    @abstractmethod
+    def rec(self, img: np.ndarray, positions: list[Position | DynamicPosition]) -> list[TextPosition]:
+        """
+        只识别不检测，适用于位置固定的单行文本，各区域裁剪后一次批量识别
+        :param img: 完整截图
+        :param positions: 文本所在区域
+        :return: 识别到文本的区域，坐标为区域在截图中的坐标
+        """
+        pass
+
+    @abstractmethod
+    def ocr_many(self, img: np.ndarray, positions: list[Position | DynamicPosition],
+                 det: bool = True) -> list[list[TextPosition]]:
+        """
+        同一张截图的多个区域一次识别，代替对每个区域分别调用 ocr
+        :param img: 完整截图
+        :param positions: 识别区域
+        :param det: True 各区域拼成一张图做一次检测+识别；False 只识别不检测，各区域一次批量识别
+        :return: 与 positions 一一对应的识别结果，坐标为截图中的坐标
+        """
         pass
 
     @abstractmethod
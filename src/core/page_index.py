@@ -0,0 +1,239 @@
+"""
+页面索引
+
+逐个页面 is_match 时，每个页面的每个 TextMatch 都要对每条OCR结果跑一次正则，页面多时大部分都是白跑。
+索引在构建时从每个正则中提取必须出现的字面量，按首字符分桶；匹配时每条OCR文本只检查自身包含的字符所在的桶，
+字面量命中后才跑真正的正则，最后只返回所有必需目标文本都有OCR结果命中的候选页面，再交给 is_match 做区域、排除文本与图片判断。
+候选页面是能匹配上页面的超集，按原顺序返回，结果与逐个 is_match 一致。
+"""
+import logging
+import re
+import time
+from collections import defaultdict
+from re import Pattern
+
+from src.core.pages import Page
+from src.core.regions import TextPosition
+
+try:
+    import re._parser as sre_parse  # python 3.11+
+    from re._constants import AT, BRANCH, IN, LITERAL, MAX_REPEAT, MIN_REPEAT, POSSESSIVE_REPEAT, SUBPATTERN
+except ImportError:  # python 3.10
+    import sre_parse
+    from sre_constants import AT, BRANCH, IN, LITERAL, MAX_REPEAT, MIN_REPEAT, SUBPATTERN
+
+    POSSESSIVE_REPEAT = None
+
+logger = logging.getLogger(__name__)
+
+
+def _best(options: list[set[str]]) -> set[str] | None:
+    """多个必需条件中挑最有区分度的：最短字面量最长的那个"""
+    if not options:
+        return None
+    return max(options, key=lambda literals: (min(len(i) for i in literals), -len(literals)))
+
+
+def _required_literals(parsed) -> set[str] | None:
+    """
+    从解析后的正则中提取必需字面量
+    :return: 字面量集合，匹配成功的文本至少包含其中一个；无法提取时返回None
+    """
+    options: list[set[str]] = []
+    run: list[str] = []
+
+    def end_run():
+        if run:
+            options.append({"".join(run)})
+            run.clear()
+
+    for op, av in parsed:
+        if op is LITERAL:
+            run.append(chr(av))
+            continue
+        if op is AT:  # ^ $ \b 等不占字符，不打断连续字面量
+            continue
+        end_run()
+        if op is SUBPATTERN:
+            if (literals := _required_literals(av[-1])) is not None:
+                options.append(literals)
+        elif op is BRANCH:
+            branches = [_required_literals(branch) for branch in av[1]]
+            if all(branch is not None for branch in branches):
+                options.append(set().union(*branches))
+        elif op in (MAX_REPEAT, MIN_REPEAT, POSSESSIVE_REPEAT) and av[0] >= 1:
+            if (literals := _required_literals(av[2])) is not None:
+                options.append(literals)
+        elif op is IN and av and all(item_op is LITERAL for item_op, _ in av):
+            options.append({chr(item_av) for _, item_av in av})
+        # ANY、字符集、可选重复等不提供必需字面量
+    end_run()
+    return _best(options)
+
+
+def required_literals(pattern: Pattern) -> set[str] | None:
+    """正则的必需字面量，忽略大小写的正则返回小写字面量；名称匹配器等非正则返回None"""
+    if not isinstance(pattern, Pattern):
+        return None
+    try:
+        literals = _required_literals(sre_parse.parse(pattern.pattern, pattern.flags))
+    except Exception as e:  # 解析器为内部模块，不同版本可能有差异，提取失败就不做预筛
+        logger.debug("Extract literals failed: %s, %s", pattern.pattern, e)
+        return None
+    if literals is not None and pattern.flags & re.I:
+        literals = {i.lower() for i in literals}
+    return literals
+
+
+class PageIndex:
+    """页面索引，构建一次，每帧用OCR结果筛出候选页面"""
+
+    def __init__(self, pages: list[Page]):
+        self.pages = pages
+        # 去重后的正则
+        self._patterns: list[Pattern] = []
+        pattern_ids: dict[tuple[str, int], int] = {}
+        # 每个页面必需目标文本对应的正则下标
+        self._page_requires: list[list[int]] = []
+        for page in pages:
+            requires = []
+            for text_match in page.targetTexts:
+                if not text_match.must:
+                    continue
+                pattern = text_match.pattern
+                key = (pattern.pattern, pattern.flags) if isinstance(pattern, Pattern) else pattern
+                if (pattern_id := pattern_ids.get(key)) is None:
+                    pattern_id = pattern_ids[key] = len(self._patterns)
+                    self._patterns.append(text_match.pattern)
+                requires.append(pattern_id)
+            self._page_requires.append(requires)
+
+        # 字面量按首字符分桶：首字符 -> [(字面量, 是否忽略大小写, 正则下标)]
+        self._buckets: dict[str, list[tuple[str, bool, int]]] = defaultdict(list)
+        # 提取不出字面量的正则，每条文本都要跑
+        self._unindexed: list[int] = []
+        for pattern_id, pattern in enumerate(self._patterns):
+            literals = required_literals(pattern)
+            if not literals or "" in literals:
+                self._unindexed.append(pattern_id)
+                continue
+            ignore_case = bool(pattern.flags & re.I)
+            for literal in literals:
+                self._buckets[literal[0]].append((literal, ignore_case, pattern_id))
+        logger.debug("PageIndex pages: %s, patterns: %s, unindexed: %s",
+                     len(pages), len(self._patterns), len(self._unindexed))
+
+    def matched_patterns(self, ocr_results: list[TextPosition]) -> set[int]:
+        """有OCR结果命中的正则下标"""
+        matched: set[int] = set()
+        for ocr_result in ocr_results:
+            text = ocr_result.text.strip()  # 与 Page.text_match 一致
+            lower_text = text.lower()
+            candidates: set[int] = {i for i in self._unindexed if i not in matched}
+            for char in set(lower_text) | set(text):
+                for literal, ignore_case, pattern_id in self._buckets.get(char, ()):
+                    if pattern_id in matched or pattern_id in candidates:
+                        continue
+                    if literal in (lower_text if ignore_case else text):
+                        candidates.add(pattern_id)
+            for pattern_id in candidates:
+                if self._patterns[pattern_id].search(text):
+                    matched.add(pattern_id)
+        return matched
+
+    def candidates(self, ocr_results: list[TextPosition]) -> list[Page]:
+        """可能匹配的页面，保持原顺序；没有必需目标文本的页面总是候选"""
+        matched = self.matched_patterns(ocr_results)
+        return [page for page, requires in zip(self.pages, self._page_requires)
+                if all(pattern_id in matched for pattern_id in requires)]
+
+
+def scan(pages: list[Page], ocr_results: list[TextPosition]) -> list[Page]:
+    """逐个页面逐个文本匹配，与 is_match 的文本部分相同，用于对比"""
+    results = []
+    for page in pages:
+        for text_match in page.targetTexts:
+            if not text_match.must:
+                continue
+            if not any(text_match.pattern.search(i.text.strip()) for i in ocr_results):
+                break
+        else:
+            results.append(page)
+    return results
+
+
+def benchmark(pages: list[Page], ocr_outputs: list[list[TextPosition]], times: int = 100):
+    """对比逐个扫描与索引筛选候选页面的耗时，并校验两者结果一致"""
+    start_time = time.perf_counter()
+    page_index = PageIndex(pages)
+    build_ms = (time.perf_counter() - start_time) * 1000
+
+    for ocr_results in ocr_outputs:
+        expected = scan(pages, ocr_results)
+        actual = page_index.candidates(ocr_results)
+        if expected != actual:
+            raise AssertionError(f"Mismatch: {[i.name for i in expected]} != {[i.name for i in actual]}")
+
+    def run(func) -> float:
+        start = time.perf_counter()
+        for _ in range(times):
+            for results in ocr_outputs:
+                func(results)
+        return (time.perf_counter() - start) * 1e6 / (times * len(ocr_outputs))
+
+    scan_us = run(lambda results: scan(pages, results))
+    index_us = run(page_index.candidates)
+    print(f"pages: {len(pages)}, frames: {len(ocr_outputs)}, build: {build_ms:.2f} ms")
+    print(f"scan: {scan_us:.1f} us/frame, index: {index_us:.1f} us/frame, speedup: {scan_us / index_us:.1f}x")
+
+
+def _load_ocr_outputs() -> list[list[TextPosition]]:
+    """识别 assets/screenshot 下的截图，结果缓存到 temp 目录，避免每次都跑OCR"""
+    import json
+    from pathlib import Path
+    from src.core.regions import RapidocrPosition
+    from src.util import file_util, img_util, rapidocr_util
+
+    cache_path = Path(file_util.get_temp("page_index_ocr.json"))
+    if cache_path.exists():
+        outputs = json.loads(cache_path.read_text(encoding="utf-8"))
+    else:
+        engine = rapidocr_util.create_ocr()
+        outputs = []
+        for img_path in sorted(Path(file_util.get_assets_screenshot()).glob("*.png")):
+            img = img_util.resize_by_weight(img_util.read_img(str(img_path), alpha=False))
+            output = engine(img, use_det=True, use_rec=True, use_cls=False)
+            outputs.append([i.model_dump() for i in RapidocrPosition.format(output)])
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        cache_path.write_text(json.dumps(outputs, ensure_ascii=False), encoding="utf-8")
+    return [[RapidocrPosition(**i) for i in output] for output in outputs]
+
+
+def _build_benchmark_pages(count: int = 60) -> list[Page]:
+    """
+    页面事件服务中的全部公共页面，不足 count 个时复制页面并给正则加上不会出现的前缀补齐，
+    模拟页面很多而每帧只有个别页面能匹配的情况
+    """
+    from src.service.auto_pickup_service import AutoPickupServiceImpl
+    from src.service.page_event_service import PageEventAbstractService
+    from src.core.pages import TextMatch
+
+    # 只调用页面构建方法，页面动作不会执行，无需注入服务
+    builder = object.__new__(AutoPickupServiceImpl)
+    pages = [getattr(builder, name)() for name in dir(PageEventAbstractService) if name.startswith("build_")]
+    base_pages = list(pages)
+    copy_index = 0
+    while len(pages) < count:
+        page = base_pages[copy_index % len(base_pages)]
+        copy_index += 1
+        pages.append(Page(
+            name=f"{page.name}-{copy_index}",
+            targetTexts=[TextMatch(name=i.name, text=f"副本{copy_index}{i.pattern.pattern}", must=i.must, position=i.position)
+                         for i in page.targetTexts],
+            excludeTexts=page.excludeTexts,
+        ))
+    return pages
+
+
+if __name__ == '__main__':
+    benchmark(_build_benchmark_pages(), _load_ocr_outputs())
@@ -1,4 +1,5 @@
 import logging
+import os
 import re
 import time
 from re import Pattern
@@ -7,17 +8,25 @@ from typing import Callable, Dict, List
 import numpy as np
 from pydantic import BaseModel, Field, PrivateAttr
 
+from src.core.frame_context import FrameContext
 from src.core.languages import Languages
-from src.core.regions import Position, DynamicPosition, TextPosition, Pos
-from src.util import img_util, file_util
+from src.core.regions import Position, DynamicPosition, TextPosition, TextBox, OcrResults, Pos
+from src.util import img_util, file_util, roi_cache_util
+from src.util.name_match_util import NameMatcher
+from src.util.roi_cache_util import RoiCache
+from src.util.template_match_util import get_matcher
+from src.util.wrap_util import timeit
 
 logger = logging.getLogger(__name__)
 
 
 class TextMatch(BaseModel):
+    model_config = {"arbitrary_types_allowed": True}
+
     name: str | None = Field(None, title="文本名称，key")
-    text: str | Pattern = Field(title="文本正则",
-                                description="匹配用的，默认应传字符串，方便管理，除非特殊要求，才传入正则对象")
+    text: str | Pattern | NameMatcher = Field(title="文本正则",
+                                              description="匹配用的，默认应传字符串，方便管理，除非特殊要求，才传入正则对象；"
+                                                          "大量固定名称整行匹配时可传入名称匹配器")
     must: bool = Field(True, title="默认True必需匹配上；False表示没有也可以，不可单独使用",
                        description="False用于将尽可能需要的文本坐标放到入参集合中，减少后续的ocr次数，不能用于定位页面")
     position: DynamicPosition | None = Field(None, title="文本范围百分比坐标",
@@ -25,7 +34,10 @@ class TextMatch(BaseModel):
     open_position: bool = Field(True, title="是否开启文本范围限制，默认开启",
                                 description="可关闭，方便用于自定义实现")
 
-    pattern: Pattern = Field(None, description="真正最终用来匹配的")
+    pattern: Pattern | NameMatcher = Field(None, description="真正最终用来匹配的")
+
+    # (高, 宽) -> 文本范围像素坐标
+    _region_cache: dict[tuple[int, int], tuple[int, int, int, int]] = PrivateAttr(default_factory=dict)
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -34,6 +46,14 @@ class TextMatch(BaseModel):
         else:
             self.pattern = self.text
 
+    def region(self, height: int, width: int) -> tuple[int, int, int, int] | None:
+        """文本范围的像素坐标，按图片尺寸缓存；未限定范围时为None"""
+        if not self.open_position or self.position is None:
+            return None
+        if (region := self._region_cache.get((height, width))) is None:
+            region = self._region_cache[(height, width)] = self.position.to_tuple(height, width)
+        return region
+
 
 class ImageMatch(BaseModel):
     model_config = {"arbitrary_types_allowed": True}
@@ -46,7 +66,6 @@ class ImageMatch(BaseModel):
     open_roi_cache: bool = Field(False, title="是否开启热区缓存，只适用于绝对位置固定的图标，如全局UI图标")
 
     # 内部参数
-    roi_cache: dict[tuple, tuple[float, tuple[int, int, int, int]]] = Field(default_factory=dict)
     img: np.ndarray = Field(None, description="真正最终用来匹配的")
 
     def __init__(self, **kwargs):
@@ -56,6 +75,13 @@ class ImageMatch(BaseModel):
         else:
             self.img = self.image
 
+    @property
+    def roi_key(self) -> str:
+        """热区缓存键，缓存位置相对限定范围，同一模板限定范围不同时分别缓存"""
+        image = self.image if isinstance(self.image, str) else self.name
+        rate = self.position.rate if self.position else None
+        return f"{image}|{rate}"
+
 
 class ConditionalAction(BaseModel):
     model_config = {"arbitrary_types_allowed": True}
@@ -116,17 +142,21 @@ class Page(BaseModel):
             return self.name == other.name
         return False
 
-    # @timeit
-    def is_match(self, src_img: np.ndarray, img: np.ndarray | None, ocr_results: list[TextPosition]) -> bool:
+    @timeit(stage="page")
+    def is_match(self, src_img: np.ndarray, img: np.ndarray | None, ocr_results: list[TextPosition],
+                 frame: FrameContext | None = None) -> bool:
         """
         页面匹配
         :param src_img: 原图截图
         :param img: 缩放到标准尺寸的截图，仅在图片匹配中有用
         :param ocr_results: 识别结果
+        :param frame: 同一帧的上下文，多个页面共用灰度图；为None时按需新建
         :return: bool
         """
         # 清空匹配位置
         self.matchPositions = {}
+        if self.excludeTexts or self.targetTexts:  # 各文本共用同一份数组形式的识别结果
+            ocr_results = OcrResults.of(ocr_results)
         for text_match in self.excludeTexts:  # 遍历排除文本 如果匹配到排除文本则返回False
             if self.text_match(text_match, src_img, img, ocr_results):
                 return False
@@ -138,13 +168,15 @@ class Page(BaseModel):
                 continue
             else:
                 return False
+        if frame is None and (self.excludeImages or self.targetImages):
+            frame = FrameContext(src_img, img)
         for image_match in self.excludeImages:  # 遍历排除图片 如果匹配到排除图片则返回False
             time.sleep(0.001)  # 短暂释放CPU
-            if self.image_match(image_match, src_img, img):
+            if self.image_match(image_match, src_img, img, frame):
                 return False
         for image_match in self.targetImages:  # 遍历目标图片 如果匹配到目标图片则记录位置 否则返回False
             time.sleep(0.001)  # 短暂释放CPU
-            if position := self.image_match(image_match, src_img, img):
+            if position := self.image_match(image_match, src_img, img, frame):
                 self.matchPositions[image_match.name] = position
             else:
                 return False
@@ -164,21 +196,20 @@ class Page(BaseModel):
         h, w = img.shape[:2]
         position = None
         logger.debug("page name: %s", self.name)
-        for ocrResult in ocr_results:
+        if (region := text_match.region(h, w)) is not None:  # 限定了文本区域，先一次筛出区域内的文本框，只对这些做正则
+            ocr_results = OcrResults.of(ocr_results)
+            candidates = [ocr_results[i] for i in np.flatnonzero(ocr_results.inside(*region))]
+        else:
+            candidates = ocr_results
+        for ocrResult in candidates:
             pre_match_text = ocrResult.text.strip()
             if not text_match.pattern.search(pre_match_text):  # 没找到就下一个
                 logger.debug("Non-matching: %s, regex: \"%s\", ocr text: \"%s\"",
                              text_match.name, text_match.text, pre_match_text)
                 continue
-            if not text_match.open_position or text_match.position is None:  # 找到了，且没有限定文本区域，合格
-                position = ocrResult
-                logger.debug("Matching: %s, regex: \"%s\", ocr text: \"%s\"", text_match.name, text_match.text, pre_match_text)
-                break
-            target_position = text_match.position.to_position(h, w)  # 将百分比区域根据图片大小转成像素位置
-            if self._is_subset(target_position, ocrResult):  # 限定了文本区域，看是否是该区域子集
-                position = ocrResult
-                logger.debug("Matching: %s, regex: %s, ocr text: %s", text_match.name, text_match.text, pre_match_text)
-                break
+            position = ocrResult
+            logger.debug("Matching: %s, regex: \"%s\", ocr text: \"%s\"", text_match.name, text_match.text, pre_match_text)
+            break
         return self.get_real_position(src_img, img, position)
 
     @staticmethod
@@ -196,25 +227,31 @@ class Page(BaseModel):
             return False
         return True
 
-    def image_match(self, image_match: ImageMatch, src_img: np.ndarray, img: np.ndarray) -> Position | None:
+    def image_match(self, image_match: ImageMatch, src_img: np.ndarray, img: np.ndarray,
+                    frame: FrameContext | None = None) -> Position | None:
         """
         图片模板匹配
         :param image_match: 模板参数
         :param src_img: 原图图片，可能非常大，仅在最后映射回原图坐标时使用
         :param img: ocr/match用的缩放后图片，标准一般是 1280 px x Any px，16:9 就是1280x720
+        :param frame: 同一帧的上下文，共用缩放图的灰度图
         :return:
         """
+        gray = frame.gray if frame is not None else img_util.bgr2gray(img)
+        matcher = get_matcher()
         if image_match.position:  # 在限定范围内找图
             valid_pos = image_match.position.to_position(img.shape[0], img.shape[1])
-            valid_img = img[valid_pos.y1:valid_pos.y2, valid_pos.x1:valid_pos.x2]
+            valid_img = gray[valid_pos.y1:valid_pos.y2, valid_pos.x1:valid_pos.x2]
         else:
             valid_pos = None
-            valid_img = img
+            valid_img = gray
         if image_match.open_roi_cache:  # 热区缓存，适用于固定位置，可变位置不要开启
-            if cur_roi_cache := image_match.roi_cache.get(src_img.shape[:2]):
-                roi: tuple[int, int, int, int] = cur_roi_cache[1]
+            roi_cache = roi_cache_util.get_roi_cache()
+            resolution, roi_key = img.shape[:2], image_match.roi_key
+            if cur_roi_cache := roi_cache.get(resolution, roi_key):
+                roi: tuple[int, int, int, int] = cur_roi_cache.roi
                 valid_h, valid_w = valid_img.shape[:2]
-                logger.debug("get roi cache: %s", cur_roi_cache)
+                logger.debug("get roi cache: %s", roi)
                 roi_h, roi_w = roi[3] - roi[1], roi[2] - roi[0]
                 roi_enlarge_pos = (
                     max(roi[0] - roi_w // 2, 0),
@@ -223,21 +260,30 @@ class Page(BaseModel):
                     min(roi[3] + roi_h // 2, valid_h)
                 )  # 选框向四周放大，不然跟模板差不多大小无法匹配
                 roi_img = valid_img[roi_enlarge_pos[1]:roi_enlarge_pos[3], roi_enlarge_pos[0]:roi_enlarge_pos[2]]
-                confidence, _ = img_util.match_template(roi_img, image_match.img)
+                confidence, _ = matcher.match(roi_img, image_match.img)
                 logger.debug("confidence a: %s", confidence)
-                if confidence < image_match.confidence:
+                if confidence >= image_match.confidence:
+                    roi_cache.hit(resolution, roi_key, confidence)
+                    logger.debug("%s %s", self.name, confidence)
+                    pos_tuple = roi
+                elif not roi_cache.miss(resolution, roi_key):  # 多数情况是图标不在画面中，不必整图匹配
                     return None
-                logger.debug("%s %s", self.name, confidence)
-                pos_tuple = roi
+                else:  # 连续失败，整图复查图标是否换了位置
+                    confidence, pos_tuple = matcher.match_pyramid(valid_img, image_match.img)
+                    logger.debug("confidence verify: %s", confidence)
+                    if confidence < image_match.confidence or not roi_cache.put(
+                            resolution, roi_key, pos_tuple, confidence):
+                        roi_cache.decay(resolution, roi_key)
+                    if confidence < image_match.confidence:
+                        return None
             else:
-                confidence, pos_tuple = result = img_util.match_template(valid_img, image_match.img)
+                confidence, pos_tuple = matcher.match_pyramid(valid_img, image_match.img)
                 logger.debug("confidence b: %s", confidence)
                 if confidence < image_match.confidence:
                     return None
-                if confidence > 0.9:
-                    image_match.roi_cache[src_img.shape[:2]] = result
+                roi_cache.put(resolution, roi_key, pos_tuple, confidence)
         else:
-            confidence, pos_tuple = img_util.match_template(valid_img, image_match.img)
+            confidence, pos_tuple = matcher.match_pyramid(valid_img, image_match.img)
             logger.debug("confidence c: %s", confidence)
             if confidence < image_match.confidence:
                 return None
@@ -253,6 +299,30 @@ class Page(BaseModel):
             final_pos_tuple = pos_tuple
         return self.get_real_position(src_img, img, Position.build(*final_pos_tuple))
 
+    def warm_roi_cache(self, roi_cache: RoiCache) -> int:
+        """
+        用 screenshot 登记的参考截图整图匹配开启了热区缓存的模板，预先生成缓存
+        :return: 缓存的条数，截图不存在时跳过
+        """
+        image_matches = [i for i in self.targetImages + self.excludeImages if i.open_roi_cache]
+        count = 0
+        for file_name in (name for names in self.screenshot.values() for name in names):
+            img_path = file_util.get_assets_screenshot(file_name)
+            if not image_matches or not os.path.exists(img_path):
+                continue
+            src_img = img_util.read_img(img_path, alpha=False)
+            frame = FrameContext(src_img, img_util.resize_by_weight(src_img))
+            for image_match in image_matches:
+                if image_match.position:
+                    valid_pos = image_match.position.to_position(frame.img.shape[0], frame.img.shape[1])
+                    valid_img = frame.gray[valid_pos.y1:valid_pos.y2, valid_pos.x1:valid_pos.x2]
+                else:
+                    valid_img = frame.gray
+                confidence, pos_tuple = get_matcher().match(valid_img, image_match.img)
+                count += roi_cache.put(frame.img.shape[:2], image_match.roi_key, pos_tuple, confidence)
+        roi_cache.flush()
+        return count
+
     @staticmethod
     def get_real_position(src_img: np.ndarray, img: np.ndarray, position: Pos | None) -> Pos | None:
         """按缩小尺寸匹配出来的坐标，映射回原尺寸的坐标"""
@@ -266,7 +336,7 @@ class Page(BaseModel):
             x2=int(position.x2 * ratio),
             y2=int(position.y2 * ratio),
             confidence=position.confidence,
-            text=position.text if isinstance(position, TextPosition) else None,
+            text=position.text if isinstance(position, (TextPosition, TextBox)) else None,
         )
         logger.debug("real_position: %s", real_position)
         return real_position
@@ -1,6 +1,8 @@
+import json
 import logging
 from abc import ABC, abstractmethod
-from typing import Tuple, Sequence, TypeVar, Type
+from collections.abc import Sequence as SequenceABC
+from typing import Any, Iterable, Iterator, Tuple, Sequence, TypeVar, Type
 
 import numpy as np
 from pydantic import BaseModel, Field
@@ -53,7 +55,7 @@ class Position(BaseModel):
     def of(cls: Type[Pos], position: "Position") -> Pos | None:
         if position is None:
             return None
-        if not isinstance(position, cls):
+        if not isinstance(position, (cls, TextBox)):
             raise TypeError("不是TextPosition类或子类")
         return position
 
@@ -85,7 +87,7 @@ class TextPosition(Position, ABC):
     text: str = Field(..., title="文本")
 
     def __eq__(self, other):
-        if isinstance(other, TextPosition):
+        if isinstance(other, (TextPosition, TextBox)):
             return (self.x1 == other.x1
                     and self.y1 == other.y1
                     and self.x2 == other.x2
@@ -139,3 +141,177 @@ class RapidocrPosition(TextPosition):
                                   confidence=score, text=text)
             _positions.append(_position)
         return _positions
+
+
+class TextBox:
+    """
+    OCR文本框，接口与 TextPosition 兼容（坐标、text、center、random、build、model_copy 等），
+    但不是 pydantic 模型，创建时不做校验；每帧几十个文本框时比 RapidocrPosition 快一个数量级。
+    pydantic 模型的 isinstance 不认虚拟子类，判断文本框类型时需同时判断 TextBox；需要序列化时用 to_position 转成 RapidocrPosition
+    """
+
+    __slots__ = ("x1", "y1", "x2", "y2", "confidence", "text")
+
+    def __init__(self, x1: int, y1: int, x2: int, y2: int, confidence: float = 0.0, text: str | None = None):
+        self.x1 = x1
+        self.y1 = y1
+        self.x2 = x2
+        self.y2 = y2
+        self.confidence = confidence
+        self.text = text
+
+    center = Position.center
+    random = Position.random
+    point_random = staticmethod(Position.point_random)
+
+    @classmethod
+    def build(cls, x1: int, y1: int, x2: int, y2: int, **kwargs) -> "TextBox":
+        return cls(x1, y1, x2, y2, kwargs.get("confidence", 0.0), kwargs.get("text"))
+
+    def model_copy(self, update: dict[str, Any] | None = None) -> "TextBox":
+        copy = TextBox(self.x1, self.y1, self.x2, self.y2, self.confidence, self.text)
+        for name, value in (update or {}).items():
+            setattr(copy, name, value)
+        return copy
+
+    def model_dump(self) -> dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def model_dump_json(self) -> str:
+        return json.dumps(self.model_dump(), ensure_ascii=False, separators=(",", ":"))
+
+    def to_position(self) -> "RapidocrPosition":
+        return RapidocrPosition(**self.model_dump())
+
+    def __eq__(self, other):
+        if isinstance(other, (TextPosition, TextBox)):
+            return (self.x1 == other.x1
+                    and self.y1 == other.y1
+                    and self.x2 == other.x2
+                    and self.y2 == other.y2
+                    and self.text == other.text)
+        return False
+
+    __hash__ = None
+
+    def __str__(self):
+        return self.model_dump_json()
+
+    def __repr__(self):
+        return f"TextBox({self.model_dump_json()})"
+
+
+class OcrResults(SequenceABC):
+    """
+    一次OCR的全部文本框，按列存放：boxes 为 (N, 4) int32 的 x1, y1, x2, y2，scores 为 float32，texts 为文本列表
+    可像 list[TextPosition] 一样遍历、下标访问，元素为首次访问时创建的 TextBox；坐标偏移等批量操作直接在数组上完成
+    """
+
+    __slots__ = ("boxes", "scores", "texts", "_items")
+
+    def __init__(self, boxes: np.ndarray, scores: np.ndarray, texts: list[str]):
+        self.boxes: np.ndarray = boxes
+        self.scores: np.ndarray = scores
+        self.texts: list[str] = texts
+        self._items: list[TextBox] | None = None
+
+    @classmethod
+    def empty(cls) -> "OcrResults":
+        return cls(np.empty((0, 4), np.int32), np.empty(0, np.float32), [])
+
+    @classmethod
+    def from_rapidocr(cls, output: RapidOCROutput) -> "OcrResults":
+        if output.boxes is None or len(output.boxes) == 0:
+            return cls.empty()
+        # 四点框取左上、右下两点，与 RapidocrPosition.format 相同
+        points = np.asarray(output.boxes)
+        boxes = np.stack((points[:, 0, 0], points[:, 0, 1], points[:, 2, 0], points[:, 2, 1]), axis=1)
+        return cls(boxes.astype(np.int32), np.asarray(output.scores, np.float32), list(output.txts))
+
+    @classmethod
+    def of(cls, positions: Iterable[TextPosition]) -> "OcrResults":
+        """已是 OcrResults 时原样返回"""
+        if isinstance(positions, OcrResults):
+            return positions
+        positions = list(positions)
+        if not positions:
+            return cls.empty()
+        boxes = np.array([(i.x1, i.y1, i.x2, i.y2) for i in positions], np.int32)
+        results = cls(boxes, np.array([i.confidence for i in positions], np.float32), [i.text for i in positions])
+        if all(isinstance(i, TextBox) for i in positions):  # 复用已有对象，保持与传入列表元素相同
+            results._items = positions
+        return results
+
+    @property
+    def items(self) -> list[TextBox]:
+        if self._items is None:
+            self._items = [
+                TextBox(x1, y1, x2, y2, score, text)
+                for (x1, y1, x2, y2), score, text in zip(self.boxes.tolist(), self.scores.tolist(), self.texts)
+            ]
+        return self._items
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return OcrResults(self.boxes[index], self.scores[index], self.texts[index])
+        return self.items[index]
+
+    def __iter__(self) -> Iterator[TextBox]:
+        return iter(self.items)
+
+    def __repr__(self):
+        return f"OcrResults({self.items!r})"
+
+    def inside(self, x1: int, y1: int, x2: int, y2: int) -> np.ndarray:
+        """完全位于矩形区域内的文本框，返回布尔掩码"""
+        boxes = self.boxes
+        return (boxes[:, 0] >= x1) & (boxes[:, 1] >= y1) & (boxes[:, 2] <= x2) & (boxes[:, 3] <= y2)
+
+    def offset(self, x: int, y: int) -> "OcrResults":
+        """坐标整体偏移，返回新对象，不修改原结果（原结果可能被画面变化检测缓存复用）"""
+        if x == 0 and y == 0:
+            return self
+        return OcrResults(self.boxes + np.array((x, y, x, y), np.int32), self.scores, self.texts)
+
+    def to_positions(self) -> list["RapidocrPosition"]:
+        """转成 pydantic 模型，用于序列化"""
+        return [item.to_position() for item in self.items]
+
+
+def benchmark(boxes_per_frame: int = 40, frames: int = 200):
+    """对比逐个创建 RapidocrPosition 与 OcrResults 的耗时，并校验坐标、文本一致"""
+    import time
+
+    rng = np.random.default_rng(0)
+    outputs = []
+    for _ in range(frames):
+        xy = rng.uniform(0, 1200, (boxes_per_frame, 2))
+        wh = rng.uniform(10, 200, (boxes_per_frame, 2))
+        points = np.stack((xy, xy + wh * [1, 0], xy + wh, xy + wh * [0, 1]), axis=1).astype(np.float32)
+        texts = tuple(f"文本{i}" for i in rng.integers(0, 1000, boxes_per_frame))
+        outputs.append(RapidOCROutput(boxes=points, txts=texts, scores=tuple(rng.uniform(0.5, 1.0, boxes_per_frame))))
+
+    for output in outputs:
+        expected = RapidocrPosition.format(output)
+        actual = OcrResults.from_rapidocr(output)
+        if expected != list(actual) or [i.text for i in expected] != [i.text for i in actual]:
+            raise AssertionError("Mismatch")
+
+    def run(func) -> float:
+        start = time.perf_counter()
+        for output in outputs:
+            for position in func(output):
+                _ = position.x1, position.text
+        return (time.perf_counter() - start) * 1e6 / len(outputs)
+
+    pydantic_us = run(RapidocrPosition.format)
+    slots_us = run(OcrResults.from_rapidocr)
+    print(f"boxes/frame: {boxes_per_frame}, pydantic: {pydantic_us:.1f} us/frame, "
+          f"OcrResults: {slots_us:.1f} us/frame, speedup: {pydantic_us / slots_us:.1f}x")
+
+
+if __name__ == '__main__':
+    benchmark()
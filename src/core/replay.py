@@ -0,0 +1,132 @@
+"""
+回放运行任务
+
+用录制的画面离线运行页面事件服务，统计每一帧各阶段耗时，无需游戏窗口，可在Linux上运行。
+    python -m src.core.replay pickup path/to/frames --realtime --ticks 300
+"""
+import argparse
+import functools
+import logging
+import time
+from collections import defaultdict
+from typing import Callable
+
+import numpy as np
+
+from src.core.contexts import Context
+from src.core.injector import Container
+from src.core.interface import PageEventService
+from src.core.pages import Page
+from src.util.replay_util import ReplayFinished
+
+logger = logging.getLogger(__name__)
+
+SERVICES: dict[str, str] = {
+    "boss": "auto_boss_service",
+    "pickup": "auto_pickup_service",
+    "story": "auto_story_service",
+    "daily": "daily_activity_service",
+}
+
+# 阶段 -> 需要计时的服务方法
+_STAGE_METHODS: dict[str, dict[str, list[str]]] = {
+    "img_service": {
+        "capture": ["screenshot_region"],
+        "resize": ["resize", "resize_by_weight", "resize_by_ratio", "resize_by_dsize"],
+        "match": ["match_template"],
+    },
+    "ocr_service": {
+        "ocr": ["ocr", "ocr_many", "rec"],
+    },
+    "od_service": {
+        "yolo": ["search_echo", "search_reward"],
+    },
+    "control_service": {
+        "action": ["_record"],
+    },
+}
+
+
+class StageTimer:
+    """按阶段累计耗时，同一阶段嵌套调用只计最外层"""
+
+    def __init__(self):
+        self.durations: dict[str, list[float]] = defaultdict(list)
+        self._active: set[str] = set()
+
+    def wrap(self, stage: str, func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if stage in self._active:
+                return func(*args, **kwargs)
+            self._active.add(stage)
+            start_time = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.durations[stage].append(time.perf_counter() - start_time)
+                self._active.discard(stage)
+
+        return wrapper
+
+    def instrument(self, obj, stage: str, method_names: list[str]):
+        """替换实例上的方法为计时版本"""
+        for name in method_names:
+            if hasattr(obj, name):
+                setattr(obj, name, self.wrap(stage, getattr(obj, name)))
+
+    def report(self) -> str:
+        lines = [f"{'stage':<10}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'max':>10}  (ms)"]
+        for stage, durations in self.durations.items():
+            ms = np.array(durations) * 1000
+            lines.append(f"{stage:<10}{len(ms):>8}{ms.mean():>10.2f}{np.percentile(ms, 50):>10.2f}"
+                         f"{np.percentile(ms, 95):>10.2f}{ms.max():>10.2f}")
+        return "\n".join(lines)
+
+
+def run_replay(service: str, replay_path: str, realtime: bool = False, ticks: int = 0) -> StageTimer:
+    """
+    回放运行页面事件服务
+    :param service: boss/pickup/story/daily
+    :param replay_path: 录制画面的图片目录或视频
+    :param realtime: 按实时取帧，流程慢时跳帧；否则每次截图取下一帧
+    :param ticks: 最多运行多少次 execute，0表示回放完为止
+    :return: 各阶段耗时
+    """
+    context = Context()
+    container = Container.build(context, replay_path=replay_path, realtime=realtime)
+    timer = StageTimer()
+    for service_name, stages in _STAGE_METHODS.items():
+        instance = getattr(container, service_name)()
+        for stage, method_names in stages.items():
+            timer.instrument(instance, stage, method_names)
+    page_event_service: PageEventService = getattr(container, SERVICES[service])()
+    execute = timer.wrap("tick", page_event_service.execute)
+
+    origin_is_match = Page.is_match
+    Page.is_match = timer.wrap("page", origin_is_match)
+    count = 0
+    try:
+        while ticks <= 0 or count < ticks:
+            execute()
+            count += 1
+    except ReplayFinished:
+        logger.info("回放结束")
+    finally:
+        Page.is_match = origin_is_match
+    actions = container.control_service().actions
+    logger.info("回放 %s 次，键鼠操作 %s 次", count, len(actions))
+    return timer
+
+
+if __name__ == '__main__':
+    from src.config import logging_config
+
+    logging_config.setup_logging()
+    parser = argparse.ArgumentParser(description="用录制的画面回放运行任务")
+    parser.add_argument("service", choices=SERVICES.keys())
+    parser.add_argument("replay_path", help="图片目录或视频文件")
+    parser.add_argument("--realtime", action="store_true", help="按实时取帧，流程慢时跳帧")
+    parser.add_argument("--ticks", type=int, default=0, help="最多运行次数，0表示回放完为止")
+    args = parser.parse_args()
+    print(run_replay(args.service, args.replay_path, args.realtime, args.ticks).report())
@@ -5,6 +5,7 @@ import time
 from abc import ABC, abstractmethod
 from datetime import datetime
 from multiprocessing import Process, Event
+from multiprocessing.queues import Queue
 from typing import Iterable, Any, TypeVar, Callable, Mapping
 
 import win32gui
@@ -12,10 +13,12 @@ from pydantic import BaseModel, Field
 from pynput.mouse import Controller
 
 from src.config import logging_config
-from src.core.contexts import Context
+from src.core.contexts import Context, Status
+from src.core.frame_context import FrameContext
 from src.core.injector import Container
 from src.core.interface import ImgService, OCRService, ControlService, PageEventService, WindowService
-from src.util import hwnd_util, keymouse_util
+from src.util import hwnd_util, keymouse_util, frame_bus_util, metrics_util, wrap_util, pipeline_util, tick_util
+from src.util.tick_util import TickScheduler
 
 logger = logging.getLogger(__name__)
 
@@ -96,6 +99,11 @@ class DailyActivityProcessTask(ProcessTask):
         return daily_activity_task_run
 
 
+class FrameBusProcessTask(ProcessTask):
+    def get_task(self, *args) -> Callable[..., None] | None:
+        return frame_bus_task_run
+
+
 class ClockAction:
     """定时执行函数"""
 
@@ -111,6 +119,12 @@ class ClockAction:
             self.callable()
 
 
+def _setup_metrics(context: Context, metrics_queue: Queue | None, task_name: str):
+    """每帧耗时统计定时发送到主进程，metrics_queue 为None时只在本进程内统计"""
+    wrap_util.set_log_enabled(context.config.app.TimeitLog)
+    metrics_util.get_metrics().setup(metrics_queue, task_name, context.config.app.MetricsInterval)
+
+
 def mouse_reset_task_run(event: Event, **kwargs):
     logging_config.setup_logging()
     logger.info("鼠标重置进程启动成功")
@@ -146,14 +160,51 @@ def mouse_reset_task_run(event: Event, **kwargs):
         logger.info("鼠标重置进程结束")
 
 
-def auto_boss_task_run(event: Event, **kwargs):
+def frame_bus_task_run(event: Event, **kwargs):
+    """帧总线截图生产者，按截到的窗口客户区大小创建帧总线并写入截图"""
+    logging_config.setup_logging()
+    logger.info("帧总线截图进程启动成功")
+    context = Context()
+    container = Container.build(context)
+    img_service: ImgService = container.img_service()
+    img_service.set_capture_mode(ImgService.CaptureEnum.BG)
+
+    def source():
+        try:
+            return img_service.screenshot()
+        except Exception:
+            logger.warning("帧总线截图异常", exc_info=True)
+            time.sleep(0.5)
+            return None
+
+    try:
+        frame_bus_util.run_producer(kwargs[frame_bus_util.ENV_FRAME_BUS_NAME], source, event.is_set,
+                                    context.config.app.FrameBusFps, context.config.app.FrameBusSlots)
+    except KeyboardInterrupt:
+        logger.info("帧总线截图进程结束")
+
+
+def _boss_tick_state(context: Context) -> str:
+    info = context.boss_task_ctx
+    if info.status == Status.fight:
+        return tick_util.FIGHT
+    if info.needAbsorption:
+        return tick_util.ABSORBING
+    return tick_util.IDLE
+
+
+def auto_boss_task_run(event: Event, metrics_queue: Queue | None = None, **kwargs):
     logging_config.setup_logging()
     logger.info("刷boss任务进程开始运行")
     hwnd_util.set_hwnd_left_top()
 
+    for k, v in kwargs.items():
+        os.environ[k] = v
+
     context = Context()
     container = Container.build(context)
     logger.debug("Create application context")
+    _setup_metrics(context, metrics_queue, "AutoBossProcessTask")
     window_service: WindowService = container.window_service()
     img_service: ImgService = container.img_service()
     ocr_service: OCRService = container.ocr_service()
@@ -163,19 +214,50 @@ def auto_boss_task_run(event: Event, **kwargs):
     logger.debug("-------- run ----------")
     count = 0
     clock_action = ClockAction(control_service.activate, 3.0)
+    pipeline = None
+    if context.config.app.CapturePipeline:
+        # 后台线程截取下一帧，与当前帧的OCR、页面匹配重叠
+        def source():
+            frame = img_service.capture_frame()
+            return frame.src_img, frame.img
+
+        pipeline = pipeline_util.CapturePipeline(source).start()
+    scheduler = None
+    if context.config.app.TickScheduler:
+        # 战斗、吸收时保持帧率，其余时间画面不变就降帧
+        scheduler = TickScheduler(
+            {tick_util.IDLE: 5, tick_util.FIGHT: 10, tick_util.ABSORBING: 15},
+            min_fps=context.config.app.TickMinFps,
+        )
     try:
         while not event.is_set():
             count += 1
             # logger.info("count %s", count)
             clock_action.action()
 
-            src_img = img_service.screenshot()
-            img = img_service.resize(src_img)
-            result = ocr_service.ocr(img)
-            page_event_service.execute(src_img=src_img, img=img, ocr_results=result)
+            with metrics_util.tick():
+                if pipeline is not None:
+                    if (frame := pipeline.next_frame()) is None:
+                        continue
+                    frame = FrameContext(frame.src_img, frame.img)
+                else:
+                    frame = img_service.capture_frame()
+                if scheduler is not None:
+                    scheduler.observe(frame.img)
+                result = ocr_service.ocr(frame.img)
+                actioned = page_event_service.execute(frame=frame, ocr_results=result)
+                if actioned and pipeline is not None:  # 操作后画面已变化，丢弃操作前截的帧
+                    pipeline.invalidate()
+            if scheduler is not None:
+                if actioned:
+                    scheduler.boost()
+                scheduler.set_state(_boss_tick_state(context))
+                scheduler.wait()
     except KeyboardInterrupt:
         logger.info("刷boss任务进程结束")
     finally:
+        if pipeline is not None:
+            pipeline.stop()
         try:
             keymouse_util.key_up(window_service.window, "W")
             keymouse_util.key_up(window_service.window, "LSHIFT")
@@ -183,12 +265,17 @@ def auto_boss_task_run(event: Event, **kwargs):
             pass
 
 
-def auto_pickup_task_run(event: Event, **kwargs):
+def auto_pickup_task_run(event: Event, metrics_queue: Queue | None = None, **kwargs):
     logging_config.setup_logging()
     logger.info("自动拾取任务进程开始运行")
+
+    for k, v in kwargs.items():
+        os.environ[k] = v
+
     context = Context()
     container = Container.build(context)
     logger.debug("Create application context")
+    _setup_metrics(context, metrics_queue, "AutoPickupProcessTask")
     window_service: WindowService = container.window_service()
     control_service: ControlService = container.control_service()
     page_event_service: PageEventService = container.auto_pickup_service()
@@ -207,7 +294,7 @@ def auto_pickup_task_run(event: Event, **kwargs):
             pass
 
 
-def auto_story_task_run(event: Event, **kwargs):
+def auto_story_task_run(event: Event, metrics_queue: Queue | None = None, **kwargs):
     logging_config.setup_logging()
     logger.info("自动剧情任务进程开始运行")
 
@@ -217,6 +304,7 @@ def auto_story_task_run(event: Event, **kwargs):
     context = Context()
     container = Container.build(context)
     logger.debug("Create application context")
+    _setup_metrics(context, metrics_queue, "AutoStoryProcessTask")
     window_service: WindowService = container.window_service()
     control_service: ControlService = container.control_service()
     page_event_service: PageEventService = container.auto_story_service()
@@ -235,13 +323,18 @@ def auto_story_task_run(event: Event, **kwargs):
             pass
 
 
-def daily_activity_task_run(event: Event):
+def daily_activity_task_run(event: Event, metrics_queue: Queue | None = None, **kwargs):
     logging_config.setup_logging()
     logger.info("每日任务进程开始运行")
     hwnd_util.set_hwnd_left_top()
+
+    for k, v in kwargs.items():
+        os.environ[k] = v
+
     context = Context()
     container = Container.build(context)
     logger.debug("Create application context")
+    _setup_metrics(context, metrics_queue, "DailyActivityProcessTask")
     window_service: WindowService = container.window_service()
     control_service: ControlService = container.control_service()
     page_event_service: PageEventService = container.daily_activity_service()
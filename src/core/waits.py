@@ -0,0 +1,161 @@
+"""
+事件驱动的页面等待
+
+代替“截图、整图OCR、固定sleep”的轮询：持续取帧，每来一帧依次检查多个条件，任意一个满足立即返回。
+条件分两类：
+    廉价条件（模板匹配等）每帧都检查
+    昂贵条件（OCR等）只在画面稳定（连续 settle_frames 帧不变）后检查一次，画面再变化、再稳定后才重新检查；
+    画面一直在变（如有动画）时，至少每 settle_timeout 秒检查一次，避免一直等不到
+页面切换时不必再固定等待，画面一稳定就识别，切换完成的那一帧即可返回。
+"""
+import logging
+import time
+from typing import Any, Callable, Iterable
+
+from src.core.frame_context import FrameContext
+from src.core.interface import ImgService, OCRService
+from src.core.regions import Position, DynamicPosition
+from src.util import tick_util
+from src.util.tick_util import TickScheduler
+
+logger = logging.getLogger(__name__)
+
+# 取帧并缩放，返回None表示本次没有截到
+FrameSource = Callable[[], FrameContext | None]
+
+
+class Predicate:
+    """等待条件，check 返回非空值即为满足，该值作为等待结果；check 为None表示画面稳定即满足"""
+    __slots__ = ("name", "check", "settled")
+
+    def __init__(self, name: str, check: Callable[[FrameContext], Any] | None, settled: bool = False):
+        """
+        :param name: 条件名称，满足时作为结果的名称
+        :param check: 检查一帧，返回None、False等假值表示不满足
+        :param settled: 是否为昂贵条件，只在画面稳定后检查
+        """
+        self.name = name
+        self.check = check
+        self.settled = settled
+
+    def __repr__(self):
+        return f"Predicate({self.name!r}, settled={self.settled})"
+
+
+class WaitResult:
+    __slots__ = ("name", "value", "frame", "elapsed")
+
+    def __init__(self, name: str, value: Any, frame: FrameContext, elapsed: float):
+        # 满足的条件名称
+        self.name = name
+        # 条件的返回值，如匹配到的位置
+        self.value = value
+        # 满足条件的那一帧
+        self.frame = frame
+        # 等待秒数
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        return f"WaitResult({self.name!r}, {self.value!r}, elapsed={self.elapsed:.3f})"
+
+
+class FrameWaiter:
+
+    def __init__(self, source: FrameSource, fps: float = 20, settle_frames: int = 2, settle_timeout: float = 1.0,
+                 diff_threshold: float = 1.0):
+        """
+        :param source: 取帧，一般为 ImgService.capture_frame；使用帧总线时读取的是截图进程的最新帧
+        :param fps: 取帧帧率上限
+        :param settle_frames: 连续多少帧画面不变视为稳定
+        :param settle_timeout: 画面一直在变时，昂贵条件的最长检查间隔秒数
+        :param diff_threshold: 画面变化阈值，见 frame_diff_util
+        """
+        self._source = source
+        self.settle_frames = settle_frames
+        self.settle_timeout = settle_timeout
+        # 等待期间需要尽快发现变化，不降帧
+        self._scheduler = TickScheduler({tick_util.IDLE: fps}, min_fps=fps, diff_threshold=diff_threshold)
+
+    def wait_for(self, predicates: Iterable[Predicate], timeout: float,
+                 settle_timeout: float | None = None, source: FrameSource | None = None) -> WaitResult | None:
+        """
+        等待任意一个条件满足
+        :param predicates: 条件，同类条件按顺序检查，廉价条件总是先于昂贵条件
+        :param timeout: 超时秒数
+        :param settle_timeout: 本次等待的昂贵条件最长检查间隔，默认为构造时的值
+        :param source: 本次等待的取帧，默认为构造时的取帧；条件只关心固定区域时可只截取该区域，画面变化检测也只比较该区域
+        :return: 第一个满足的条件及其结果，超时返回None
+        """
+        settle_timeout = self.settle_timeout if settle_timeout is None else settle_timeout
+        source = self._source if source is None else source
+        predicates = list(predicates)
+        cheap = [i for i in predicates if not i.settled]
+        expensive = [i for i in predicates if i.settled]
+        start = time.monotonic()
+        unchanged = 0
+        # 昂贵条件在本次画面稳定期间是否已检查过
+        checked = False
+        # 第一帧就检查一次，画面本来就是目标页面时不必等稳定
+        last_checked = start - settle_timeout
+        self._scheduler.pause()
+        while (elapsed := time.monotonic() - start) < timeout:
+            frame = source()
+            if frame is None:
+                self._scheduler.wait()
+                continue
+            if self._scheduler.observe(frame.src_img):
+                unchanged = 0
+                checked = False
+            else:
+                unchanged += 1
+            for predicate in cheap:
+                if predicate.check is None:
+                    if unchanged >= self.settle_frames:
+                        return self._result(predicate, True, frame, start)
+                elif value := predicate.check(frame):
+                    return self._result(predicate, value, frame, start)
+            now = time.monotonic()
+            if expensive and ((unchanged >= self.settle_frames and not checked)
+                              or now - last_checked >= settle_timeout):
+                checked = True
+                last_checked = now
+                for predicate in expensive:
+                    if value := predicate.check(frame):
+                        return self._result(predicate, value, frame, start)
+            self._scheduler.wait()
+        logger.debug("Wait timeout: %s, %s", predicates, elapsed)
+        return None
+
+    @staticmethod
+    def _result(predicate: Predicate, value: Any, frame: FrameContext, start: float) -> WaitResult:
+        result = WaitResult(predicate.name, value, frame, time.monotonic() - start)
+        logger.debug("Wait done: %s", result)
+        return result
+
+
+def settled(name: str = "settled") -> Predicate:
+    """画面稳定，用于等待过场动画、页面切换结束"""
+    return Predicate(name, None)
+
+
+def template(img_service: ImgService, template_imgs: str | list[str], threshold: float = 0.8,
+             name: str | None = None) -> Predicate:
+    """任意一个模板匹配上，结果为匹配位置"""
+    if isinstance(template_imgs, str):
+        template_imgs = [template_imgs]
+
+    def check(frame: FrameContext) -> Position | None:
+        positions = img_service.match_templates(img=frame, template_imgs=template_imgs, threshold=threshold)
+        return next((position for position in positions if position), None)
+
+    return Predicate(name or ",".join(template_imgs), check)
+
+
+def text(ocr_service: OCRService, targets: str | list[str], position: Position | DynamicPosition | None = None,
+         name: str | None = None) -> Predicate:
+    """OCR识别到任意一个文本，结果为原图坐标的文本位置；只识别 position 区域"""
+    if isinstance(targets, str):
+        targets = [targets]
+    return Predicate(name or "|".join(targets),
+                     lambda frame: ocr_service.find_text(targets, frame, position),
+                     settled=True)
@@ -1,13 +1,15 @@
 import logging
 import time
 
-import numpy as np
-
 from src.core.contexts import Context
+from src.core.frame_context import FrameContext
 from src.core.interface import ControlService, OCRService, ImgService, WindowService, ODService
 from src.core.pages import Page, Position, TextMatch, ConditionalAction
 from src.core.regions import DynamicPosition, TextPosition
 from src.service.page_event_service import PageEventAbstractService
+from src.util import metrics_util, tick_util
+from src.util.name_match_util import NameMatcher
+from src.util.tick_util import TickScheduler
 from src.util.wrap_util import timeit
 
 logger = logging.getLogger(__name__)
@@ -31,48 +33,44 @@ class AutoPickupServiceImpl(PageEventAbstractService):
 
         self._last_execute_time = time.monotonic()
 
-        # fps limit
-        self._fps = 15
-        self._fps_seconds = 1 / self._fps
+        # fps limit，画面不变时降帧，拾取后画面会变化，提高帧率
+        self._tick_scheduler = TickScheduler({tick_util.IDLE: 15}, min_fps=self._context.config.app.TickMinFps)
 
     def execute(self, **kwargs):
         if not self._window_service.is_foreground_window():
             time.sleep(0.5)
+            self._tick_scheduler.pause()
             return
 
-        start_time = time.perf_counter_ns()
-        self._execute()
-        use_time = time.perf_counter_ns() - start_time
-        if use_time > 0.0:
-            logger.debug(f"fps: {(1e9 / use_time)}")
-        use_seconds = use_time / 1e9
-        if use_seconds + 0.0001 < self._fps_seconds:
-            sleep_seconds = self._fps_seconds - use_seconds
-            logger.debug("sleep: %s", sleep_seconds)
-            time.sleep(sleep_seconds)
-        use_time = time.perf_counter_ns() - start_time
-        if use_time > 0.0:
-            logger.debug(f"final fps: {(1e9 / use_time)}")
+        with metrics_util.tick():
+            if self._execute():
+                self._tick_scheduler.boost()
+        self._tick_scheduler.wait()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("tick: %s", self._tick_scheduler.stats())
         return
 
     @timeit(ignore=3)
-    def _execute(self):
+    def _execute(self) -> bool:
         dynamic_position = self._auto_pickup_page.targetTexts[0].position
         src_img = self._img_service.screenshot(dynamic_position)
         img = self._img_service.resize_by_ratio(src_img)
+        self._tick_scheduler.observe(img)
         ocr_results = self._ocr_service.ocr(img)
         logger.debug(ocr_results)
         # img_util.save_img_in_temp(img)
-        is_action = self.page_action(self._auto_pickup_page, img, img, ocr_results)
+        is_action = self.page_action(self._auto_pickup_page, FrameContext(img), ocr_results)
         logger.debug("is_action: %s", is_action)
         # time.sleep(0.1)
+        return is_action
 
     @staticmethod
-    def page_action(page: Page, src_img: np.ndarray, img: np.ndarray, ocr_results: list[TextPosition]) -> bool:
-        if not page.is_match(src_img, img, ocr_results):
+    def page_action(page: Page, frame: FrameContext, ocr_results: list[TextPosition]) -> bool:
+        if not page.is_match(frame.src_img, frame.img, ocr_results, frame):
             return False
         logger.info("当前页面：%s", page.name)
-        page.action(page.matchPositions)
+        with metrics_util.stage("action"):
+            page.action(page.matchPositions)
         return True
 
     def get_pages(self) -> list[Page]:
@@ -85,10 +83,11 @@ class AutoPickupServiceImpl(PageEventAbstractService):
 
         def auto_pickup_page_action(positions: dict[str, Position]) -> bool:
             position = TextPosition.get(positions, "自动拾取")
-            logger.debug("拾取: %s", position.text)
+            name = self._pickup_matcher.match(position.text.strip())
+            logger.debug("拾取: %s, ocr text: %s", name, position.text)
             # sleep_seconds = round(random.uniform(0.0001, 0.002), 6)
             self._control_service.pick_up(0.0001)
-            if position.text == "辉光奇藏箱":
+            if name == "辉光奇藏箱":
                 time.sleep(0.1)
                 self._control_service.dash_dodge()
             # self._control_service.pick_up(0.00001)
@@ -145,11 +144,11 @@ class AutoPickupServiceImpl(PageEventAbstractService):
             "垂青橄榄": "垂青橄榄",
             "金羊毛": "金羊毛",
             "剑菖蒲": "剑菖蒲",
-            "花蕈": "花(?:蕈|草)",
-            "妙弋花": "妙.?花",
+            "花蕈": "花蕈",
+            "妙弋花": "妙弋花",
             "菱果": "白花菱",  # 白花菱拾取后是菱果
-            "地丁堇": "地丁.",
-            "礼花蒴": "礼花.?",
+            "地丁堇": "地丁堇",
+            "礼花蒴": "礼花蒴",
             # v2.2
             "海浮棘": "海浮棘",
             # 补充药材
@@ -162,8 +161,8 @@ class AutoPickupServiceImpl(PageEventAbstractService):
             "蓝羽蝶": "蓝羽蝶",
             "赤羽蝶": "赤羽蝶",
             "羽毛": "羽毛",
-            "叶翅蛉": "叶翅.?",
-            "霄凤蝶": ".?凤蝶",
+            "叶翅蛉": "叶翅蛉",
+            "霄凤蝶": "霄凤蝶",
             # 补充食材
             "禽肉": "禽肉",
             "鸟蛋": "鸟蛋",
@@ -179,15 +178,24 @@ class AutoPickupServiceImpl(PageEventAbstractService):
             "潮汐之遗": "潮汐之遗",
         }
 
-        # 需完全匹配
-        self._pickup_regex_text = (r"^(" + "|".join(set(self._pickup_mapping.values())) + r")$")
+        # OCR 容易认错的名称，允许错、多、少一个字
+        self._pickup_fuzzy_names = {"妙弋花", "地丁堇", "礼花蒴", "叶翅蛉", "霄凤蝶"}
+        # 两个字的名称不做模糊匹配，常见的误识别写法 -> 名称
+        self._pickup_aliases = {"花草": "花蕈"}
+
+        # 需完全匹配，返回画面上的名称
+        self._pickup_matcher = NameMatcher()
+        for name in set(self._pickup_mapping.values()):
+            self._pickup_matcher.add(name, fuzzy=name in self._pickup_fuzzy_names)
+        for alias, name in self._pickup_aliases.items():
+            self._pickup_matcher.add(alias, name)
 
         auto_pickup_page = Page(
             name="自动拾取",
             targetTexts=[
                 TextMatch(
                     name="自动拾取",
-                    text=self._pickup_regex_text,
+                    text=self._pickup_matcher,
                     open_position=False,  # 关闭自动限制文本区域，手动处理
                     position=DynamicPosition(
                         rate=(
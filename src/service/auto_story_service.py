@@ -3,49 +3,25 @@ import os
 import threading
 import time
 
-import numpy as np
-from pynput import keyboard
+try:
+    from pynput import keyboard
+except ImportError:  # 无桌面环境，如回放模式，不监听按键
+    keyboard = None
 
 from src.core.contexts import Context
+from src.core.frame_context import FrameContext
 from src.core.interface import ControlService, OCRService, ImgService, WindowService, ODService
 from src.core.languages import Languages
 from src.core.pages import Page, Position, TextMatch, ConditionalAction, ImageMatch
 from src.core.regions import DynamicPosition, TextPosition
 from src.service.page_event_service import PageEventAbstractService
+from src.util import metrics_util, tick_util
+from src.util.tick_util import TickScheduler
 from src.util.wrap_util import timeit
 
 logger = logging.getLogger(__name__)
 
 
-class DynamicFpsLimit:
-
-    def __init__(self):
-        self.key_press_time = None
-
-    def sleep(self, execute_use_seconds: float):
-        now = time.perf_counter_ns()
-        if self.key_press_time is None:
-            fps = 1
-        else:
-            idle_seconds = (now - self.key_press_time) / 1e9
-            if idle_seconds < 3:
-                # logger.warning("3秒")
-                fps = 1 / 3  # 按键3秒内有动过，可能不在剧情对话中，检测频率为3秒一次
-            elif idle_seconds < 5:
-                fps = 1 / 2  # 2秒一次
-            else:  # idle_seconds >= 5
-                fps = 1  # 超过5秒按键没有动过，可能进入剧情，检测频率为1秒一次
-        seconds = 1 / fps
-        # logger.info(f"seconds: {seconds:.2f}")
-        sleep_seconds = seconds - execute_use_seconds # 减去流程耗时
-        if sleep_seconds > 0.0001:
-            logger.debug("sleep: %s", sleep_seconds)
-            time.sleep(sleep_seconds)
-
-    def refresh(self):
-        self.key_press_time = time.perf_counter_ns()
-
-
 class AutoStoryServiceImpl(PageEventAbstractService):
     """自动过剧情"""
 
@@ -73,8 +49,13 @@ class AutoStoryServiceImpl(PageEventAbstractService):
         self._mouse_last_check_time = None
         self._listener_thread = None
 
-        # fps limit
-        self._dynamic_fps_limit = DynamicFpsLimit()
+        # fps limit，按键越久没动过越可能在剧情中，检测越频繁
+        self._key_press_time: float | None = None
+        self._tick_scheduler = TickScheduler({
+            tick_util.DIALOG: 1,  # 超过5秒按键没有动过，可能进入剧情，检测频率为1秒一次
+            tick_util.IDLE: 1 / 2,  # 2秒一次
+            tick_util.MOVING: 1 / 3,  # 按键3秒内有动过，可能不在剧情对话中，检测频率为3秒一次
+        })
 
     def execute(self, **kwargs):
         if not self._window_service.is_foreground_window():
@@ -82,26 +63,32 @@ class AutoStoryServiceImpl(PageEventAbstractService):
             if self._mouse_last_check_time is not None:
                 self._mouse_last_check_time = time.perf_counter()
             self._control_service.activate()
+            self._tick_scheduler.pause()
             return
 
-        start_time = time.perf_counter_ns()
-        self._execute()
-        use_time = time.perf_counter_ns() - start_time
-        if use_time > 0.0:
-            logger.debug(f"fps: {(1e9 / use_time)}")
-        use_seconds = use_time / 1e9
-        self._dynamic_fps_limit.sleep(use_seconds)
-        use_time = time.perf_counter_ns() - start_time
-        if use_time > 0.0:
-            logger.debug(f"final fps: {(1e9 / use_time)}")
-
+        with metrics_util.tick():
+            self._execute()
+        self._tick_scheduler.set_state(self._tick_state())
+        self._tick_scheduler.wait()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("tick: %s", self._tick_scheduler.stats())
         return
 
+    def _tick_state(self) -> str:
+        if self._key_press_time is None:
+            return tick_util.DIALOG
+        idle_seconds = time.perf_counter() - self._key_press_time
+        if idle_seconds < 3:
+            return tick_util.MOVING
+        if idle_seconds < 5:
+            return tick_util.IDLE
+        return tick_util.DIALOG
+
     @timeit(ignore=3)
     def _execute(self, **kwargs):
         # prepare
-        src_img = self._img_service.screenshot()
-        img = self._img_service.resize(src_img)
+        frame = self._img_service.capture_frame()
+        img = frame.img
         ocr_results: list[TextPosition] | None = None
         # 定制action，防止卡顿
 
@@ -115,17 +102,16 @@ class AutoStoryServiceImpl(PageEventAbstractService):
             # logger.debug(skip_ocr_results)
             # from src.util import file_util, img_util
             # img_util.save_img(skip_page_img, file_util.create_img_path())
-            skip_is_action = self.page_action(self._skip_page, src_img, img, skip_ocr_results)
+            skip_is_action = self.page_action(self._skip_page, frame, skip_ocr_results)
             # skip_is_action = self.text_match_limit_position(self._skip_page, src_img, img)
             if skip_is_action and self._is_first_skip_page:
                 # 首次跳过会有确认弹窗
                 time.sleep(1)
                 self._is_first_skip = False
-                skip_confirm_src_img = self._img_service.screenshot()
-                skip_confirm_img = self._img_service.resize(skip_confirm_src_img)
-                skip_confirm_ocr_results = self._ocr_service.ocr(skip_confirm_img)
-                self.page_action(self._skip_confirm_page, skip_confirm_src_img, skip_confirm_img,
-                                 skip_confirm_ocr_results)
+                # 点击跳过后画面已变化，重新截图
+                skip_confirm_frame = self._img_service.capture_frame()
+                skip_confirm_ocr_results = self._ocr_service.ocr(skip_confirm_frame.img)
+                self.page_action(self._skip_confirm_page, skip_confirm_frame, skip_confirm_ocr_results)
                 time.sleep(0.1)
             # else:
             #     time.sleep(0.1)
@@ -137,28 +123,30 @@ class AutoStoryServiceImpl(PageEventAbstractService):
         else:
             if not self._is_auto_play_enabled:
                 # 打开自动播放
-                self.page_action(self._auto_play_page, src_img, img, ocr_results)
+                self.page_action(self._auto_play_page, frame, ocr_results)
                 time.sleep(0.005)
-                if self.page_action(self._auto_play_open_page, src_img, img, ocr_results):
+                if self.page_action(self._auto_play_open_page, frame, ocr_results):
                     self._is_auto_play_enabled = True
                 time.sleep(0.005)
 
             # 剧情对话框，不跳过，一句一句自动过剧情
-            if self.page_action(self._dialogue_page, src_img, img, ocr_results):
+            if self.page_action(self._dialogue_page, frame, ocr_results):
                 time.sleep(2)
 
         # NPC交互框
         if auto_npc_interact:
-            self.page_action(self._npc_interact_page, src_img, img, ocr_results)
+            self.page_action(self._npc_interact_page, frame, ocr_results)
 
         self._set_mouse_position_to_bottom_right()
 
     @staticmethod
-    def page_action(page: Page, src_img: np.ndarray, img: np.ndarray, ocr_results: list[TextPosition]) -> bool:
-        if not page.is_match(src_img, img, ocr_results):
+    def page_action(page: Page, frame: FrameContext, ocr_results: list[TextPosition]) -> bool:
+        if not page.is_match(frame.src_img, frame.img, ocr_results, frame):
             return False
         logger.info("当前页面：%s", page.name)
-        page.action(page.matchPositions)
+        frame.detach()  # 同一帧之后还要匹配其他页面，动作中的截图不能覆盖它
+        with metrics_util.stage("action"):
+            page.action(page.matchPositions)
         return True
 
     def _set_mouse_position_to_bottom_right(self):
@@ -191,9 +179,11 @@ class AutoStoryServiceImpl(PageEventAbstractService):
     def _on_press(self, key):
         logger.debug(f"按键 {key} 被按下")
         self._mouse_last_check_time = time.perf_counter()
-        self._dynamic_fps_limit.refresh()
+        self._key_press_time = time.perf_counter()
 
     def _listen_keys(self):
+        if keyboard is None:
+            return
         with keyboard.Listener(on_press=self._on_press) as listener:
             listener.join()
 
@@ -2,7 +2,11 @@ import logging
 import time
 
 import numpy as np
-import win32con
+
+try:
+    import win32con
+except ImportError:  # 非Windows平台，只能以回放模式运行，使用 RecordingControlService
+    win32con = None
 
 from src.core.contexts import Context
 from src.core.interface import ControlService, WindowService, PlayerControlService, ExtendedControlService, \
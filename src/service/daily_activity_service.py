@@ -8,10 +8,12 @@ from enum import Enum
 from pydantic import BaseModel, Field
 
 from src.core.contexts import Context, Status
+from src.core.frame_context import FrameContext
 from src.core.interface import ControlService, OCRService, ImgService, WindowService, ODService
 from src.core.pages import Page, ConditionalAction
 from src.core.regions import Position, TextPosition
 from src.service.page_event_service import PageEventAbstractService
+from src.util import metrics_util
 
 logger = logging.getLogger(__name__)
 
@@ -103,20 +105,21 @@ class DailyActivityServiceImpl(PageEventAbstractService, ABC):
             if datetime.now() - start_time > timedelta(seconds=3):
                 self._control_service.activate()
 
-            src_img = self._img_service.screenshot()
-            img = self._img_service.resize(src_img)
-            ocr_results = self._ocr_service.ocr(img)
-            # self._ocr_service.print_ocr_result(ocr_results)
-            actioned = False
-            for page in self.get_pages():
-                if not page.is_match(src_img, img, ocr_results):
-                    continue
-                logger.info("当前页面：%s", page.name)
-                page.action(page.matchPositions)
-                actioned = True
-                break
-            if not actioned:
-                self._run_conditional_actions()
+            with metrics_util.tick():
+                frame = self._img_service.capture_frame()
+                ocr_results = self._ocr_service.ocr(frame.img)
+                # self._ocr_service.print_ocr_result(ocr_results)
+                actioned = False
+                for page in self.get_page_index(self.get_pages()).candidates(ocr_results):
+                    if not page.is_match(frame.src_img, frame.img, ocr_results, frame):
+                        continue
+                    logger.info("当前页面：%s", page.name)
+                    with metrics_util.stage("action"):
+                        page.action(page.matchPositions)
+                    actioned = True
+                    break
+                if not actioned:
+                    self._run_conditional_actions()
 
             if self._ctx.job_stop:
                 logger.info("任务终止")
@@ -158,19 +161,17 @@ class DailyActivityServiceImpl(PageEventAbstractService, ABC):
     def get_conditional_actions(self) -> list[ConditionalAction]:
         return self._conditional_actions
 
-    def _get_ocr_results(self):
-        src_img = self._img_service.screenshot()
-        img = self._img_service.resize(src_img)
-        ocr_results = self._ocr_service.ocr(img)
-        return src_img, img, ocr_results
+    def _get_ocr_results(self) -> tuple[FrameContext, list[TextPosition]]:
+        frame = self._img_service.capture_frame()
+        ocr_results = self._ocr_service.ocr(frame.img)
+        return frame, ocr_results
 
     def _build_UI_F2_Guidebook_RecurringChallenges_action(self):
 
         def action(positions: dict[str, Position]):
             if self._ctx.job_consume_waveplate_finished:
-                src_img = self._img_service.screenshot()
-                img = self._img_service.resize(src_img)
-                position = self._img_service.match_template(img, "UI_F2_Guidebook_Activity.png")
+                frame = self._img_service.capture_frame()
+                position = self._img_service.match_template(frame, "UI_F2_Guidebook_Activity.png")
                 logger.debug("match template: %s", position)
                 if not position:
                     logger.warning("活跃度")
@@ -204,9 +205,7 @@ class DailyActivityServiceImpl(PageEventAbstractService, ABC):
                     logger.debug("剩余体力: %s", waveplate)
                     self._ctx.waveplate = waveplate
 
-                src_img = self._img_service.screenshot()
-                img = self._img_service.resize(src_img)
-                ocr_results = self._ocr_service.ocr(img)
+                ocr_results = self._ocr_service.ocr(self._img_service.capture_frame().img)
                 self._ocr_service.print_ocr_result(ocr_results)
 
                 desc_regex = r"^(?:武器及技能材料|Weapon\s*and\s*Skill\s*Materials:)"
@@ -238,9 +237,7 @@ class DailyActivityServiceImpl(PageEventAbstractService, ABC):
                     else:  # 向上翻，查找
                         self._control_service.scroll_mouse(30, x, y)
                         time.sleep(2)
-                    src_img = self._img_service.screenshot()
-                    img = self._img_service.resize(src_img)
-                    ocr_results = self._ocr_service.ocr(img)
+                    ocr_results = self._ocr_service.ocr(self._img_service.capture_frame().img)
                     self._ocr_service.print_ocr_result(ocr_results)
 
                     filter_list = []
@@ -349,9 +346,8 @@ class DailyActivityServiceImpl(PageEventAbstractService, ABC):
 
         def _UI_F2_Guidebook_to_RecurringChallenges_action(positions: dict[str, Position]):
             """ 前往周期挑战(刷体力) """
-            src_img = self._img_service.screenshot()
-            img = self._img_service.resize(src_img)
-            position = self._img_service.match_template(img, "UI_F2_Guidebook_RecurringChallenges.png")
+            frame = self._img_service.capture_frame()
+            position = self._img_service.match_template(frame, "UI_F2_Guidebook_RecurringChallenges.png")
             logger.debug("match template: %s", position)
             if not position:
                 logger.warning("未找到周期挑战")
@@ -371,12 +367,12 @@ class DailyActivityServiceImpl(PageEventAbstractService, ABC):
                 if positions.get(claim_match_name):
                     text_match = self._UI_F2_Guidebook_Activity.get_text_match_by_name(claim_match_name)
                     for _ in range(20):
-                        src_img, img, ocr_results = self._get_ocr_results()
+                        frame, ocr_results = self._get_ocr_results()
                         if ocr_results is None:
                             time.sleep(0.5)
                             continue
                         self._ocr_service.print_ocr_result(ocr_results)
-                        position = self._UI_F2_Guidebook_Activity.text_match(text_match, src_img, img, ocr_results)
+                        position = self._UI_F2_Guidebook_Activity.text_match(text_match, frame.src_img, frame.img, ocr_results)
                         logger.debug("%s position: %s", claim_match_name, position)
                         if not position:
                             break
@@ -384,7 +380,7 @@ class DailyActivityServiceImpl(PageEventAbstractService, ABC):
                         time.sleep(0.5)
 
                 # 领取活跃度100奖励
-                src_img, img, ocr_results = self._get_ocr_results()
+                frame, ocr_results = self._get_ocr_results()
                 activity_pts = self._ocr_service.search_texts(ocr_results, r"^1\d0$")
                 logger.debug("activity pts: %s", activity_pts)
                 w, h = self._window_service.get_client_wh()
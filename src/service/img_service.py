@@ -1,12 +1,19 @@
 import logging
+import os
+import threading
+import time
 from enum import Enum
 
 import numpy as np
 
 from src.core.contexts import Context
+from src.core.frame_context import FrameContext
 from src.core.interface import ImgService, WindowService
 from src.core.regions import Position, DynamicPosition
-from src.util import screenshot_util, img_util, file_util, mss_util
+from src.util import screenshot_util, img_util, file_util, mss_util, frame_bus_util, capture_util
+from src.util import template_match_util
+from src.util.capture_util import Capturer
+from src.util.template_match_util import TemplateMatcher
 from src.util.wrap_util import timeit
 
 logger = logging.getLogger(__name__)
@@ -19,68 +26,151 @@ class ImgServiceImpl(ImgService):
         super().__init__()
         self._context: Context = context
         self._window_service: WindowService = window_service
-        self._template_img_cache: dict[str, np.ndarray] = {}
-        self._mss_camera = mss_util.create_mss()
+        self._matcher: TemplateMatcher = template_match_util.get_matcher()
+        self._resize_buffers = img_util.BufferPool()
+        # 前台截图时才创建，回放等不截屏的场景不需要
+        self._mss_camera = None
         # self._dx_camera = dxcam_util.create_camera()
         self._capture_mode: Enum = ImgService.CaptureEnum.BG
+        self._capturer: Capturer | None = None
+        # 截图流水线的后台线程与主线程可能同时截图，截图器持有的DC等资源不能并发使用
+        self._capture_lock = threading.Lock()
+        # 帧总线由截图进程截到第一帧后才创建，连接不上时自行截图，之后定时重试
+        self._frame_bus: frame_bus_util.FrameBus | None = None
+        self._frame_bus_name: str | None = os.environ.get(frame_bus_util.ENV_FRAME_BUS_NAME)
+        self._frame_bus_attach_time = 0.0
 
-    @timeit(ignore=3)
+    @timeit(ignore=3, stage="capture")
     def screenshot(self, region: tuple[float, float, float, float] | DynamicPosition | None = None) -> np.ndarray:
+        return self.screenshot_region(region)[0]
+
+    @timeit(stage="capture")
+    def screenshot_region(self, region: tuple[float, float, float, float] | DynamicPosition | None = None
+                          ) -> tuple[np.ndarray, Position]:
         if isinstance(region, DynamicPosition):
             region = region.rate
-        focus_rect_on_screen = self._window_service.get_focus_rect_on_screen(region)
-        if self._capture_mode == ImgService.CaptureEnum.FG:
-            return self._foreground_screenshot(focus_rect_on_screen)
-        else:
-            return self._background_screenshot(focus_rect_on_screen)
+        if self._attach_frame_bus() and (result := self._frame_bus_screenshot(region)) is not None:
+            return result
+        w, h = self._window_service.get_client_wh()
+        x1, y1, x2, y2 = self._to_client_rect(region, w, h)
+        with self._capture_lock:
+            if self._capture_mode == ImgService.CaptureEnum.FG:
+                left, top, _, _ = self._window_service.get_client_rect_on_screen()
+                img = self._foreground_screenshot((left + x1, top + y1, left + x2, top + y2))
+            else:
+                img = self._background_screenshot((x1, y1, x2, y2))
+        return img, Position.build(x1, y1, x2, y2)
 
     def set_capture_mode(self, capture_mode: ImgService.CaptureEnum):
         self._capture_mode = capture_mode
 
+    def capture_frame(self, src_img: np.ndarray | None = None) -> FrameContext:
+        if src_img is None:
+            src_img = self.screenshot()
+        return FrameContext(src_img, resizer=self._resize_to_buffer)
+
+    @timeit(stage="resize")
+    def _resize_to_buffer(self, img: np.ndarray) -> np.ndarray:
+        return img_util.resize_by_weight(img, buffers=self._resize_buffers)
+
+    @staticmethod
+    def _to_client_rect(region: tuple[float, float, float, float] | None, w: int, h: int) -> tuple[int, int, int, int]:
+        """百分比区域转成客户区像素坐标，与 DynamicPosition.to_tuple 取整方式一致"""
+        if region is None:
+            return 0, 0, w, h
+        return capture_util.clip_region(DynamicPosition(rate=region).to_tuple(h, w), (w, h))
+
+    def _attach_frame_bus(self) -> bool:
+        """连接帧总线，未开启或暂时连接不上返回False，每秒最多重试一次"""
+        if self._frame_bus is not None:
+            return True
+        if self._frame_bus_name is None or time.monotonic() - self._frame_bus_attach_time < 1.0:
+            return False
+        self._frame_bus_attach_time = time.monotonic()
+        try:
+            self._frame_bus = frame_bus_util.FrameBus.attach(self._frame_bus_name)
+        except FileNotFoundError:
+            logger.debug("帧总线尚未创建，使用自行截图: %s", self._frame_bus_name)
+            return False
+        return True
+
+    def _frame_bus_screenshot(self, region: tuple[float, float, float, float] | None = None
+                              ) -> tuple[np.ndarray, Position] | None:
+        """从帧总线读取最新帧的副本，返回BGR图片及区域坐标；没有帧或画面过旧时返回None"""
+        seq, img = self._frame_bus.read_latest()
+        if img is None:
+            return None
+        age_seconds = self._frame_bus.get_age_seconds(seq)
+        if age_seconds is None or age_seconds > self._context.config.app.FrameBusMaxAge:
+            logger.debug("帧总线画面过旧: %s", age_seconds)
+            return None
+        h, w = img.shape[:2]
+        x1, y1, x2, y2 = self._to_client_rect(region, w, h)
+        return img[y1:y2, x1:x2], Position.build(x1, y1, x2, y2)
+
     def _foreground_screenshot(self, region: tuple[int, int, int, int] | None = None) -> np.ndarray:
+        """
+        :param region: 屏幕坐标
+        """
         # return dxcam_util.screenshot(self._dx_camera, region)
         # return screenshot_util.screenshot_bitblt(self._window_service.window, region)
+        if self._mss_camera is None:
+            self._mss_camera = mss_util.create_mss()
         return mss_util.screenshot(self._mss_camera, region)
 
     def _background_screenshot(self, region: tuple[int, int, int, int] | None = None) -> np.ndarray:
-        return screenshot_util.screenshot(self._window_service.window)
+        """
+        :param region: 客户区坐标，只读回该区域
+        """
+        hwnd = self._window_service.window
+        if self._capturer is None or self._capturer.adapter.hwnd != hwnd:  # 窗口句柄变了需重建
+            if self._capturer is not None:
+                self._capturer.release()
+            self._capturer = screenshot_util.create_capturer(hwnd)
+        return self._capturer.capture(region)
 
     def match_template(self,
-                       img: np.ndarray | None,
+                       img: np.ndarray | FrameContext | None,
                        template_img: np.ndarray | str,
                        region: tuple[int, int, int, int] | None = None,
                        threshold: float = 0.8
                        ) -> None | Position:
         """
         使用 opencv matchTemplate 方法在指定区域内进行模板匹配并返回匹配结果
-        :param img:  大图片
+        :param img:  大图片，传入帧上下文时复用其灰度图
         :param template_img: 小图片，若是字符串，必需是模板目录内的文件名（无路径的含后缀的纯文件名）
         :param region: 搜索区域（x1, y1, x2, y2），默认为 None 表示全图搜索
         :param threshold:  阈值
         :return: Position 或 None
         """
+        return self.match_templates(img, [template_img], region, threshold)[0]
+
+    def match_templates(self,
+                        img: np.ndarray | FrameContext | None,
+                        template_imgs: list[np.ndarray | str],
+                        region: tuple[int, int, int, int] | None = None,
+                        threshold: float = 0.8,
+                        scale: float = 1.0) -> list[Position | None]:
         if img is None:
-            img = self.resize(self.screenshot())
-        if isinstance(template_img, str):
-            if template_img not in self._template_img_cache:
-                self._template_img_cache[template_img] = img_util.read_img(file_util.get_assets_template(template_img))
-            template_img = self._template_img_cache[template_img]
-        # 如果提供了region参数，则裁剪出指定区域，否则使用整幅图像
-        if region:
-            cropped_img = img[region[1]:region[3], region[0]:region[2]]
-        else:
-            cropped_img = img
-        confidence, position = img_util.match_template(cropped_img, template_img)
-        if confidence < threshold:
-            return None
-        return Position.build(position[0], position[1], position[2], position[3], confidence=confidence)
+            img = self.capture_frame()
+        gray = img.gray if isinstance(img, FrameContext) else img_util.bgr2gray(img)
+        results = []
+        for confidence, position in self._matcher.match_many(gray, template_imgs, region, scale, pyramid=True):
+            if confidence < threshold:
+                results.append(None)
+            else:
+                results.append(Position.build(*position, confidence=confidence))
+        return results
 
+    @timeit(stage="resize")
     def resize_by_dsize(self, img: np.ndarray, dsize: tuple[int, int]) -> np.ndarray:
         return img_util.resize(img, dsize)
 
+    @timeit(stage="resize")
     def resize_by_weight(self, img: np.ndarray, target_weight: int = 1280) -> np.ndarray:
         return img_util.resize_by_weight(img, target_weight)
 
+    @timeit(stage="resize")
     def resize_by_ratio(self, img: np.ndarray, ratio: float | None = None) -> np.ndarray:
         if ratio is None:
             ratio = self._window_service.get_ratio()
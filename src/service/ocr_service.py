@@ -1,4 +1,5 @@
 import asyncio
+import bisect
 import logging
 import re
 import time
@@ -7,16 +8,24 @@ from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 
+from src.core import waits
 from src.core.contexts import Context
+from src.core.frame_context import FrameContext
 from src.core.interface import OCRService, ImgService, WindowService
-from src.core.regions import Position, RapidocrPosition, TextPosition, DynamicPosition
-from src.util import rapidocr_util
+from src.core.regions import Position, TextPosition, DynamicPosition, OcrResults, TextBox
+from src.core.waits import FrameWaiter, Predicate
+from src.util import img_util, rapidocr_util
+from src.util.frame_diff_util import FrameDiffGate
+from src.util.incremental_ocr_util import IncrementalOcr
+from src.util.onnx_util import OrtProfile
 from src.util.wrap_util import timeit
 
 logger = logging.getLogger(__name__)
 
 
 class RapidOcrServiceImpl(OCRService):
+    # ocr_many 拼图时区域之间的间隔px
+    _STACK_GAP = 32
 
     def __init__(self, context: Context, window_service: WindowService, img_service: ImgService):
         logger.debug("Initializing %s", self.__class__.__name__)
@@ -25,11 +34,17 @@ class RapidOcrServiceImpl(OCRService):
         self._window_service: WindowService = window_service
         self._img_service: ImgService = img_service
         # self._engine = rapidocr_util.create_ocr(use_gpu=True)
-        self._engine = rapidocr_util.create_ocr(use_gpu=False)
+        self._engine = rapidocr_util.create_ocr(use_gpu=False, profile=OrtProfile.build(self._context.config.app))
         # self._engine = paddleocr_util.create_paddleocr(use_gpu=True, precision="int8")
         # self._collection: set[str] = set()
         self._last_time = time.time()
         # self._executor = ThreadPoolExecutor(max_workers=2)
+        # 画面变化检测，按图片尺寸区分，不同区域的截图互不干扰
+        self._frame_diff_gates: dict[tuple, FrameDiffGate] = {}
+        # 分块增量OCR，同样按图片尺寸区分
+        self._incremental_ocrs: dict[tuple, IncrementalOcr] = {}
+        # 等待文本时持续取帧
+        self._waiter = FrameWaiter(self._img_service.capture_frame)
 
     # def __del__(self):
     #     self._executor.shutdown(wait=False)
@@ -47,13 +62,20 @@ class RapidOcrServiceImpl(OCRService):
                 filter_list.append(result)
         return filter_list
 
-    def find_text(self, targets: str | list[str], img: np.ndarray | None = None,
+    def find_text(self, targets: str | list[str], img: np.ndarray | FrameContext | None = None,
                   position: Position | DynamicPosition | None = None) -> TextPosition | None:
         if isinstance(targets, str):
             targets = [targets]
-        if img is None:
-            img = self._img_service.screenshot()
-        result = self.ocr(img, position)
+        if isinstance(img, FrameContext):
+            img = img.src_img
+        if img is None and isinstance(position, DynamicPosition):
+            # 只截取需要识别的区域，结果坐标映射回完整截图
+            img, roi = self._img_service.screenshot_region(position)
+            result = self._offset(self.ocr(img), roi.x1, roi.y1)
+        else:
+            if img is None:
+                img = self._img_service.screenshot()
+            result = self.ocr(img, position)
         for target in targets:
             if text_info := self.search_text(result, target):
                 return text_info
@@ -81,35 +103,147 @@ class RapidOcrServiceImpl(OCRService):
 
     def wait_text(self, targets: str | list[str], timeout: int = 3,
                   position: Position | DynamicPosition | None = None, wait_time: float = 0.1) -> TextPosition | None:
+        # 画面稳定后识别一次，一直在变时每 wait_time 秒识别一次
+        if not isinstance(position, DynamicPosition):
+            result = self._waiter.wait_for([waits.text(self, targets, position)], timeout, settle_timeout=wait_time)
+            return result.value if result is not None else None
+        # 区域按比例给出时只截取该区域，每帧的截图、画面变化检测与OCR都只处理该区域，结果映射回完整截图坐标
         if isinstance(targets, str):
             targets = [targets]
-        start_time = time.monotonic()
-        while time.monotonic() - start_time < timeout:
-            result = self.find_text(targets, img=None, position=position)
-            if result is not None:
-                return result
-            time.sleep(wait_time)  # 每次截图和 OCR 处理之间增加一个短暂的暂停时间
-        return None
+        roi: list[Position] = []
+
+        def capture_roi() -> FrameContext:
+            img, region = self._img_service.screenshot_region(position)
+            roi[:] = [region]
+            return FrameContext(img)
+
+        def check(frame: FrameContext) -> TextPosition | None:
+            if (text_info := self.find_text(targets, frame.src_img)) is None:
+                return None
+            return self._offset([text_info], roi[0].x1, roi[0].y1)[0]
+
+        result = self._waiter.wait_for([Predicate("|".join(targets), check, settled=True)], timeout,
+                                       settle_timeout=wait_time, source=capture_roi)
+        return result.value if result is not None else None
 
-    @timeit(ignore=3)
+    @timeit(ignore=3, stage="ocr")
     def ocr(self, img: np.ndarray, position: Position | DynamicPosition | None = None,
-            det=True, rec=True, cls=False) -> list[TextPosition]:
+            det=True, rec=True, cls=False) -> OcrResults:
         self._ocr_wait()
         if position is not None:
             if isinstance(position, DynamicPosition):
-                w, h = self._window_service.get_client_wh()
-                position = position.to_position(h, w)
+                position = position.to_position(img.shape[0], img.shape[1])
             img = img[position.y1:position.y2, position.x1:position.x2]
         if det is True and rec is True and cls is False:
-            return self._ocr_det_rec(img)
+            results = self._ocr_det_rec_with_frame_diff(img)
         elif det is False and rec is True and cls is False:
+            results = [result for result in self._rec_batch([img], [(0, 0)]) if result is not None]
+        else:
+            raise NotImplementedError("不支持的识别方式")
+        if position is not None:  # 区域内坐标映射回传入图片的坐标
+            return self._offset(results, position.x1, position.y1)
+        return OcrResults.of(results)
+
+    @timeit(ignore=3, stage="ocr")
+    def rec(self, img: np.ndarray, positions: list[Position | DynamicPosition]) -> list[TextPosition]:
+        self._ocr_wait()
+        crops, origins = self._crop(img, positions)
+        return [result for result in self._rec_batch(crops, origins) if result is not None]
+
+    @timeit(ignore=3, stage="ocr")
+    def ocr_many(self, img: np.ndarray, positions: list[Position | DynamicPosition],
+                 det: bool = True) -> list[list[TextPosition]]:
+        self._ocr_wait()
+        crops, origins = self._crop(img, positions)
+        if not det:
+            return [[result] if result is not None else [] for result in self._rec_batch(crops, origins)]
+        if not crops:
+            return [[] for _ in positions]
+        # 各区域竖向拼成一张图，一次检测+识别，再按文本框中心所在的区域拆分，中心落在区域间隔里的框丢弃
+        canvas, tops = img_util.vstack_with_gap(crops, gap=self._STACK_GAP)
+        bottoms = [top + crop.shape[0] for top, crop in zip(tops, crops)]
+        results: list[list[TextPosition]] = [[] for _ in crops]
+        for result in self._ocr_det_rec(canvas):
+            center = (result.y1 + result.y2) // 2
+            index = bisect.bisect_right(tops, center) - 1
+            if index < 0 or center >= bottoms[index]:
+                logger.debug("Drop box in stack gap: %s", result)
+                continue
+            top, bottom = tops[index], bottoms[index]
+            x, y = origins[index]
+            results[index].append(result.model_copy(update={
+                "x1": result.x1 + x, "x2": result.x2 + x,
+                "y1": max(result.y1, top) - top + y, "y2": min(result.y2, bottom) - top + y,
+            }))
+        return results
+
+    @staticmethod
+    def _crop(img: np.ndarray, positions: list[Position | DynamicPosition]
+              ) -> tuple[list[np.ndarray], list[tuple[int, int]]]:
+        """裁剪各区域，返回裁剪图与其左上角在截图中的坐标"""
+        height, width = img.shape[:2]
+        crops, origins = [], []
+        for position in positions:
+            if isinstance(position, DynamicPosition):
+                position = position.to_position(height, width)
+            crops.append(img[position.y1:position.y2, position.x1:position.x2])
+            origins.append((position.x1, position.y1))
+        return crops, origins
+
+    def _rec_batch(self, crops: list[np.ndarray], origins: list[tuple[int, int]]) -> list[TextPosition | None]:
+        """
+        批量识别裁剪图，每张图整体作为一个文本框
+        :return: 与 crops 一一对应，空图、空文本与低置信度结果为None
+        """
+        text_score = self._engine.text_score
+        indexes = [i for i, crop in enumerate(crops) if crop.size > 0]
+        outputs = rapidocr_util.recognize(self._engine, [crops[i] for i in indexes])
+        results: list[TextPosition | None] = [None] * len(crops)
+        for i, (text, score) in zip(indexes, outputs):
+            if not text or score < text_score:
+                continue
+            (x, y), crop = origins[i], crops[i]
+            results[i] = TextBox(x, y, x + crop.shape[1], y + crop.shape[0], float(score), text)
+        return results
+
+    @staticmethod
+    def _offset(results: list[TextPosition], x: int, y: int) -> OcrResults:
+        # 结果可能被画面变化检测缓存复用，offset 返回新对象，不修改原结果
+        return OcrResults.of(results).offset(x, y)
+
+    def _ocr_det_rec_with_frame_diff(self, img: np.ndarray) -> list[TextPosition]:
+        """画面与上次同尺寸图片相比没有变化时，直接复用上次的识别结果；开启增量OCR时只重新识别变化的区域"""
+        config = self._context.config.app
+        if config.OcrIncremental:
+            return self._ocr_det_rec_incremental(img)
+        if not config.OcrFrameDiff:
             return self._ocr_det_rec(img)
-        raise NotImplementedError("不支持的识别方式")
+        key = img.shape
+        if (gate := self._frame_diff_gates.get(key)) is None:
+            if len(self._frame_diff_gates) >= 8:  # 只保留最近的几种尺寸
+                self._frame_diff_gates.pop(next(iter(self._frame_diff_gates)))
+            gate = self._frame_diff_gates[key] = FrameDiffGate(config.OcrFrameDiffThreshold)
+        if (results := gate.get(img)) is not None:
+            logger.debug("画面未变化，复用OCR结果, hits: %s, misses: %s", gate.hits, gate.misses)
+            return list(results)
+        results = self._ocr_det_rec(img)
+        gate.put(results)
+        return list(results)
+
+    def _ocr_det_rec_incremental(self, img: np.ndarray) -> list[TextPosition]:
+        config = self._context.config.app
+        key = img.shape
+        if (incremental_ocr := self._incremental_ocrs.get(key)) is None:
+            if len(self._incremental_ocrs) >= 8:  # 只保留最近的几种尺寸
+                self._incremental_ocrs.pop(next(iter(self._incremental_ocrs)))
+            incremental_ocr = self._incremental_ocrs[key] = IncrementalOcr(
+                self._ocr_det_rec, threshold=config.OcrFrameDiffThreshold, margin=config.OcrIncrementalMargin)
+        return incremental_ocr.ocr(img)
 
-    def _ocr_det_rec(self, img: np.ndarray) -> list[TextPosition]:
+    def _ocr_det_rec(self, img: np.ndarray) -> OcrResults:
         output = self._engine(img, use_det=True, use_rec=True, use_cls=False)
-        positions = RapidocrPosition.format(output)
-        return positions
+        # 不逐个创建 pydantic 模型，文本框坐标保存在数组中，用到时才创建轻量的 TextBox
+        return OcrResults.from_rapidocr(output)
 
     def _ocr_wait(self):
         """限制OCR调用频率，默认不限制OcrInterval=0"""
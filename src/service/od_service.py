@@ -8,8 +8,11 @@ from threading import RLock
 import numpy as np
 
 from src.core.contexts import Context
+from src.core.frame_context import FrameContext
 from src.core.interface import ODService, ImgService, WindowService
 from src.util import yolo_util
+from src.util.onnx_util import OrtProfile
+from src.util.session_pool_util import SessionPool
 from src.util.wrap_util import timeit
 from src.util.yolo_util import Model
 
@@ -28,10 +31,14 @@ class YoloServiceImpl(ODService):
         # self._provider: list[str] = yolo_util.get_ort_providers()
         self._default_model: Model = yolo_util.MODEL_BOSS_DEFAULT
         self._current_model: Model = self._default_model
-        self._session = self._create_session(self._current_model.path)
         # self._executor = ThreadPoolExecutor(max_workers=2)
         self._reward_model: Model = yolo_util.MODEL_REWARD
-        self._reward_session = self._create_session(self._reward_model.path)
+        # 声骸与奖励共用会话池，启动时在后台创建默认模型与奖励模型的会话
+        self._session_pool: SessionPool = SessionPool(
+            self._create_session, memory_budget=self._context.config.app.YoloSessionMemory * 1024 * 1024)
+        self._session_pool.preload(self._current_model.path)
+        self._session_pool.preload(self._reward_model.path)
+        self._last_boss_name: str | None = None
 
     # def __del__(self):
     #     self._executor.shutdown(wait=False)
@@ -40,23 +47,26 @@ class YoloServiceImpl(ODService):
         return yolo_util.create_ort_session(
             model_path=model_path,
             providers=yolo_util.get_ort_providers(),
-            sess_options=yolo_util.create_ort_session_options()
+            profile=OrtProfile.build(self._context.config.app)
         )
 
-    @timeit(ignore=3)
-    def search_echo(self, img: np.ndarray | None = None) -> tuple[int, int, int, int] | None:
+    @timeit(ignore=3, stage="yolo")
+    def search_echo(self, img: np.ndarray | FrameContext | None = None) -> tuple[int, int, int, int] | None:
         boss_name = self._context.boss_task_ctx.lastBossName
         if img is None:
             img = self._img_service.screenshot()
+        elif isinstance(img, FrameContext):
+            img = img.src_img
         # with self._rlock:
         model = self.get_model_by_boss_name(boss_name)
         if self._current_model != model:
             self._current_model = model
             logger.debug("Switch model: %s", model.name)
-            timestamp = time.time()
-            self._session = self._create_session(self._current_model.path)
-            logger.debug("Session creation time: %s seconds", int(time.time() - timestamp))
-        results = yolo_util.search_echo(self._session, img, model.confidence_thres, model.iou_thres)
+        if self._last_boss_name != boss_name:
+            self._last_boss_name = boss_name
+            self._preload_next_boss_model(boss_name)
+        session = self._session_pool.get(model.path)
+        results = yolo_util.search_echo(session, img, model.confidence_thres, model.iou_thres)
         if results is None:
             return None
         box, score, class_id = results
@@ -81,6 +91,15 @@ class YoloServiceImpl(ODService):
     #         logger.error(f"Inference failed: {e}")
     #         return None
 
+    def _preload_next_boss_model(self, boss_name: str):
+        """目标boss按顺序轮换，提前在后台创建下一个boss所用模型的会话"""
+        target_boss = self._context.config.app.TargetBoss
+        if not target_boss:
+            return
+        index = target_boss.index(boss_name) if boss_name in target_boss else -1
+        next_model = self.get_model_by_boss_name(target_boss[(index + 1) % len(target_boss)])
+        self._session_pool.preload(next_model.path)
+
     @staticmethod
     def get_model_by_boss_name(boss_name: str):
         for model in yolo_util.MODEL_BOSS_ALL:
@@ -88,12 +107,15 @@ class YoloServiceImpl(ODService):
                 return model
         return yolo_util.MODEL_BOSS_UNKNOWN
 
-    @timeit(ignore=3)
-    def search_reward(self, img: np.ndarray | None = None) -> tuple[int, int, int, int] | None:
+    @timeit(ignore=3, stage="yolo")
+    def search_reward(self, img: np.ndarray | FrameContext | None = None) -> tuple[int, int, int, int] | None:
         if img is None:
             img = self._img_service.screenshot()
+        elif isinstance(img, FrameContext):
+            img = img.src_img
         model = self._reward_model
-        results = yolo_util.search_echo(self._reward_session, img, model.confidence_thres, model.iou_thres)
+        session = self._session_pool.get(model.path)
+        results = yolo_util.search_echo(session, img, model.confidence_thres, model.iou_thres)
         if results is None:
             return None
         box, score, class_id = results
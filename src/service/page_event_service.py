@@ -7,12 +7,16 @@ from typing import Callable
 
 import numpy as np
 
+from src.core import waits
 from src.core.contexts import Context, Status
+from src.core.frame_context import FrameContext
 from src.core.interface import ControlService, OCRService, PageEventService, ImgService, WindowService, ODService
 from src.core.languages import Languages
+from src.core.page_index import PageIndex
 from src.core.pages import ConditionalAction, TextMatch, Page
 from src.core.regions import TextPosition, DynamicPosition, Position
-from src.util import keymouse_util
+from src.core.waits import FrameWaiter, Predicate, WaitResult
+from src.util import keymouse_util, metrics_util, pipeline_util
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +32,10 @@ class PageEventAbstractService(PageEventService, ABC):
         self._ocr_service: OCRService = ocr_service
         self._control_service: ControlService = control_service
         self._od_service: ODService = od_service
+        # 页面索引，按页面列表缓存
+        self._page_indexes: dict[tuple[int, ...], PageIndex] = {}
+        # 等待页面切换时持续取帧
+        self._waiter = FrameWaiter(self._img_service.capture_frame)
         # page
         self._UI_F2_Guidebook_Activity = self.build_UI_F2_Guidebook_Activity()
         self._UI_F2_Guidebook_RecurringChallenges = self.build_UI_F2_Guidebook_RecurringChallenges()
@@ -48,7 +56,13 @@ class PageEventAbstractService(PageEventService, ABC):
                 img: np.ndarray | None = None,
                 ocr_results: list[TextPosition] | None = None,
                 pages: list[Page] | None = None,
-                conditional_actions: list[ConditionalAction] | None = None):
+                conditional_actions: list[ConditionalAction] | None = None,
+                frame: FrameContext | None = None) -> bool:
+        """
+        匹配页面并执行动作
+        :param frame: 本帧上下文，传入时忽略 src_img 与 img
+        :return: 是否执行了页面动作或条件操作，执行后画面可能已变化
+        """
         # prepare
         if pages is None:
             pages = self.get_pages()
@@ -56,24 +70,41 @@ class PageEventAbstractService(PageEventService, ABC):
             conditional_actions = self.get_conditional_actions()
         if not pages and not conditional_actions:
             raise ValueError("未配置匹配页面/条件操作")
-        if src_img is None:
-            src_img = self._img_service.screenshot()
-        if img is None:
-            img = self._img_service.resize(src_img)
+        if frame is None:
+            frame = FrameContext(src_img, img) if img is not None else self._img_service.capture_frame(src_img)
+        src_img, img = frame.src_img, frame.img
         if ocr_results is None:
             ocr_results = self._ocr_service.ocr(img)
 
         # action
-        for page in pages:
-            if not page.is_match(src_img, img, ocr_results):
+        actioned = False
+        for page in self.get_page_index(pages).candidates(ocr_results):  # 只匹配文本上可能命中的页面
+            if not page.is_match(src_img, img, ocr_results, frame):
                 continue
             logger.info("当前页面：%s", page.name)
-            page.action(page.matchPositions)
+            if not actioned:
+                # 页面动作中可能多次截图，截图缓冲会被覆盖，后续页面仍按本帧与 ocr_results 匹配，先复制本帧
+                frame.detach()
+                src_img, img = frame.src_img, frame.img
+            with metrics_util.stage("action"):
+                page.action(page.matchPositions)
+            actioned = True
         for conditionalAction in conditional_actions:
             if not conditionalAction():
                 continue
             logger.info("当前条件操作: %s", conditionalAction.name)
-            conditionalAction.action()
+            with metrics_util.stage("action"):
+                conditionalAction.action()
+            actioned = True
+        return actioned
+
+    def get_page_index(self, pages: list[Page]) -> PageIndex:
+        key = tuple(id(page) for page in pages)
+        if (page_index := self._page_indexes.get(key)) is None:
+            if len(self._page_indexes) >= 16:  # 只保留最近的几组页面
+                self._page_indexes.pop(next(iter(self._page_indexes)))
+            page_index = self._page_indexes[key] = PageIndex(pages)
+        return page_index
 
     def build_UI_F2_Guidebook_Activity(self, action: Callable = None) -> Page:
         return Page(
@@ -1303,14 +1334,17 @@ class PageEventAbstractService(PageEventService, ABC):
             # 转动视角搜索声骸
             max_range = 5
             for i in range(max_range):
-                img = self._img_service.screenshot()
+                frame = self._img_service.capture_frame()
 
-                absorb = self._ocr_service.find_text("^吸收$", img, search_region)
+                # OCR 与 YOLO 同时推理，吸收时不使用 YOLO 结果
+                absorb, echo_box = pipeline_util.parallel(
+                    lambda: self._ocr_service.find_text("^吸收$", frame, search_region),
+                    lambda: self._od_service.search_echo(frame),
+                )
                 if absorb and self.absorption_and_receive_rewards({}):
                     stop_search = True
                     time.sleep(0.2)
                     break
-                echo_box = self._od_service.search_echo(img)
                 if echo_box is None:
                     logger.debug("未发现声骸")
                     self._control_service.left(0.1)
@@ -1325,8 +1359,7 @@ class PageEventAbstractService(PageEventService, ABC):
                         for _ in range(2):
                             self._control_service.left(0.1)
                         time.sleep(0.3)
-                        img = self._img_service.screenshot()
-                        echo_box = self._od_service.search_echo(img)
+                        echo_box = self._od_service.search_echo(self._img_service.capture_frame())
                         if echo_box is not None:
                             break
                         stop_search = True
@@ -1429,9 +1462,14 @@ class PageEventAbstractService(PageEventService, ABC):
             # 转动视角搜索声骸
             max_range = 5
             for i in range(max_range):
-                img = self._img_service.screenshot()
-
-                if self._ocr_service.find_text("领取奖励", img=img, position=position):
+                frame = self._img_service.capture_frame()
+
+                # OCR 与 YOLO 同时推理，领取奖励时不使用 YOLO 结果
+                claim, od_box = pipeline_util.parallel(
+                    lambda: self._ocr_service.find_text("领取奖励", img=frame, position=position),
+                    lambda: self._od_service.search_reward(frame),
+                )
+                if claim:
                     self._control_service.pick_up()
                     # logger.info("模拟领取奖励(实际未领取仅关闭小窗)")
                     # logger.info("模拟领取奖励(实际未领取仅关闭小窗)")
@@ -1454,7 +1492,6 @@ class PageEventAbstractService(PageEventService, ABC):
                     # time.sleep(2)
                     return True
 
-                od_box = self._od_service.search_reward(img)
                 if od_box is None:
                     logger.debug("未发现声骸")
                     self._control_service.left(0.1)
@@ -1469,8 +1506,7 @@ class PageEventAbstractService(PageEventService, ABC):
                         for _ in range(2):
                             self._control_service.left(0.1)
                         time.sleep(0.3)
-                        img = self._img_service.screenshot()
-                        echo_box = self._od_service.search_echo(img)
+                        echo_box = self._od_service.search_echo(self._img_service.capture_frame())
                         if echo_box is not None:
                             break
                         stop_search = True
@@ -1821,66 +1857,39 @@ class PageEventAbstractService(PageEventService, ABC):
     def _need_retry(self):
         return len(self._config.TargetBoss) == 1 and self._config.TargetBoss[0] in ["无妄者", "角", "赫卡忒"]
 
+    def wait_for(self, predicates: list[Predicate], timeout: float) -> WaitResult | None:
+        """持续取帧，等待任意一个条件满足，见 waits.FrameWaiter"""
+        return self._waiter.wait_for(predicates, timeout)
+
     def wait_home(self, timeout=120) -> bool:
         """
         等待回到主界面
         :param timeout:  超时时间
         :return:
         """
-        start = datetime.now()
-        time.sleep(0.1)
-        # i = 0
-        while True:
-            # i += 1
-            # logger(f"i={i}", "DEBUG")
+        ocr_region = DynamicPosition(rate=(1 / 2, 1 / 2, 1.0, 1.0))  # 右下角四分之一
+
+        home_templates = waits.template(self._img_service, ["Quests.png", "Backpack.png", "Guidebook.png"], 0.8)
+
+        def home_check(frame: FrameContext) -> TextPosition | Position | None:
+            results = self._ocr_service.ocr(frame.src_img, ocr_region)
+            # 还在地图上，地图界面也可能匹配到主界面的模板，先排除
+            if self._ocr_service.search_text(results, "快速旅行"):
+                return None
+            if text_result := self._ocr_service.search_text(results, r"特征码|^特征.+\d{5,}"):
+                return text_result
+            # 同一帧确认不在地图上后再匹配模板
+            return home_templates.check(frame)
+
+        predicates = [Predicate("home", home_check, settled=True)]
+        deadline = time.monotonic() + timeout
+        while (remaining := deadline - time.monotonic()) > 0:
             self._control_service.activate()
-            # 修复部分情况下导致无法退出该循环的问题。
-            if (datetime.now() - start).seconds > timeout:
-                self._window_service.close_window()
-                raise Exception("等待回到主界面超时")
-            img = self._img_service.screenshot()
-            if img is None:
-                time.sleep(0.3)
-                continue
-
-            # 获取右下角四分之一部分
-            h, w = img.shape[:2]  # 获取高度和宽度
-            cropped_img = img[h // 2:, w // 2:]  # 裁剪右下角
-
-            # is_ok = False
-            results = self._ocr_service.ocr(cropped_img)
-            text_result = self._ocr_service.search_text(results, "快速旅行")
-            if text_result:
-                text_result.confidence = text_result.confidence
-                # logger.debug("Match text: Fast Travel, %s", text_result)
-                time.sleep(0.3)
-                continue
-            text_result = self._ocr_service.search_text(results, r"特征码|^特征.+\d{5,}")
-            if text_result:
-                text_result.confidence = text_result.confidence
-                # logger.debug("Match text: UID, %s", text_result)
+            if self.wait_for(predicates, min(remaining, 3.0)) is not None:
                 return True
-                # is_ok = True
-            # else:
-            #     logger.debug("No match for text: UID")
-            # 图片检测
-            pic_array = [
-                ("Quests.png", 0.8),
-                ("Backpack.png", 0.8),
-                ("Guidebook.png", 0.8),
-            ]
-            for template_img, threshold in pic_array:
-                position = self._img_service.match_template(img=img, template_img=template_img, threshold=threshold)
-                if position:
-                    # logger.debug(f"Match template: {pic_name}, {position}")
-                    return True
-                    # is_ok = True
-                # else:
-                #     logger.debug(f"No match for template: {pic_name}")
-                time.sleep(0.01)
-            # if is_ok:
-            #     return is_ok
-            time.sleep(0.3)
+        # 修复部分情况下导致无法退出该循环的问题。
+        self._window_service.close_window()
+        raise Exception("等待回到主界面超时")
 
     def _od_search(self, img, search_type: str):
         if search_type == "boss":
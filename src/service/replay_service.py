@@ -0,0 +1,233 @@
+"""
+回放模式下的窗口、截图与键鼠服务
+
+画面来自录制的图片目录或视频，键鼠操作只记录不发送，不依赖游戏窗口与win32，可在Linux上离线运行任务。
+"""
+import logging
+import time
+from typing import Any
+
+import numpy as np
+
+from src.core.contexts import Context
+from src.core.interface import WindowService, ControlService, GameControlService, \
+    PlayerControlService, ExtendedControlService
+from src.core.regions import Position, DynamicPosition
+from src.service.img_service import ImgServiceImpl
+from src.util.replay_util import ReplayFrames
+
+logger = logging.getLogger(__name__)
+
+
+class ReplayWindowService(WindowService):
+    """窗口为回放画面，客户区位于屏幕左上角，始终在前台"""
+
+    def __init__(self, context: Context, frames: ReplayFrames):
+        logger.debug("Initializing %s", self.__class__.__name__)
+        super().__init__()
+        self._context: Context = context
+        self._frames: ReplayFrames = frames
+
+    @property
+    def window(self):
+        return None
+
+    def refresh(self) -> bool:
+        return True
+
+    def get_client_wh(self) -> tuple[int, int]:
+        h, w = self._frames.current().shape[:2]
+        return w, h
+
+    def get_ratio(self):
+        return 1280 / self.get_client_wh()[0]
+
+    def get_client_rect_on_screen(self) -> tuple[int, int, int, int]:
+        w, h = self.get_client_wh()
+        return 0, 0, w, h
+
+    def get_window_rect(self) -> tuple[int, int, int, int]:
+        return self.get_client_rect_on_screen()
+
+    def get_focus_rect_on_screen(self, region: tuple[float, float, float, float] | None = None) -> tuple[
+        int, int, int, int]:
+        w, h = self.get_client_wh()
+        if region is None:
+            return 0, 0, w, h
+        return int(w * region[0]), int(h * region[1]), int(w * region[2]), int(h * region[3])
+
+    def is_foreground_window(self) -> bool:
+        return True
+
+    def close_window(self):
+        logger.info("回放模式，忽略关闭窗口")
+
+
+class ReplayImgService(ImgServiceImpl):
+    """每次截图取回放的下一帧，模板匹配、缩放等与 ImgServiceImpl 相同"""
+
+    def __init__(self, context: Context, window_service: WindowService, frames: ReplayFrames):
+        super().__init__(context, window_service)
+        # 回放画面不经过截图器与帧总线
+        self._frame_bus_name = None
+        self._frames: ReplayFrames = frames
+
+    @property
+    def frames(self) -> ReplayFrames:
+        return self._frames
+
+    def screenshot_region(self, region: tuple[float, float, float, float] | DynamicPosition | None = None
+                          ) -> tuple[np.ndarray, Position]:
+        if isinstance(region, DynamicPosition):
+            region = region.rate
+        img = self._frames.next()
+        h, w = img.shape[:2]
+        x1, y1, x2, y2 = self._to_client_rect(region, w, h)
+        return img[y1:y2, x1:x2], Position.build(x1, y1, x2, y2)
+
+
+class RecordingControlService(ControlService):
+    """键鼠操作只记录不发送，记录为 (回放帧下标, 操作名, 位置参数, 关键字参数)"""
+
+    def __init__(self, context: Context, window_service: WindowService, frames: ReplayFrames | None = None,
+                 sleep: bool = False):
+        """
+        :param frames: 用于记录操作发生在第几帧
+        :param sleep: 是否执行 sleep 操作，逐帧回放时关闭可加快回放
+        """
+        logger.debug("Initializing %s", self.__class__.__name__)
+        super().__init__()
+        self._context: Context = context
+        self._window_service: WindowService = window_service
+        self._frames: ReplayFrames | None = frames
+        self._sleep: bool = sleep
+        self.actions: list[tuple[int, str, tuple, dict[str, Any]]] = []
+
+    def _record(self, name: str, *args, **kwargs):
+        index = self._frames.index if self._frames is not None else -1
+        self.actions.append((index, name, args, kwargs))
+        logger.info("回放操作: %s%s %s", name, args, kwargs if kwargs else "")
+        return self
+
+    def game(self) -> GameControlService:
+        return self
+
+    def player(self) -> PlayerControlService:
+        return self
+
+    def extended(self) -> ExtendedControlService:
+        return self
+
+    def sleep(self, seconds: float = 0.0):
+        if self._sleep and seconds > 0.0:
+            time.sleep(seconds)
+        return self
+
+    def get_mouse_position(self):
+        return 0, 0
+
+    def get_alt_key_state(self):
+        return False
+
+    # 其余键鼠操作均只记录
+    def up(self, seconds: float = 0.0):
+        return self._record("up", seconds)
+
+    def down(self, seconds: float = 0.0):
+        return self._record("down", seconds)
+
+    def left(self, seconds: float = 0.0):
+        return self._record("left", seconds)
+
+    def right(self, seconds: float = 0.0):
+        return self._record("right", seconds)
+
+    def attack(self):
+        return self._record("attack")
+
+    def click(self, x: int = 0, y: int = 0):
+        return self._record("click", x, y)
+
+    def right_click(self):
+        return self._record("right_click")
+
+    def resonance_skill(self):
+        return self._record("resonance_skill")
+
+    def echo_skill(self):
+        return self._record("echo_skill")
+
+    def resonance_liberation(self):
+        return self._record("resonance_liberation")
+
+    def dash_dodge(self):
+        return self._record("dash_dodge")
+
+    def pick_up(self, seconds: float = 0.05):
+        return self._record("pick_up", seconds)
+
+    def camera_reset(self):
+        return self._record("camera_reset")
+
+    def jump(self):
+        return self._record("jump")
+
+    def drop(self):
+        return self._record("drop")
+
+    def use_utility(self):
+        return self._record("use_utility")
+
+    def map(self):
+        return self._record("map")
+
+    def events(self):
+        return self._record("events")
+
+    def guide_book(self):
+        return self._record("guide_book")
+
+    def esc(self):
+        return self._record("esc")
+
+    def team_member1(self):
+        return self._record("team_member1")
+
+    def team_member2(self):
+        return self._record("team_member2")
+
+    def team_member3(self):
+        return self._record("team_member3")
+
+    def toggle_team_member(self, member: int):
+        return self._record("toggle_team_member", member)
+
+    def activate(self):
+        return self._record("activate")
+
+    def fight_click(self, x: int | float = 0, y: int | float = 0, seconds: float | None = None):
+        return self._record("fight_click", x, y, seconds)
+
+    def fight_tap(self, key: str, seconds: float | None = None):
+        return self._record("fight_tap", key, seconds)
+
+    def forward_run(self, forward_run_seconds: float):
+        return self._record("forward_run", forward_run_seconds)
+
+    def forward_walk(self, forward_walk_times: int, sleep_seconds: float = None):
+        return self._record("forward_walk", forward_walk_times, sleep_seconds)
+
+    def set_mouse_position(self, x: int, y: int):
+        return self._record("set_mouse_position", x, y)
+
+    def set_mouse_position_to_bottom_right(self):
+        return self._record("set_mouse_position_to_bottom_right")
+
+    def mouse_left_down(self, x: int | float = 0, y: int | float = 0, seconds: float = 0.0):
+        return self._record("mouse_left_down", x, y, seconds)
+
+    def mouse_left_up(self, x: int | float = 0, y: int | float = 0, seconds: float = 0.0):
+        return self._record("mouse_left_up", x, y, seconds)
+
+    def scroll_mouse(self, count: int, x: int | float = 0, y: int | float = 0, seconds: float = 0.0):
+        return self._record("scroll_mouse", count, x, y, seconds)
@@ -0,0 +1,161 @@
+"""
+持久化截图缓冲
+
+窗口大小不变时复用GDI对象与输出缓冲，只在客户区大小变化时重建。
+GDI调用放在 GdiAdapter 后面，缓冲复用与尺寸失效逻辑不依赖win32，可用假实现在任意平台测试。
+"""
+import logging
+from abc import ABC, abstractmethod
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class GdiAdapter(ABC):
+    """截图用的GDI操作"""
+
+    @abstractmethod
+    def get_client_wh(self) -> tuple[int, int]:
+        """窗口客户区宽高"""
+        pass
+
+    @abstractmethod
+    def create(self, width: int, height: int):
+        """创建指定大小的设备上下文与兼容位图"""
+        pass
+
+    @abstractmethod
+    def capture(self):
+        """把窗口画面绘制到位图"""
+        pass
+
+    @abstractmethod
+    def read_bits(self, out: np.ndarray, x: int = 0, y: int = 0):
+        """把位图中以 (x, y) 为左上角、out 大小的区域写入 out，out 为 (h, w, 4) 的连续BGRA缓冲"""
+        pass
+
+    @abstractmethod
+    def release(self):
+        """释放 create 创建的GDI对象"""
+        pass
+
+
+class Capturer:
+    """有状态的截图器，复用GDI对象与BGRA/BGR缓冲，返回的图片只读，且只在之后 buffers - 1 次同尺寸截图内有效"""
+
+    def __init__(self, adapter: GdiAdapter, buffers: int = 2):
+        """
+        :param adapter: GDI操作
+        :param buffers: BGR输出缓冲个数，轮流使用，上一次返回的图片在下一次截图后仍然有效
+        """
+        if buffers < 1:
+            raise ValueError(f"buffers must be at least 1, got {buffers}")
+        self._adapter = adapter
+        self._buffer_count = buffers
+        self._wh: tuple[int, int] | None = None
+        # 按输出宽高缓存缓冲，整窗与各个ROI各有一套：(BGRA, [BGR...], 下一个BGR下标)
+        self._buffers: dict[tuple[int, int], list] = {}
+        self.rebuild_count = 0
+
+    @property
+    def adapter(self) -> GdiAdapter:
+        return self._adapter
+
+    def _rebuild(self, wh: tuple[int, int]):
+        logger.debug("Capturer rebuild: %s -> %s", self._wh, wh)
+        if self._wh is not None:
+            self._adapter.release()
+        self._adapter.create(*wh)
+        self._buffers = {}
+        self._wh = wh
+        self.rebuild_count += 1
+
+    def _get_buffers(self, wh: tuple[int, int]) -> tuple[np.ndarray, np.ndarray]:
+        width, height = wh
+        if (buffers := self._buffers.get(wh)) is None:
+            bgra = np.empty((height, width, 4), dtype=np.uint8)
+            bgr_list = [np.empty((height, width, 3), dtype=np.uint8) for _ in range(self._buffer_count)]
+            buffers = self._buffers[wh] = [bgra, bgr_list, 0]
+        bgra, bgr_list, index = buffers
+        buffers[2] = (index + 1) % self._buffer_count
+        return bgra, bgr_list[index]
+
+    def capture(self, region: tuple[int, int, int, int] | None = None) -> np.ndarray:
+        """
+        截图，返回连续的只读BGR图片，该缓冲会在 buffers 次同尺寸截图后被复用，需要保留更久时调用方自行复制
+        :param region: 客户区像素坐标 (x1, y1, x2, y2)，只读取该区域，默认整个客户区
+        """
+        wh = self._adapter.get_client_wh()
+        if wh[0] <= 0 or wh[1] <= 0:
+            raise ValueError(f"Invalid client size: {wh}")
+        if wh != self._wh:
+            self._rebuild(wh)
+        x1, y1, x2, y2 = clip_region(region, wh)
+        self._adapter.capture()
+        bgra, bgr = self._get_buffers((x2 - x1, y2 - y1))
+        self._adapter.read_bits(bgra, x1, y1)
+        bgr.flags.writeable = True
+        cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR, dst=bgr)  # 唯一一次拷贝，去除Alpha通道
+        # 调用方拿到的是共用缓冲，禁止写入，避免改坏其他持有者看到的画面
+        bgr.flags.writeable = False
+        return bgr
+
+    def release(self):
+        if self._wh is not None:
+            self._adapter.release()
+        self._wh = None
+        self._buffers = {}
+
+
+def clip_region(region: tuple[int, int, int, int] | None, wh: tuple[int, int]) -> tuple[int, int, int, int]:
+    """把区域限制在客户区内，None 表示整个客户区"""
+    width, height = wh
+    if region is None:
+        return 0, 0, width, height
+    x1, y1 = min(max(region[0], 0), width - 1), min(max(region[1], 0), height - 1)
+    x2, y2 = min(max(region[2], x1 + 1), width), min(max(region[3], y1 + 1), height)
+    return x1, y1, x2, y2
+
+
+class FakeGdiAdapter(GdiAdapter):
+    """假GDI，画面为固定的整窗BGRA图，可随时替换以模拟窗口缩放"""
+
+    def __init__(self, frame: np.ndarray | None = None, wh: tuple[int, int] = (1280, 720)):
+        """
+        :param frame: 整窗画面，BGR或BGRA，默认生成按坐标变化的渐变图，便于校验裁剪位置
+        :param wh: 未传 frame 时生成画面的宽高
+        """
+        self.frame = frame if frame is not None else self.gradient(wh)
+        self.create_count = 0
+        self.release_count = 0
+        self.capture_count = 0
+        self._created_wh: tuple[int, int] | None = None
+
+    @staticmethod
+    def gradient(wh: tuple[int, int]) -> np.ndarray:
+        width, height = wh
+        ys, xs = np.mgrid[0:height, 0:width]
+        return np.dstack([xs % 256, ys % 256, (xs // 256 + ys // 256 * 16) % 256]).astype(np.uint8)
+
+    def get_client_wh(self) -> tuple[int, int]:
+        return self.frame.shape[1], self.frame.shape[0]
+
+    def create(self, width: int, height: int):
+        self.create_count += 1
+        self._created_wh = (width, height)
+
+    def capture(self):
+        self.capture_count += 1
+
+    def read_bits(self, out: np.ndarray, x: int = 0, y: int = 0):
+        h, w = out.shape[:2]
+        if x + w > self._created_wh[0] or y + h > self._created_wh[1]:
+            raise ValueError(f"Region ({x}, {y}, {w}, {h}) out of bitmap {self._created_wh}")
+        out[..., :3] = self.frame[y:y + h, x:x + w, :3]
+        out[..., 3] = 255
+
+    def release(self):
+        self.release_count += 1
+        self._created_wh = None
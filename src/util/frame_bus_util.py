@@ -0,0 +1,251 @@
+"""
+共享内存帧总线
+
+一个截图生产者把画面写入预分配的固定大小环形槽位，其他任务进程按序号读取最新帧，
+避免多个任务进程同时运行时对同一个窗口重复截图。
+读取时先复制到进程自己的内存，复制完再校验槽位序号，没被生产者覆盖才使用（seqlock），
+之后OCR、YOLO等耗时处理都在副本上进行，不受生产者循环覆盖槽位影响。
+共享内存由生产者按第一帧的窗口客户区大小创建，任务进程按名称连接，连接不上时先自行截图，之后再重试。
+
+内存布局：
+    [全局头 int64 x 4] [槽位头 int64 x 4 x slots] [槽位数据 uint8 x slots x max_h x max_w x 3]
+    全局头：最新序号、槽位数、最大高、最大宽
+    槽位头：序号（写入中为-1）、高、宽、写入时间戳ns
+"""
+import logging
+import os
+import time
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Callable, Iterator
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 环境变量，值为帧总线共享内存名称，任务进程通过它连接到生产者
+ENV_FRAME_BUS_NAME = "FRAME_BUS_NAME"
+
+_GLOBAL_HEADER_LEN = 4
+_SLOT_HEADER_LEN = 4
+_HEADER_ITEM_SIZE = np.dtype(np.int64).itemsize
+
+# 截图来源，无参调用返回一张BGR图片，返回None表示本次没有截到
+CaptureSource = Callable[[], np.ndarray | None]
+
+
+class FrameBus:
+    """共享内存环形帧缓冲，单生产者多消费者"""
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self._shm = shm
+        self._owner = owner
+        self._global_header = np.ndarray((_GLOBAL_HEADER_LEN,), dtype=np.int64, buffer=shm.buf, offset=0)
+        slots, max_h, max_w = (int(i) for i in self._global_header[1:4])
+        self.slots, self.max_h, self.max_w = slots, max_h, max_w
+        slot_header_offset = _GLOBAL_HEADER_LEN * _HEADER_ITEM_SIZE
+        self._slot_header = np.ndarray((slots, _SLOT_HEADER_LEN), dtype=np.int64, buffer=shm.buf,
+                                       offset=slot_header_offset)
+        data_offset = slot_header_offset + slots * _SLOT_HEADER_LEN * _HEADER_ITEM_SIZE
+        self._data = np.ndarray((slots, max_h, max_w, 3), dtype=np.uint8, buffer=shm.buf, offset=data_offset)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @staticmethod
+    def _size(slots: int, max_h: int, max_w: int) -> int:
+        header_size = (_GLOBAL_HEADER_LEN + slots * _SLOT_HEADER_LEN) * _HEADER_ITEM_SIZE
+        return header_size + slots * max_h * max_w * 3
+
+    @classmethod
+    def create(cls, max_wh: tuple[int, int], slots: int = 4, name: str | None = None) -> "FrameBus":
+        """
+        生产者创建帧总线
+        :param max_wh: 单帧最大宽高，一般为截到的窗口客户区大小
+        :param slots: 环形槽位数，槽位在生产者写满一圈后会被覆盖
+        :param name: 共享内存名称，默认随机
+        """
+        if slots < 2:
+            raise ValueError(f"slots must be at least 2, got {slots}")
+        max_w, max_h = max_wh
+        shm = shared_memory.SharedMemory(name=name, create=True, size=cls._size(slots, max_h, max_w))
+        global_header = np.ndarray((_GLOBAL_HEADER_LEN,), dtype=np.int64, buffer=shm.buf, offset=0)
+        global_header[:] = (0, slots, max_h, max_w)
+        del global_header
+        frame_bus = cls(shm, owner=True)
+        frame_bus._slot_header[:] = 0
+        logger.debug("Create frame bus: %s, slots: %s, max wh: %s", shm.name, slots, max_wh)
+        return frame_bus
+
+    @classmethod
+    def attach(cls, name: str) -> "FrameBus":
+        """消费者连接已存在的帧总线"""
+        shm = shared_memory.SharedMemory(name=name, create=False)
+        if os.name == "posix":
+            # posix下attach也会注册到resource_tracker，进程退出时会误删生产者的共享内存
+            from multiprocessing import resource_tracker
+            # noinspection PyProtectedMember
+            resource_tracker.unregister(shm._name, "shared_memory")
+        logger.debug("Attach frame bus: %s", name)
+        return cls(shm, owner=False)
+
+    @property
+    def latest_seq(self) -> int:
+        """最新已写完的帧序号，从1开始，0表示还没有帧"""
+        return int(self._global_header[0])
+
+    def write(self, img: np.ndarray) -> int:
+        """
+        写入一帧（仅生产者调用）
+        :param img: BGR图片，宽高不能超过创建时的最大宽高
+        :return: 帧序号
+        """
+        h, w = img.shape[:2]
+        if h > self.max_h or w > self.max_w or img.ndim != 3 or img.shape[2] != 3:
+            raise ValueError(f"Frame shape {img.shape} does not fit frame bus ({self.max_h}, {self.max_w}, 3)")
+        seq = self.latest_seq + 1
+        index = seq % self.slots
+        slot_header = self._slot_header[index]
+        slot_header[0] = -1  # 写入中，读者遇到就重试
+        np.copyto(self._data[index, :h, :w], img)
+        slot_header[1:4] = (h, w, time.perf_counter_ns())
+        slot_header[0] = seq
+        self._global_header[0] = seq
+        return seq
+
+    def read(self, seq: int) -> np.ndarray | None:
+        """按序号读取帧，返回复制出来的BGR图片；帧已被覆盖、不存在或复制期间被覆盖时返回None"""
+        if seq <= 0:
+            return None
+        slot_header = self._slot_header[seq % self.slots]
+        if slot_header[0] != seq:
+            return None
+        h, w = int(slot_header[1]), int(slot_header[2])
+        img = self._data[seq % self.slots, :h, :w].copy()
+        if slot_header[0] != seq:  # 复制期间生产者开始改写该槽位，副本可能不完整
+            return None
+        return img
+
+    def read_latest(self) -> tuple[int, np.ndarray | None]:
+        """
+        读取最新帧
+        :return: (序号, 复制出来的BGR图片)，没有帧时为 (0, None)
+        """
+        for _ in range(3):  # 与生产者写入撞上时重试
+            seq = self.latest_seq
+            if seq == 0:
+                return 0, None
+            img = self.read(seq)
+            if img is not None:
+                return seq, img
+        return 0, None
+
+    def is_valid(self, seq: int) -> bool:
+        """槽位中的帧是否仍未被生产者覆盖"""
+        return seq > 0 and int(self._slot_header[seq % self.slots][0]) == seq
+
+    def get_age_seconds(self, seq: int) -> float | None:
+        """帧写入至今的时间，帧已失效返回None"""
+        if not self.is_valid(seq):
+            return None
+        return (time.perf_counter_ns() - int(self._slot_header[seq % self.slots][3])) / 1e9
+
+    def wait_newer(self, seq: int, timeout: float = 1.0, poll_seconds: float = 0.002) -> tuple[int, np.ndarray | None]:
+        """等待比seq更新的帧，超时返回 (0, None)"""
+        start_time = time.monotonic()
+        while time.monotonic() - start_time < timeout:
+            if self.latest_seq > seq:
+                latest_seq, img = self.read_latest()
+                if img is not None:
+                    return latest_seq, img
+            time.sleep(poll_seconds)
+        return 0, None
+
+    def close(self):
+        # 释放numpy对共享内存的引用，否则close会报BufferError
+        self._global_header = self._slot_header = self._data = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+def run_producer(name: str, source: CaptureSource, stop: Callable[[], bool], fps: float = 30.0, slots: int = 4):
+    """
+    截图生产者循环，按第一帧的大小创建帧总线，结束时释放
+    :param name: 共享内存名称，任务进程按该名称连接
+    :param source: 截图来源，可插拔，真实窗口截图、合成图、文件回放均可
+    :param stop: 返回True时结束循环
+    :param fps: 截图帧率上限
+    :param slots: 环形槽位数
+    """
+    interval = 1 / fps if fps > 0 else 0.0
+    frame_bus: FrameBus | None = None
+    # 超出帧总线大小的帧（如窗口调大）跳过，任务进程读到的画面过旧后会回退为自行截图
+    skipped = 0
+    try:
+        while not stop():
+            start_time = time.perf_counter()
+            try:
+                img = source()
+            except StopIteration:
+                break
+            if img is not None:
+                if frame_bus is None:
+                    frame_bus = FrameBus.create((img.shape[1], img.shape[0]), slots=slots, name=name)
+                try:
+                    frame_bus.write(img)
+                except ValueError as e:
+                    if skipped % 100 == 0:  # 限制日志量
+                        logger.warning("Skip frame: %s, skipped: %s", e, skipped + 1)
+                    skipped += 1
+            if (sleep_seconds := interval - (time.perf_counter() - start_time)) > 0:
+                time.sleep(sleep_seconds)
+    finally:
+        if frame_bus is not None:
+            frame_bus.close()
+
+
+class SyntheticCaptureSource:
+    """合成截图来源，每帧一个递增灰度值的纯色图，用于无游戏窗口时测试"""
+
+    def __init__(self, wh: tuple[int, int] = (1280, 720)):
+        self._img = np.zeros((wh[1], wh[0], 3), dtype=np.uint8)
+        self._count = 0
+
+    def __call__(self) -> np.ndarray:
+        self._count += 1
+        self._img[:] = self._count % 256
+        return self._img
+
+
+class FileReplayCaptureSource:
+    """文件回放截图来源，按文件名顺序循环读取目录内的png/jpg"""
+
+    def __init__(self, img_dir: str | Path, loop: bool = True):
+        from src.util import img_util
+        img_paths = sorted(p for p in Path(img_dir).iterdir() if p.suffix.lower() in (".png", ".jpg", ".jpeg"))
+        if not img_paths:
+            raise FileNotFoundError(f"No image in {img_dir}")
+        self._imgs = [img_util.read_img(str(p), alpha=False) for p in img_paths]
+        self._loop = loop
+        self._iterator = self._iter()
+
+    def _iter(self) -> Iterator[np.ndarray]:
+        while True:
+            yield from self._imgs
+            if not self._loop:
+                return
+
+    def __call__(self) -> np.ndarray:
+        return next(self._iterator)
+
+
+if __name__ == '__main__':
+    test_bus = FrameBus.create((1280, 720), slots=4)
+    test_source = SyntheticCaptureSource()
+    for _ in range(10):
+        test_bus.write(test_source())
+    test_seq, test_img = test_bus.read_latest()
+    print(test_seq, test_img.shape, test_img[0, 0], test_bus.read(test_seq - 4))
+    test_bus.close()
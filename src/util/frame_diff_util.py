@@ -0,0 +1,91 @@
+"""
+画面变化检测
+
+把画面缩小成灰度小图作为签名，两帧签名逐像素做差后按网格分块求平均，
+任意一块的平均差值超过阈值即认为画面有变化，用于跳过画面没变时的OCR等耗时操作。
+"""
+import logging
+from typing import Any
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 签名宽度px，高度按原图比例
+SIGNATURE_WIDTH = 160
+# 分块网格（列, 行），16:9 下每块约为原图 1280x720 中的 80x80 px
+TILE_GRID = (16, 9)
+
+
+def signature(img: np.ndarray, width: int = SIGNATURE_WIDTH) -> np.ndarray:
+    """缩小后的灰度图，INTER_AREA 缩小相当于块平均，可以抹掉大部分噪点"""
+    h, w = img.shape[:2]
+    height = max(1, round(h * width / w))
+    small = cv2.resize(img, (width, height), interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY if small.shape[2] == 3 else cv2.COLOR_BGRA2GRAY)
+    return small
+
+
+def tile_diff(sig_a: np.ndarray, sig_b: np.ndarray, grid: tuple[int, int] = TILE_GRID) -> np.ndarray:
+    """
+    两帧签名分块平均绝对差
+    :return: (行, 列) 的 float32 数组，每个值为该块内平均灰度差
+    """
+    diff = cv2.absdiff(sig_a, sig_b)
+    return cv2.resize(diff.astype(np.float32), grid, interpolation=cv2.INTER_AREA)
+
+
+def is_changed(sig_a: np.ndarray | None, sig_b: np.ndarray | None, threshold: float,
+               grid: tuple[int, int] = TILE_GRID) -> bool:
+    if sig_a is None or sig_b is None or sig_a.shape != sig_b.shape:
+        return True
+    return float(tile_diff(sig_a, sig_b, grid).max()) > threshold
+
+
+class FrameDiffGate:
+    """
+    画面没变时复用上次结果
+
+    使用：
+        if (result := gate.get(img)) is None:
+            result = expensive(img)
+            gate.put(result)
+    """
+
+    def __init__(self, threshold: float = 1.0, grid: tuple[int, int] = TILE_GRID):
+        """
+        :param threshold: 分块平均灰度差阈值，任意一块超过即视为画面变化
+        :param grid: 分块网格（列, 行）
+        """
+        self.threshold = threshold
+        self.grid = grid
+        self.hits = 0
+        self.misses = 0
+        self._signature: np.ndarray | None = None
+        self._pending: np.ndarray | None = None
+        self._result: Any = None
+
+    def get(self, img: np.ndarray) -> Any:
+        """画面与上次相比没有变化则返回上次结果，否则返回None，并记下本帧签名等待 put"""
+        sig = signature(img)
+        if self._result is not None and not is_changed(self._signature, sig, self.threshold, self.grid):
+            self.hits += 1
+            return self._result
+        self.misses += 1
+        self._pending = sig
+        return None
+
+    def put(self, result: Any):
+        """记录 get 未命中那一帧的结果"""
+        self._signature, self._pending = self._pending, None
+        self._result = result
+
+    def reset(self):
+        self._signature = self._pending = self._result = None
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
@@ -11,13 +11,18 @@ import logging
 import re
 import time
 import traceback
-from ctypes import windll
 
 import psutil
-import win32api
-import win32con
-import win32gui
-import win32process
+
+try:
+    from ctypes import windll
+
+    import win32api
+    import win32con
+    import win32gui
+    import win32process
+except ImportError:  # 非Windows平台，只能以回放模式运行，不会调用到窗口函数
+    windll = win32api = win32con = win32gui = win32process = None
 
 logger = logging.getLogger(__name__)
 
@@ -1,4 +1,5 @@
 import logging
+import threading
 
 import cv2
 import numpy as np
@@ -116,17 +117,61 @@ def bgr2gray(img_bgr: np.ndarray):
     raise ValueError(f"Unsupported image format: {img_bgr.shape}")
 
 
-def resize(img: np.ndarray, dsize: tuple[int, int]) -> np.ndarray:
-    img_new = cv2.resize(img, dsize, interpolation=cv2.INTER_AREA)
+class BufferPool:
+    """
+    预分配的图片缓冲区，用作 cv2.resize 的 dst，避免每帧分配新数组
+    同尺寸的缓冲区轮流使用：get 返回的缓冲区在之后 max_count - 1 次同尺寸 get 之前不会被覆盖，
+    即最近 max_count 帧的缩放图同时有效，持有更久的调用方需自行复制
+    """
+
+    def __init__(self, max_count: int = 4):
+        """
+        :param max_count: 每种尺寸轮流使用的缓冲区个数
+        """
+        if max_count < 1:
+            raise ValueError(f"max_count must be at least 1, got {max_count}")
+        self._max_count = max_count
+        # (尺寸, 类型) -> [缓冲区列表, 下一个下标]，按最近使用排序
+        self._rings: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def get(self, shape: tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        key = (tuple(shape), np.dtype(dtype))
+        with self._lock:
+            if (ring := self._rings.pop(key, None)) is None:
+                ring = [[], 0]
+            self._rings[key] = ring
+            # 分辨率变化后旧尺寸的缓冲区不再使用，只保留最近的几种尺寸
+            while len(self._rings) > self._max_count:
+                self._rings.pop(next(iter(self._rings)))
+            buffers, index = ring
+            if len(buffers) < self._max_count:
+                buffers.append(np.empty(shape, dtype))
+                return buffers[-1]
+            ring[1] = (index + 1) % self._max_count
+            return buffers[index]
+
+
+def _resize(img: np.ndarray, dsize: tuple[int, int], buffers: BufferPool | None) -> np.ndarray:
+    dst = None if buffers is None else buffers.get((dsize[1], dsize[0]) + img.shape[2:], img.dtype)
+    img_new = cv2.resize(img, dsize, dst=dst, interpolation=cv2.INTER_AREA)
     logger.debug("img resize: %s -> %s", img.shape, img_new.shape)
     return img_new
 
 
-def resize_by_weight(img: np.ndarray, target_weight: int = 1280) -> np.ndarray:
+def resize(img: np.ndarray, dsize: tuple[int, int], buffers: BufferPool | None = None) -> np.ndarray:
+    """
+    :param buffers: 缩放结果写入其中的缓冲区，不传时新分配
+    """
+    return _resize(img, dsize, buffers)
+
+
+def resize_by_weight(img: np.ndarray, target_weight: int = 1280, buffers: BufferPool | None = None) -> np.ndarray:
     """
     图片等比缩放，将宽度缩小到期望宽度（1280px），不会拉伸图片
     :param img:
     :param target_weight: 期望宽度px
+    :param buffers: 缩放结果写入其中的缓冲区，不传时新分配
     :return:
     """
     h, w = img.shape[:2]
@@ -135,16 +180,15 @@ def resize_by_weight(img: np.ndarray, target_weight: int = 1280) -> np.ndarray:
     # 计算等比例缩放后的宽度
     new_w = target_weight
     new_h = int(h * new_w / w)
-    img_new = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_AREA)
-    logger.debug("img resize: %s -> %s", img.shape, img_new.shape)
-    return img_new
+    return _resize(img, (new_w, new_h), buffers)
 
 
-def resize_by_ratio(img: np.ndarray, ratio: float) -> np.ndarray:
+def resize_by_ratio(img: np.ndarray, ratio: float, buffers: BufferPool | None = None) -> np.ndarray:
     """
     图片等比缩小，将宽度缩小到期望宽度（1280px），不会拉伸图片
     :param img:
     :param ratio: 缩放比例
+    :param buffers: 缩放结果写入其中的缓冲区，不传时新分配
     :return:
     """
     if ratio <= 0.0:
@@ -155,9 +199,30 @@ def resize_by_ratio(img: np.ndarray, ratio: float) -> np.ndarray:
     # 计算等比例缩放后的宽度
     new_w = int(w * ratio)
     new_h = int(h * ratio)
-    img_new = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_AREA)
-    logger.debug("img resize: %s -> %s", img.shape, img_new.shape)
-    return img_new
+    return _resize(img, (new_w, new_h), buffers)
+
+
+def vstack_with_gap(imgs: list[np.ndarray], gap: int = 32, fill: int = 0) -> tuple[np.ndarray, list[int]]:
+    """
+    多张图片左对齐竖向拼成一张，图片之间留出纯色间隔，宽度不足处同样填充
+    :param imgs: 同通道数的图片
+    :param gap: 间隔px，用于OCR时避免相邻图片的文字被检测成同一个文本框
+    :param fill: 填充色
+    :return: (拼接图, 每张图片在拼接图中的y坐标)
+    """
+    if not imgs:
+        raise ValueError("imgs must not be empty")
+    width = max(img.shape[1] for img in imgs)
+    height = sum(img.shape[0] for img in imgs) + gap * (len(imgs) - 1)
+    canvas = np.full((height, width) + imgs[0].shape[2:], fill, dtype=imgs[0].dtype)
+    offsets = []
+    y = 0
+    for img in imgs:
+        h, w = img.shape[:2]
+        canvas[y:y + h, :w] = img
+        offsets.append(y)
+        y += h + gap
+    return canvas, offsets
 
 
 def match_template(img: np.ndarray,
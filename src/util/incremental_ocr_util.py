@@ -0,0 +1,153 @@
+"""
+分块增量OCR
+
+把画面按网格分块，每块与该块上次识别时的画面比较找出变化的块，只对变化块（外扩一圈边距）重新检测+识别，
+未变化块内的文本框沿用之前的结果，合并后返回完整结果列表，调用方无感知。
+参照签名只在重新识别过的区域更新，缓慢渐变等每帧都低于阈值的变化会累积，超过阈值后该块仍会被重新识别。
+对话、领奖等界面每帧通常只有计数或按钮文字变化，可以省掉大部分检测与识别耗时。
+"""
+import logging
+from typing import Callable
+
+import cv2
+import numpy as np
+
+from src.core.regions import TextPosition
+from src.util.frame_diff_util import TILE_GRID, signature, tile_diff
+
+logger = logging.getLogger(__name__)
+
+# 检测+识别，输入BGR图片，返回图片内坐标的文本框
+OcrFunc = Callable[[np.ndarray], list[TextPosition]]
+
+Rect = tuple[int, int, int, int]
+
+
+def dirty_rects(dirty: np.ndarray, wh: tuple[int, int], margin: int) -> list[Rect]:
+    """
+    变化块合并成矩形
+    :param dirty: (行, 列) 布尔数组，True为变化块
+    :param wh: 图片宽高
+    :param margin: 矩形外扩像素
+    :return: 图片坐标 (x1, y1, x2, y2) 列表，相邻的变化块合并为一个外接矩形
+    """
+    width, height = wh
+    rows, cols = dirty.shape
+    count, _, stats, _ = cv2.connectedComponentsWithStats(dirty.astype(np.uint8), connectivity=8)
+    rects = []
+    for x, y, w, h, _ in stats[1:count]:  # 0号为背景
+        rects.append((
+            max(0, x * width // cols - margin),
+            max(0, y * height // rows - margin),
+            min(width, (x + w) * width // cols + margin),
+            min(height, (y + h) * height // rows + margin),
+        ))
+    return rects
+
+
+def _intersects(rect: Rect, position: TextPosition) -> bool:
+    return position.x1 < rect[2] and position.x2 > rect[0] and position.y1 < rect[3] and position.y2 > rect[1]
+
+
+def _union(rect: Rect, position: TextPosition) -> Rect:
+    return (min(rect[0], position.x1), min(rect[1], position.y1),
+            max(rect[2], position.x2), max(rect[3], position.y2))
+
+
+def _iou(a: TextPosition, b: TextPosition) -> float:
+    w = min(a.x2, b.x2) - max(a.x1, b.x1)
+    h = min(a.y2, b.y2) - max(a.y1, b.y1)
+    if w <= 0 or h <= 0:
+        return 0.0
+    inter = w * h
+    return inter / ((a.x2 - a.x1) * (a.y2 - a.y1) + (b.x2 - b.x1) * (b.y2 - b.y1) - inter)
+
+
+def dedupe(results: list[TextPosition], iou_threshold: float = 0.5) -> list[TextPosition]:
+    """去掉相互重叠的重复文本框，多个识别区域重叠时同一行文字会被识别多次，保留置信度高的"""
+    kept: list[TextPosition] = []
+    for result in sorted(results, key=lambda r: r.confidence, reverse=True):
+        if all(_iou(result, k) < iou_threshold for k in kept):
+            kept.append(result)
+    return kept
+
+
+class IncrementalOcr:
+    """单一尺寸画面的增量OCR，不同区域/尺寸的截图应各用一个实例"""
+
+    def __init__(self, ocr_func: OcrFunc, threshold: float = 1.0, grid: tuple[int, int] = TILE_GRID,
+                 margin: int = 16, max_dirty_ratio: float = 0.5):
+        """
+        :param ocr_func: 检测+识别
+        :param threshold: 分块平均灰度差阈值，超过即视为该块变化
+        :param grid: 分块网格（列, 行）
+        :param margin: 变化区域外扩像素，避免文字贴着块边界被截断
+        :param max_dirty_ratio: 变化块占比超过该值时直接整图识别，切块反而更慢
+        """
+        self._ocr_func = ocr_func
+        self.threshold = threshold
+        self.grid = grid
+        self.margin = margin
+        self.max_dirty_ratio = max_dirty_ratio
+        # 参照签名，各区域为其最近一次识别时的画面
+        self._signature: np.ndarray | None = None
+        self._results: list[TextPosition] | None = None
+        self.full_count = 0
+        self.partial_count = 0
+        self.skip_count = 0
+
+    def reset(self):
+        self._signature = self._results = None
+
+    def ocr(self, img: np.ndarray) -> list[TextPosition]:
+        h, w = img.shape[:2]
+        sig = signature(img)
+        if self._results is None or self._signature is None or self._signature.shape != sig.shape:
+            return self._full(img, sig)
+        dirty = tile_diff(self._signature, sig, self.grid) > self.threshold
+        dirty_count = int(np.count_nonzero(dirty))
+        if dirty_count == 0:
+            self.skip_count += 1
+            return list(self._results)
+        if dirty_count > dirty.size * self.max_dirty_ratio:
+            return self._full(img, sig)
+
+        rects = dirty_rects(dirty, (w, h), self.margin)
+        cached = list(self._results)
+        # 与重识别区域相交的旧文本框整体并入该区域，跨块的文字不会被切断，旧框也不会残留
+        for i, rect in enumerate(rects):
+            changed = True
+            while changed:
+                changed = False
+                for position in cached:
+                    if _intersects(rect, position):
+                        rect = _union(rect, position)
+                        cached.remove(position)
+                        changed = True
+                        break
+            rects[i] = rect
+
+        fresh: list[TextPosition] = []
+        for x1, y1, x2, y2 in rects:
+            for result in self._ocr_func(img[y1:y2, x1:x2]):
+                fresh.append(result.model_copy(update={
+                    "x1": result.x1 + x1, "y1": result.y1 + y1, "x2": result.x2 + x1, "y2": result.y2 + y1,
+                }))
+        results = cached + dedupe(fresh)
+        results.sort(key=lambda r: (r.y1, r.x1))
+        self.partial_count += 1
+        logger.debug("增量OCR，变化块: %s/%s，识别区域: %s", dirty_count, dirty.size, rects)
+        # 只有重新识别过的区域更新参照，其余块继续与其上次识别时的画面比较
+        sig_h, sig_w = sig.shape[:2]
+        for x1, y1, x2, y2 in rects:
+            sx1, sy1 = -(-x1 * sig_w // w), -(-y1 * sig_h // h)  # 只取完全落在区域内的签名像素
+            sx2, sy2 = x2 * sig_w // w, y2 * sig_h // h
+            self._signature[sy1:sy2, sx1:sx2] = sig[sy1:sy2, sx1:sx2]
+        self._results = results
+        return list(results)
+
+    def _full(self, img: np.ndarray, sig: np.ndarray) -> list[TextPosition]:
+        self.full_count += 1
+        results = self._ocr_func(img)
+        self._signature, self._results = sig.copy(), list(results)
+        return list(results)
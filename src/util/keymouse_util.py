@@ -2,9 +2,12 @@ import logging
 import random
 import time
 
-import win32api
-import win32con
-import win32gui
+try:
+    import win32api
+    import win32con
+    import win32gui
+except ImportError:  # 非Windows平台，只能以回放模式运行，不会调用到键鼠消息
+    win32api = win32con = win32gui = None
 
 logger = logging.getLogger(__name__)
 
@@ -45,11 +48,11 @@ KEYBOARD_VK_MAPPING: dict[str, int] = {
     "X": 88,
     "Y": 89,
     "Z": 90,
-    "LSHIFT": win32con.VK_LSHIFT,
-    "ESC": win32con.VK_ESCAPE,
-    "SPACE": win32con.VK_SPACE,
-    "F1": win32con.VK_F1,
-    "F2": win32con.VK_F2,
+    "LSHIFT": 160,  # win32con.VK_LSHIFT
+    "ESC": 27,  # win32con.VK_ESCAPE
+    "SPACE": 32,  # win32con.VK_SPACE
+    "F1": 112,  # win32con.VK_F1
+    "F2": 113,  # win32con.VK_F2
 }
 
 VK_KEYBOARD_MAPPING: dict[int, str] = {v: k for k, v in KEYBOARD_VK_MAPPING.items()}
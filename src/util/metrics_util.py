@@ -0,0 +1,249 @@
+"""
+每帧耗时统计
+
+任务循环每一帧（tick）按阶段累计截图、缩放、OCR、YOLO、页面匹配、操作的耗时，帧结束时写入各阶段的直方图。
+直方图为对数分桶，桶数固定、内存固定，相对误差约1%，可求 p50/p95/p99 等分位数。
+任务进程定时把统计快照放入多进程队列，主进程定时取出并输出摘要日志，也可导出为JSON或Prometheus文本。
+
+使用：
+    with metrics_util.tick():
+        with metrics_util.stage("ocr"):
+            ...
+"""
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from multiprocessing.queues import Queue
+from queue import Empty, Full
+from typing import Any, Iterator
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 每帧总耗时的阶段名
+TICK = "tick"
+# 快照中输出的分位数
+QUANTILES = (50, 95, 99)
+
+
+class LatencyHistogram:
+    """对数分桶的耗时直方图，HDR风格，桶数固定，每个桶的上下界之比为 1 + precision"""
+
+    def __init__(self, min_seconds: float = 1e-6, max_seconds: float = 100.0, precision: float = 0.01):
+        """
+        :param min_seconds: 最小可区分耗时，更小的计入第一个桶
+        :param max_seconds: 最大耗时，更大的计入最后一个桶
+        :param precision: 相对误差
+        """
+        self._min_seconds = min_seconds
+        self._log_base = math.log1p(precision)
+        self._size = int(math.ceil(math.log(max_seconds / min_seconds) / self._log_base)) + 1
+        self._counts = np.zeros(self._size, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        if seconds > self._min_seconds:
+            index = min(int(math.log(seconds / self._min_seconds) / self._log_base), self._size - 1)
+        else:
+            index = 0
+        self._counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, percent: float) -> float:
+        """分位数秒数，取所在桶的几何中点，不超过实际最大值"""
+        if self.count == 0:
+            return 0.0
+        rank = max(1, math.ceil(self.count * percent / 100))
+        index = int(np.searchsorted(np.cumsum(self._counts), rank))
+        value = self._min_seconds * math.exp((index + 0.5) * self._log_base)
+        return min(value, self.max)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def merge(self, other: "LatencyHistogram"):
+        if other._size != self._size:
+            raise ValueError("Histogram buckets do not match")
+        self._counts += other._counts
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def reset(self):
+        self._counts[:] = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def to_dict(self) -> dict[str, float]:
+        result = {"count": self.count, "mean": self.mean, "max": self.max, "sum": self.total}
+        for quantile in QUANTILES:
+            result[f"p{quantile}"] = self.percentile(quantile)
+        return result
+
+
+class TickMetrics:
+    """
+    按帧统计各阶段耗时
+    帧内同一阶段多次调用的耗时累加，帧结束时作为该帧的阶段耗时写入直方图；不在帧内的调用按单次写入
+    帧内其他线程（如并行推理的线程池）的耗时同样计入该帧，已分离的线程（如后台截图线程）始终按单次写入
+    """
+
+    def __init__(self):
+        self.histograms: dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self._tick_start: float | None = None
+        self._pending: dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+        # 每个线程各自的嵌套阶段
+        self._local = threading.local()
+        self._detached_threads: set[int] = set()
+        # 定时发布到多进程队列
+        self._queue: Queue | None = None
+        self._task_name: str = ""
+        self._interval: float = 5.0
+        self._last_publish = time.monotonic()
+
+    def setup(self, queue: Queue | None, task_name: str, interval: float = 5.0):
+        """
+        :param queue: 快照发布队列，None 不发布
+        :param task_name: 快照中的任务名
+        :param interval: 发布间隔秒数
+        """
+        self._queue = queue
+        self._task_name = task_name
+        self._interval = interval
+
+    def detach_thread(self):
+        """当前线程的耗时不计入帧内"""
+        self._detached_threads.add(threading.get_ident())
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            if self._tick_start is not None and threading.get_ident() not in self._detached_threads:
+                self._pending[stage] += seconds
+            else:
+                self.histograms[stage].record(seconds)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """阶段计时，同一线程内同一阶段嵌套时只计最外层"""
+        active_stages: set[str] = self._local.__dict__.setdefault("active_stages", set())
+        if name in active_stages:
+            yield
+            return
+        active_stages.add(name)
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            active_stages.discard(name)
+            self.record(name, time.perf_counter() - start_time)
+
+    @contextmanager
+    def tick(self) -> Iterator[None]:
+        """一帧，嵌套时只计最外层"""
+        if self._tick_start is not None:
+            yield
+            return
+        self._tick_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.histograms[TICK].record(time.perf_counter() - self._tick_start)
+                self._tick_start = None
+                for stage, seconds in self._pending.items():
+                    self.histograms[stage].record(seconds)
+                self._pending.clear()
+            self._maybe_publish()
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return self._snapshot()
+
+    def _snapshot(self) -> dict[str, Any]:
+        return {
+            "task": self._task_name,
+            "pid": os.getpid(),
+            "time": time.time(),
+            "stages": {stage: histogram.to_dict() for stage, histogram in self.histograms.items()},
+        }
+
+    def _maybe_publish(self):
+        if self._queue is None or time.monotonic() - self._last_publish < self._interval:
+            return
+        self._last_publish = time.monotonic()
+        try:
+            self._queue.put_nowait(self.snapshot())
+        except Full:  # 主进程没来得及取，丢弃本次，不阻塞任务
+            logger.debug("Metrics queue is full")
+
+    def reset(self):
+        with self._lock:
+            for histogram in self.histograms.values():
+                histogram.reset()
+
+
+# 每个进程一份
+_metrics = TickMetrics()
+
+
+def get_metrics() -> TickMetrics:
+    return _metrics
+
+
+def stage(name: str):
+    return _metrics.stage(name)
+
+
+def tick():
+    return _metrics.tick()
+
+
+def drain(queue: Queue, latest: dict[str, dict[str, Any]] | None = None) -> dict[str, dict[str, Any]]:
+    """取出队列中所有快照，按任务名保留最新一份"""
+    latest = {} if latest is None else latest
+    while True:
+        try:
+            snapshot = queue.get_nowait()
+        except Empty:
+            return latest
+        latest[snapshot["task"]] = snapshot
+
+
+def to_json(snapshots: dict[str, dict[str, Any]]) -> str:
+    return json.dumps(snapshots, ensure_ascii=False, indent=2)
+
+
+def to_text(snapshot: dict[str, Any]) -> str:
+    """单个快照的一行摘要，各阶段 p50/p95/p99 毫秒，用于日志"""
+    stages = ", ".join(
+        f"{stage_name} " + "/".join(f"{stats[f'p{quantile}'] * 1000:.1f}" for quantile in QUANTILES)
+        for stage_name, stats in snapshot["stages"].items() if stats["count"]
+    )
+    return f"{snapshot['task']} p{'/p'.join(map(str, QUANTILES))} ms: {stages}"
+
+
+def to_prometheus(snapshots: dict[str, dict[str, Any]], name: str = "wwa_stage_latency_seconds") -> str:
+    """Prometheus 文本格式，每个任务每个阶段一个 summary"""
+    lines = [f"# HELP {name} Per tick stage latency in seconds.", f"# TYPE {name} summary"]
+    for task, snapshot in snapshots.items():
+        for stage_name, stats in snapshot["stages"].items():
+            labels = f'task="{task}",stage="{stage_name}"'
+            for quantile in QUANTILES:
+                lines.append(f'{name}{{{labels},quantile="{quantile / 100}"}} {stats[f"p{quantile}"]:.6f}')
+            lines.append(f"{name}_sum{{{labels}}} {stats['sum']:.6f}")
+            lines.append(f"{name}_count{{{labels}}} {stats['count']}")
+    return "\n".join(lines) + "\n"
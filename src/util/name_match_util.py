@@ -0,0 +1,145 @@
+"""
+名称匹配
+
+一组固定名称（如可拾取物品名）与整行文本比对，直接返回规范名称，支持任意 Unicode 字符。
+精确匹配是一次哈希查找；开启模糊匹配的名称另外允许编辑距离 1（错一个字、多一个字或少一个字），
+用于覆盖 OCR 常见的形近字误识别，如 花蕈/花草，不必再为每个名称手写正则。
+模糊匹配预先把名称删掉一个字后的文本放进哈希表，查询时同样处理后查表，再逐个校验距离，
+比逐字符遍历字典树计算编辑距离快一个数量级。
+可运行 python -m src.util.name_match_util [ocr文本文件] 与等价的正则对比耗时，文件每行一条 OCR 文本。
+"""
+import re
+import sys
+from collections import defaultdict
+
+
+# 模糊匹配的最短名称长度，两个字的名称错一个字就只剩一个字相同，如 花蕈 会误匹配 花瓣
+FUZZY_MIN_LEN = 3
+
+
+class NameMatcher:
+    """
+    整行名称匹配器
+
+    match 返回规范名称，未匹配返回 None；模糊匹配同时命中多个不同的规范名称时视为未匹配，避免误判。
+    search 与 match 相同，可作为 TextMatch 的匹配对象，与 re.Pattern.search 一样按真假判断是否匹配。
+    """
+
+    def __init__(self, ignore_case: bool = True):
+        self.ignore_case = ignore_case
+        # 名称 -> 规范名称
+        self._exact: dict[str, str] = {}
+        # 模糊名称及其删掉一个字后的文本 -> [(模糊名称, 规范名称)]
+        self._deletes: dict[str, list[tuple[str, str]]] = defaultdict(list)
+        # 模糊名称用到的全部字符，文本中有两个以上不在其中的字符时不可能在编辑距离 1 内
+        self._alphabet: set[str] = set()
+        self._min_len = sys.maxsize
+        self._max_len = 0
+
+    def __len__(self) -> int:
+        return len(self._exact)
+
+    def add(self, name: str, canonical: str | None = None, fuzzy: bool = False):
+        """
+        添加名称
+        :param name: 画面上显示的名称
+        :param canonical: 匹配后返回的规范名称，默认为名称本身
+        :param fuzzy: 是否允许编辑距离 1 的模糊匹配，短于 FUZZY_MIN_LEN 的名称只精确匹配，误识别的写法用别名另外添加
+        """
+        canonical = name if canonical is None else canonical
+        key = name.casefold() if self.ignore_case else name
+        self._exact[key] = canonical
+        if not fuzzy or len(key) < FUZZY_MIN_LEN:
+            return
+        for variant in {key, *_deletes(key)}:
+            self._deletes[variant].append((key, canonical))
+        self._alphabet.update(key)
+        self._min_len = min(self._min_len, len(key))
+        self._max_len = max(self._max_len, len(key))
+
+    def match(self, text: str) -> str | None:
+        key = text.casefold() if self.ignore_case else text
+        if (canonical := self._exact.get(key)) is not None:
+            return canonical
+        # 单个字不做模糊匹配
+        if not max(self._min_len - 1, 2) <= len(key) <= self._max_len + 1:
+            return None
+        if self._alphabet.isdisjoint(key) or len(key) - sum(map(self._alphabet.__contains__, key)) > 1:
+            return None
+        # 编辑距离 1 以内的两个文本，必有一方原文或删掉一个字后等于另一方原文或删掉一个字后的文本
+        found = None
+        for variant in (key, *_deletes(key)):
+            for name, canonical in self._deletes.get(variant, ()):
+                if canonical != found and _within_one(key, name):
+                    if found is not None:
+                        return None
+                    found = canonical
+        return found
+
+    search = match
+
+
+def _deletes(text: str) -> list[str]:
+    """删掉一个字后的全部文本"""
+    return [text[:i] + text[i + 1:] for i in range(len(text))]
+
+
+def _within_one(a: str, b: str) -> bool:
+    """编辑距离是否不超过 1"""
+    if len(a) < len(b):
+        a, b = b, a
+    if len(a) - len(b) > 1:
+        return False
+    i = 0
+    while i < len(b) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:]
+    return a[i + 1:] == b[i:]
+
+
+def benchmark(path: str | None = None, times: int = 200):
+    """
+    用自动拾取的物品名，对比 NameMatcher 与原先的整行正则（形近字手写为正则）
+    :param path: OCR 文本文件，每行一条，如从调试日志中导出的识别结果；为None时用物品名、误识别和无关文本
+    :param times: 重复次数
+    """
+    import time
+
+    from src.service.auto_pickup_service import AutoPickupServiceImpl
+
+    builder = object.__new__(AutoPickupServiceImpl)
+    builder._pickup_pages = []
+    builder._build_pickup_pages()
+    matcher = builder._pickup_matcher
+    legacy = {"花蕈": "花(?:蕈|草)", "妙弋花": "妙.?花", "地丁堇": "地丁.", "礼花蒴": "礼花.?",
+              "叶翅蛉": "叶翅.?", "霄凤蝶": ".?凤蝶"}
+    names = set(builder._pickup_mapping.values())
+    regex = re.compile(r"^(" + "|".join(legacy.get(name, name) for name in names) + r")$", re.I)
+
+    if path:
+        with open(path, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        texts = list(names) + ["花草", "妙花", "礼花", "凤蝶", "地丁董", "叶翅", "花瓣", "花蕈x", "鲜花"] + [
+            "派蒙", "自动", "剩余时间", "声骸", "确认", "取消", "索拉指南", "背包", "地图", "1/3", "Lv.90", "F"] * 8
+
+    regex_only = [text for text in texts if regex.search(text) and not matcher.match(text)]
+    matcher_only = [text for text in texts if matcher.match(text) and not regex.search(text)]
+
+    def run(func) -> float:
+        start = time.perf_counter()
+        for _ in range(times):
+            for text in texts:
+                func(text)
+        return (time.perf_counter() - start) * 1e9 / times / len(texts)
+
+    regex_ns = run(regex.search)
+    matcher_ns = run(matcher.match)
+    print(f"texts: {len(texts)}, regex only: {regex_only}, matcher only: {matcher_only}")
+    print(f"regex: {regex_ns:.0f} ns/text, NameMatcher: {matcher_ns:.0f} ns/text, "
+          f"speedup: {regex_ns / matcher_ns:.1f}x")
+
+
+if __name__ == '__main__':
+    benchmark(sys.argv[1] if len(sys.argv) > 1 else None)
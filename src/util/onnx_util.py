@@ -1,4 +1,16 @@
+import hashlib
+import logging
+import os
+import platform
+import time
+from pathlib import Path
+from typing import Literal
+
+import numpy as np
 import onnxruntime
+from pydantic import BaseModel, Field
+
+from src.util import file_util
 
 """
 Preload DLLs
@@ -19,9 +31,261 @@ None: Search in default directories.
 Specific path: Load DLLs from the specified directory.  
 """
 
+logger = logging.getLogger(__name__)
+
 
 def preload_dlls():
     # https://github.com/microsoft/onnxruntime/pull/23674
     # https://github.com/microsoft/onnxruntime/pull/23744
     onnxruntime.preload_dlls(cuda=True, cudnn=True, msvc=True, directory=None)
     onnxruntime.print_debug_info()
+
+
+class OrtProfile(BaseModel):
+    """onnxruntime 会话选项，YOLO 与 RapidOCR 共用，CPU机器上可按需调整"""
+    intra_op_num_threads: int = Field(0, title="算子内线程数，0为默认（物理核数）", ge=0)
+    inter_op_num_threads: int = Field(0, title="算子间线程数，0为默认，仅并行执行模式有效", ge=0)
+    graph_optimization_level: Literal["disable", "basic", "extended", "all"] = Field(
+        "all", title="图优化级别：disable/basic/extended/all")
+    execution_mode: Literal["sequential", "parallel"] = Field(
+        "sequential", title="执行模式：sequential/parallel")
+    enable_cpu_mem_arena: bool = Field(True, title="CPU内存池")
+    enable_mem_pattern: bool = Field(True, title="按固定输入尺寸预先规划内存")
+    save_optimized_model: bool = Field(False, title="将优化后的模型保存到 temp 目录，用于查看优化结果")
+    model_cache: bool = Field(True, title="缓存优化后的模型，之后启动直接加载，跳过解析与图优化")
+
+    @classmethod
+    def build(cls, app_config) -> "OrtProfile":
+        """从 AppConfig 的 Ort* 配置构建"""
+        return cls(
+            intra_op_num_threads=app_config.OrtIntraOpThreads,
+            inter_op_num_threads=app_config.OrtInterOpThreads,
+            graph_optimization_level=app_config.OrtGraphOptimizationLevel,
+            execution_mode=app_config.OrtExecutionMode,
+            enable_cpu_mem_arena=app_config.OrtCpuMemArena,
+            enable_mem_pattern=app_config.OrtMemPattern,
+            save_optimized_model=app_config.OrtSaveOptimizedModel,
+            model_cache=app_config.OrtModelCache,
+        )
+
+
+_GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+_EXECUTION_MODES = {
+    "sequential": onnxruntime.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": onnxruntime.ExecutionMode.ORT_PARALLEL,
+}
+
+
+def create_session_options(profile: OrtProfile | None = None, model_path: str | None = None,
+                           log_severity_level: int = 3) -> onnxruntime.SessionOptions:
+    """
+    按配置创建会话选项
+    :param profile: 为None时只设置日志级别，与 onnxruntime 默认一致
+    :param model_path: 保存优化后的模型时用于生成文件名
+    :param log_severity_level: 日志级别3，只显示异常日志；排查警告时设为1打印详细ort日志
+    """
+    session_options = onnxruntime.SessionOptions()
+    session_options.log_severity_level = log_severity_level
+    if profile is None:
+        return session_options
+    if profile.intra_op_num_threads > 0:
+        session_options.intra_op_num_threads = profile.intra_op_num_threads
+    if profile.inter_op_num_threads > 0:
+        session_options.inter_op_num_threads = profile.inter_op_num_threads
+    session_options.graph_optimization_level = _GRAPH_OPTIMIZATION_LEVELS[profile.graph_optimization_level]
+    session_options.execution_mode = _EXECUTION_MODES[profile.execution_mode]
+    session_options.enable_cpu_mem_arena = profile.enable_cpu_mem_arena
+    session_options.enable_mem_pattern = profile.enable_mem_pattern
+    if profile.save_optimized_model and model_path is not None:
+        session_options.optimized_model_filepath = file_util.get_temp(f"{Path(model_path).stem}.optimized.onnx")
+    return session_options
+
+
+# 优化后模型缓存目录
+MODEL_CACHE_DIR = "ort_cache"
+# 缓存文件：模型名.缓存键.ort
+_MODEL_CACHE_SUFFIX = ".ort"
+# 每个模型保留最近使用的缓存个数，不同任务进程或配置交替使用多套会话选项时不会互相删除
+MODEL_CACHE_KEEP = 4
+
+
+def _file_hash(path: str) -> str:
+    file_hash = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def _model_cache_key(model_path: str, profile: OrtProfile) -> str:
+    """模型内容、onnxruntime版本、影响优化结果的会话选项与CPU任一变化，缓存键都会变化"""
+    options = profile.model_dump(exclude={"save_optimized_model", "model_cache"})
+    key = "|".join([
+        _file_hash(model_path),
+        onnxruntime.__version__,
+        repr(sorted(options.items())),
+        platform.machine(),
+        platform.processor(),
+    ])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def _is_cpu_only(providers) -> bool:
+    """优化后的模型只对CPU缓存，GPU执行器的节点分配与设备相关，不缓存"""
+    if not providers:
+        return True
+    return all((p[0] if isinstance(p, (tuple, list)) else p) == "CPUExecutionProvider" for p in providers)
+
+
+def create_session(model_path: str, providers=None, profile: OrtProfile | None = None,
+                   log_severity_level: int = 3) -> onnxruntime.InferenceSession:
+    """
+    创建会话，开启模型缓存时首次创建将优化后的模型以ORT格式保存到 temp/ort_cache，之后直接加载
+    模型文件、onnxruntime版本或会话选项变化时缓存键变化，同一模型只保留最近使用的 MODEL_CACHE_KEEP 个缓存
+    :param providers: 执行器列表，可带执行器选项
+    """
+    if profile is None or not profile.model_cache or not _is_cpu_only(providers):
+        return onnxruntime.InferenceSession(
+            model_path, sess_options=create_session_options(profile, model_path, log_severity_level),
+            providers=providers)
+    cache_path = _model_cache_path(model_path, profile)
+    if cache_path.exists():
+        session_options = create_session_options(profile, None, log_severity_level)
+        # 已优化过，加载时跳过图优化
+        session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL
+        try:
+            session = onnxruntime.InferenceSession(str(cache_path), sess_options=session_options, providers=providers)
+            _touch(cache_path)
+            logger.debug("Load optimized model from cache: %s", cache_path)
+            return session
+        except Exception:
+            logger.warning("优化模型缓存加载失败，重新生成: %s", cache_path, exc_info=True)
+            cache_path.unlink(missing_ok=True)
+    return _save_model_cache(model_path, cache_path, providers, profile, log_severity_level)
+
+
+def get_model_cache(model_path: str, profile: OrtProfile | None, log_severity_level: int = 3) -> str | None:
+    """
+    CPU执行的优化模型缓存路径，没有缓存时先创建一次会话生成；未开启模型缓存或生成失败时返回None
+    用于只能传入模型路径、不能传入会话选项的库（如 RapidOCR）直接加载已优化的模型
+    """
+    if profile is None or not profile.model_cache:
+        return None
+    cache_path = _model_cache_path(model_path, profile)
+    if not cache_path.exists():
+        _save_model_cache(model_path, cache_path, ["CPUExecutionProvider"], profile, log_severity_level)
+    if not cache_path.exists():
+        return None
+    _touch(cache_path)
+    return str(cache_path)
+
+
+def _model_cache_path(model_path: str, profile: OrtProfile) -> Path:
+    cache_dir = Path(file_util.get_temp(MODEL_CACHE_DIR))
+    return cache_dir / f"{Path(model_path).stem}.{_model_cache_key(model_path, profile)}{_MODEL_CACHE_SUFFIX}"
+
+
+def _save_model_cache(model_path: str, cache_path: Path, providers, profile: OrtProfile,
+                      log_severity_level: int) -> onnxruntime.InferenceSession:
+    """创建会话，同时将优化后的模型写入缓存"""
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    _evict_model_cache(cache_path.parent, Path(model_path).stem, MODEL_CACHE_KEEP - 1)
+    # 先写临时文件再改名，多个任务进程同时启动时不会读到写了一半的缓存
+    temp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    session_options = create_session_options(profile, None, log_severity_level)
+    session_options.optimized_model_filepath = str(temp_path)
+    session_options.add_session_config_entry("session.save_model_format", "ORT")
+    session = onnxruntime.InferenceSession(model_path, sess_options=session_options, providers=providers)
+    try:
+        os.replace(temp_path, cache_path)
+        logger.debug("Save optimized model to cache: %s", cache_path)
+    except OSError:
+        logger.warning("优化模型缓存保存失败: %s", cache_path, exc_info=True)
+        temp_path.unlink(missing_ok=True)
+    return session
+
+
+def _touch(path: Path):
+    """更新修改时间，作为最近使用时间"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def _evict_model_cache(cache_dir: Path, stem: str, keep: int):
+    """同名模型的缓存只保留最近使用的 keep 个"""
+    cache_paths = []
+    for path in cache_dir.glob(f"{stem}.*{_MODEL_CACHE_SUFFIX}"):
+        try:
+            cache_paths.append((path.stat().st_mtime, path))
+        except OSError:  # 其他进程刚删除
+            continue
+    cache_paths.sort(reverse=True)
+    for _, stale_path in cache_paths[keep:]:
+        logger.debug("Evict optimized model cache: %s", stale_path)
+        stale_path.unlink(missing_ok=True)
+
+
+def _random_inputs(session: onnxruntime.InferenceSession, dynamic_size: int = 640) -> dict[str, np.ndarray]:
+    """按模型输入生成随机输入，动态维度批次取1、其余取 dynamic_size"""
+    rng = np.random.default_rng(0)
+    inputs = {}
+    for node in session.get_inputs():
+        shape = [dim if isinstance(dim, int) else (1 if i == 0 else dynamic_size) for i, dim in enumerate(node.shape)]
+        inputs[node.name] = rng.random(shape, dtype=np.float32)
+    return inputs
+
+
+def benchmark(model_paths: list[str] | None = None, runs: int = 30, warmup: int = 3):
+    """
+    在CPU上扫描会话选项组合，输出每个模型的创建耗时、吞吐与延迟，用于给每台机器挑选配置
+    默认测试 boss_v20.onnx 与 reward.onnx
+    """
+    from src.util import yolo_util
+
+    if model_paths is None:
+        model_paths = [yolo_util.MODEL_BOSS_V20.path, yolo_util.MODEL_REWARD.path]
+    cpu_count = os.cpu_count() or 1
+    thread_counts = sorted({1, 2, max(1, cpu_count // 4), max(1, cpu_count // 2), cpu_count})
+    profiles = [OrtProfile()] + [OrtProfile(intra_op_num_threads=threads) for threads in thread_counts]
+    profiles += [
+        OrtProfile(graph_optimization_level=level) for level in ("disable", "basic", "extended")
+    ]
+    profiles += [
+        OrtProfile(execution_mode="parallel", inter_op_num_threads=2),
+        OrtProfile(enable_cpu_mem_arena=False),
+        OrtProfile(enable_mem_pattern=False),
+    ]
+    for model_path in model_paths:
+        print(f"model: {Path(model_path).name}")
+        print(f"{'profile':<48}{'create ms':>10}{'fps':>8}{'p50 ms':>9}{'p95 ms':>9}")
+        for profile in profiles:
+            start = time.perf_counter()
+            session = onnxruntime.InferenceSession(model_path, sess_options=create_session_options(profile),
+                                                   providers=["CPUExecutionProvider"])
+            create_ms = (time.perf_counter() - start) * 1000
+            inputs = _random_inputs(session)
+            for _ in range(warmup):
+                session.run(None, inputs)
+            durations = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                session.run(None, inputs)
+                durations.append((time.perf_counter() - start) * 1000)
+            durations = np.array(durations)
+            changed = profile.model_dump(exclude_defaults=True) or {"default": True}
+            name = ",".join(f"{k}={v}" for k, v in changed.items())
+            print(f"{name:<48}{create_ms:>10.1f}{1000 / durations.mean():>8.1f}"
+                  f"{np.percentile(durations, 50):>9.2f}{np.percentile(durations, 95):>9.2f}")
+
+
+if __name__ == '__main__':
+    import sys
+
+    benchmark(sys.argv[1:] or None)
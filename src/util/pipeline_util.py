@@ -0,0 +1,181 @@
+"""
+截图流水线
+
+后台线程截图并缩放，主线程处理第 N 帧（OCR、页面匹配、操作）的同时已经在截取第 N+1 帧。
+主线程每取走一帧，后台线程才截下一帧，最多提前一帧，不会空转占满一个核；
+发布的帧复制到流水线自己的内存，截图器轮流复用的缓冲被后续截图覆盖也不影响正在处理的帧。
+执行了键鼠操作后调用 invalidate，操作完成前截到的画面不再使用，保证操作不会基于过时的画面。
+另提供 parallel，将 OCR 与 YOLO 等互不依赖的推理放到线程池中同时执行，onnxruntime 推理时会释放GIL。
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Generic, TypeVar
+
+import numpy as np
+
+from src.util import metrics_util
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 截图并缩放，返回 (原图, 缩放图)，返回None表示本次没有截到
+FrameSource = Callable[[], tuple[np.ndarray, np.ndarray] | None]
+
+
+class LatestSlot(Generic[T]):
+    """容量为1的队列，放入时覆盖未取走的旧数据，取出时等待新数据"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._item: T | None = None
+        self._has_item = False
+        self.dropped = 0
+
+    def put(self, item: T):
+        with self._condition:
+            if self._has_item:
+                self.dropped += 1
+            self._item = item
+            self._has_item = True
+            self._condition.notify_all()
+
+    def get(self, timeout: float | None = None) -> T | None:
+        """等待并取走数据，超时返回None"""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._has_item, timeout):
+                return None
+            item, self._item, self._has_item = self._item, None, False
+            return item
+
+    def clear(self):
+        with self._condition:
+            self._item = None
+            self._has_item = False
+
+
+class Frame:
+    __slots__ = ("seq", "src_img", "img", "timestamp")
+
+    def __init__(self, seq: int, src_img: np.ndarray, img: np.ndarray, timestamp: float):
+        self.seq = seq
+        self.src_img = src_img
+        self.img = img
+        # 开始截图时的 perf_counter 秒数
+        self.timestamp = timestamp
+
+
+class CapturePipeline:
+    """后台截图线程 + 最新帧槽位"""
+
+    def __init__(self, source: FrameSource, name: str = "CapturePipeline"):
+        self._source = source
+        self._name = name
+        self._slot: LatestSlot[Frame] = LatestSlot()
+        self._stop_event = threading.Event()
+        # 主线程要帧时置位，后台线程据此截下一帧
+        self._request = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._seq = 0
+        # 早于该时间开始截的帧视为过时
+        self._valid_after = 0.0
+        self.stale = 0
+
+    @property
+    def dropped(self) -> int:
+        """未被处理就被新帧覆盖的帧数"""
+        return self._slot.dropped
+
+    def start(self) -> "CapturePipeline":
+        if self._thread is None:
+            self._stop_event.clear()
+            self._request.set()  # 预先截第一帧
+            self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 2.0):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        logger.debug("%s stopped, captured: %s, dropped: %s, stale: %s",
+                     self._name, self._seq, self.dropped, self.stale)
+
+    def __enter__(self) -> "CapturePipeline":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _run(self):
+        metrics_util.get_metrics().detach_thread()  # 截图与主线程的帧重叠，单独统计，不计入帧内耗时
+        while not self._stop_event.is_set():
+            if not self._request.wait(0.1):
+                continue
+            self._request.clear()
+            timestamp = time.perf_counter()
+            try:
+                result = self._source()
+            except Exception:
+                logger.warning("流水线截图异常", exc_info=True)
+                result = None
+            if result is None:
+                self._request.set()
+                self._stop_event.wait(0.1)
+                continue
+            src_img, img = result
+            # 截图器的输出缓冲会被之后的截图复用，复制一份再交给主线程；缩放图与原图相同时共用副本
+            src_copy = src_img.copy()
+            img_copy = src_copy if img is src_img else img.copy()
+            self._seq += 1
+            self._slot.put(Frame(self._seq, src_copy, img_copy, timestamp))
+
+    def invalidate(self):
+        """执行了键鼠操作，丢弃此前开始截的帧"""
+        self._valid_after = time.perf_counter()
+        self._slot.clear()
+
+    def next_frame(self, timeout: float | None = 5.0) -> Frame | None:
+        """最新的一帧，跳过 invalidate 之前开始截的帧；超时返回None。取走后后台线程开始截下一帧"""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while not self._stop_event.is_set():
+            self._request.set()  # invalidate 丢弃了预先截的帧时，需要重新截
+            remaining = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            frame = self._slot.get(remaining)
+            if frame is None:
+                return None
+            self._request.set()
+            if frame.timestamp >= self._valid_after:
+                return frame
+            self.stale += 1
+        return None
+
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="Parallel")
+        return _executor
+
+
+def parallel(*funcs: Callable[[], T]) -> list[T]:
+    """
+    同时执行多个无参函数，按顺序返回结果；第一个在当前线程执行，其余提交到线程池
+    任一函数抛出异常时等其余执行完后抛出
+    """
+    if len(funcs) <= 1:
+        return [func() for func in funcs]
+    futures = [_get_executor().submit(func) for func in funcs[1:]]
+    try:
+        first = funcs[0]()
+    finally:
+        results = [future.result() for future in futures] if futures else []
+    return [first, *results]
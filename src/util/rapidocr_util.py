@@ -1,11 +1,15 @@
 import logging
+from pathlib import Path
 
 import numpy as np
 from rapidocr import RapidOCR, VisRes
+from rapidocr.ch_ppocr_rec import TextRecInput
+from rapidocr.inference_engine.onnxruntime import OrtInferSession
 from rapidocr.utils import RapidOCROutput
 from tqdm import tqdm
 
-from src.util import file_util, img_util
+from src.util import file_util, img_util, onnx_util
+from src.util.onnx_util import OrtProfile
 
 logger = logging.getLogger(__name__)
 
@@ -38,7 +42,62 @@ _GPU_PADDLEPADDLE_PARAMS = {
 }
 
 
-def create_ocr(*, use_gpu: bool = False, use_dml=False) -> RapidOCR:
+# RapidOCR 的 onnxruntime 会话选项只能配置线程数，其余为以下固定值，配置与之不同时按配置重建会话
+_RAPIDOCR_SESSION_OPTIONS = {
+    "graph_optimization_level": "all",
+    "execution_mode": "sequential",
+    "enable_cpu_mem_arena": False,
+    "enable_mem_pattern": True,
+}
+# RapidOCR 的模型：任务类型 -> 参数前缀，语言均为默认的 ch_mobile
+_RAPIDOCR_TASKS = {"det": "Det", "cls": "Cls", "rec": "Rec"}
+
+
+class ProfileOrtInferSession(OrtInferSession):
+    """按 OrtProfile 的完整会话选项重建 onnxruntime 会话的 RapidOCR 推理会话"""
+
+    def __init__(self, origin: OrtInferSession, model_path: str, profile: OrtProfile):
+        """
+        :param origin: RapidOCR 创建的推理会话，沿用其配置与执行器，不再重复模型下载与执行器检查
+        :param model_path: 原始 onnx 模型路径
+        """
+        self.__dict__.update(origin.__dict__)
+        provider_options = origin.session.get_provider_options()
+        providers = [(name, provider_options.get(name, {})) for name in origin.session.get_providers()]
+        self.session = onnx_util.create_session(model_path, providers, profile, log_severity_level=4)
+
+
+def _default_model_path(task_type: str) -> str | None:
+    """RapidOCR 自带的默认模型路径，模型尚未下载时返回None"""
+    url = OrtInferSession.get_model_url("onnxruntime", task_type, "ch_mobile")
+    model_path = OrtInferSession.DEFAULT_MODE_PATH / Path(url).name
+    return str(model_path) if model_path.exists() else None
+
+
+def _profile_params(profile: OrtProfile, use_dml: bool) -> tuple[dict, dict[str, str]]:
+    """
+    会话选项中 RapidOCR 能配置的部分转成参数；开启模型缓存时改为加载优化后的模型，启动时不再做图优化
+    :return: 追加的参数，任务类型 -> 原始模型路径
+    """
+    params = {}
+    if profile.intra_op_num_threads > 0:
+        params["EngineConfig.onnxruntime.intra_op_num_threads"] = profile.intra_op_num_threads
+    if profile.inter_op_num_threads > 0:
+        params["EngineConfig.onnxruntime.inter_op_num_threads"] = profile.inter_op_num_threads
+    model_paths = {}
+    for task_type, prefix in _RAPIDOCR_TASKS.items():
+        if (model_path := _default_model_path(task_type)) is None:
+            continue
+        model_paths[task_type] = model_path
+        if not use_dml and (cache_path := onnx_util.get_model_cache(model_path, profile, log_severity_level=4)):
+            params[f"{prefix}.model_path"] = cache_path
+    return params, model_paths
+
+
+def create_ocr(*, use_gpu: bool = False, use_dml=False, profile: OrtProfile | None = None) -> RapidOCR:
+    """
+    :param profile: onnxruntime 会话选项，为None时使用 RapidOCR 默认选项；使用 paddle 推理时无效
+    """
     # https://rapidai.github.io/RapidOCRDocs/main/install_usage/rapidocr/API/RapidOCR/#_1
     if use_gpu:
         params = _GPU_PADDLEPADDLE_PARAMS
@@ -46,15 +105,34 @@ def create_ocr(*, use_gpu: bool = False, use_dml=False) -> RapidOCR:
         params = _DML_PARAMS
     else:
         params = _CPU_PARAMS
+    model_paths = {}
+    if profile is not None and not use_gpu:
+        profile_params, model_paths = _profile_params(profile, use_dml)
+        params = {**params, **profile_params}
     engine = RapidOCR(
         params=params
     )  # 输入BGR
+    if model_paths and profile.model_dump(include=set(_RAPIDOCR_SESSION_OPTIONS)) != _RAPIDOCR_SESSION_OPTIONS:
+        for task_type, model_path in model_paths.items():
+            module = getattr(engine, f"text_{task_type}")
+            module.session = ProfileOrtInferSession(module.session, model_path, profile)
     # logger.debug(engine.text_det.session.session.get_provider_options())
     # sss = engine.text_det.session.session
     # logger.debug(engine.text_det.session.session.get_session_options())
     return engine
 
 
+def recognize(engine: RapidOCR, imgs: list[np.ndarray]) -> list[tuple[str, float]]:
+    """
+    只识别不检测，多张单行文本图一次送入识别模型，按 Rec.rec_batch_num 分批推理
+    :return: 与 imgs 一一对应的 (文本, 置信度)
+    """
+    if not imgs:
+        return []
+    output = engine.text_rec(TextRecInput(img=imgs, return_word_box=False))
+    return list(zip(output.txts, output.scores))
+
+
 # https://github.com/microsoft/onnxruntime/issues/13198#issuecomment-1554180044
 def model_warmup(engine: RapidOCR, batch_size: int = 1, min_size: int = 10, max_size: int = 20):
     """
@@ -0,0 +1,155 @@
+"""
+录制画面回放
+
+读取录制好的画面序列（图片目录或视频），按时间戳提供画面，用于无游戏窗口时离线运行任务、测量性能。
+图片目录按文件名排序，可选的 timestamps.txt 每行为“文件名 秒数”，没有时按固定帧率生成时间戳。
+"""
+import bisect
+import logging
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from src.util import img_util
+
+logger = logging.getLogger(__name__)
+
+IMG_SUFFIXES = (".png", ".jpg", ".jpeg", ".bmp")
+VIDEO_SUFFIXES = (".mp4", ".avi", ".mkv", ".mov")
+TIMESTAMPS_FILE = "timestamps.txt"
+
+
+class ReplayFinished(Exception):
+    """画面已全部回放完"""
+    pass
+
+
+class ReplayFrames:
+    """
+    画面序列
+
+    两种取帧方式：
+        逐帧：每次 next 返回下一帧，适合功能回放，结果可复现
+        实时：按第一次取帧以来经过的时间返回对应时间戳的帧，流程慢时会跳帧，与真实窗口一致，适合测量性能
+    """
+
+    def __init__(self, path: str | Path, fps: float = 30.0, realtime: bool = False, loop: bool = False):
+        """
+        :param path: 图片目录或视频文件
+        :param fps: 图片目录没有 timestamps.txt 时使用的帧率，视频使用自身帧率
+        :param realtime: 是否按实时取帧
+        :param loop: 回放完是否从头开始，否则抛出 ReplayFinished
+        """
+        self._path = Path(path)
+        self.realtime = realtime
+        self.loop = loop
+        self._fps = fps
+        self._video: cv2.VideoCapture | None = None
+        self._img_paths: list[Path] = []
+        self._timestamps: list[float] = []
+        if self._path.is_dir():
+            self._load_dir()
+        elif self._path.suffix.lower() in VIDEO_SUFFIXES:
+            self._open_video()
+        else:
+            raise FileNotFoundError(f"Not an image directory or video: {self._path}")
+        self.index = -1
+        self._frame: np.ndarray | None = None
+        self._start_time: float | None = None
+        # 当前帧是否已被 next 取走，current 只预读不取走
+        self._served = False
+
+    def _load_dir(self):
+        timestamps_path = self._path / TIMESTAMPS_FILE
+        if timestamps_path.exists():
+            for line in timestamps_path.read_text(encoding="utf-8").splitlines():
+                if not (line := line.strip()) or line.startswith("#"):
+                    continue
+                name, seconds = line.rsplit(maxsplit=1)
+                self._img_paths.append(self._path / name)
+                self._timestamps.append(float(seconds))
+        else:
+            self._img_paths = sorted(p for p in self._path.iterdir() if p.suffix.lower() in IMG_SUFFIXES)
+            self._timestamps = [i / self._fps for i in range(len(self._img_paths))]
+        if not self._img_paths:
+            raise FileNotFoundError(f"No image in {self._path}")
+        logger.debug("Replay frames: %s, count: %s", self._path, len(self._img_paths))
+
+    def _open_video(self):
+        self._video = cv2.VideoCapture(str(self._path))
+        if not self._video.isOpened():
+            raise FileNotFoundError(f"Cannot open video: {self._path}")
+        if (fps := self._video.get(cv2.CAP_PROP_FPS)) > 0:
+            self._fps = fps
+        logger.debug("Replay video: %s, fps: %s", self._path, self._fps)
+
+    @property
+    def timestamp(self) -> float:
+        """当前帧时间戳秒数"""
+        if self.index < 0:
+            return 0.0
+        if self._video is not None:
+            return self.index / self._fps
+        return self._timestamps[self.index]
+
+    def current(self) -> np.ndarray:
+        """当前帧，还没取过帧时预读第一帧"""
+        if self._frame is None:
+            return self._seek(0)
+        return self._frame
+
+    def next(self) -> np.ndarray:
+        if not self._served:
+            self._served = True
+            if not self.realtime:
+                return self._seek(max(self.index, 0))
+        if not self.realtime:
+            return self._seek(self.index + 1)
+        now = time.perf_counter()
+        if self._start_time is None:
+            self._start_time = now
+        seconds = now - self._start_time
+        if self._video is not None:
+            index = int(seconds * self._fps)
+        else:
+            index = bisect.bisect_right(self._timestamps, seconds) - 1
+            if index == self.index == len(self._timestamps) - 1:  # 最后一帧已经取过
+                index += 1
+        return self._seek(max(index, self.index, 0))
+
+    def _seek(self, index: int) -> np.ndarray:
+        """只能向后跳，跳过的视频帧只解码不转换"""
+        if index == self.index and self._frame is not None:
+            return self._frame
+        if self._video is not None:
+            for _ in range(index - self.index - 1):
+                self._video.grab()
+            ok, frame = self._video.read()
+            if not ok:
+                self._end()
+                return self._seek(0)
+        else:
+            if index >= len(self._img_paths):
+                self._end()
+                return self._seek(0)
+            frame = img_util.read_img(str(self._img_paths[index]), alpha=False)
+        self.index, self._frame = index, frame
+        return frame
+
+    def _end(self):
+        if not self.loop:
+            raise ReplayFinished(f"Replay finished: {self._path}")
+        logger.debug("Replay loop: %s", self._path)
+        if self._video is not None:
+            self._video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        self.index = -1
+        self._frame = None
+        self._start_time = None
+        self._served = False
+
+    def release(self):
+        if self._video is not None:
+            self._video.release()
+            self._video = None
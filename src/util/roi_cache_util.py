@@ -0,0 +1,212 @@
+"""
+模板匹配热区（ROI）缓存
+
+位置固定的图标（如全局UI图标）整图匹配一次后记住位置，之后只在该位置附近匹配。
+按缩放后（宽1280）的画面尺寸和模板分别缓存，位置也是缩放后画面的坐标，同一宽高比的不同分辨率共用缓存。
+缓存变化后延迟 SAVE_DELAY 秒在后台线程合并写入 temp/roi_cache.json，进程退出时再写一次，任务进程重启后不必重新整图匹配；
+进程被强制结束时最多丢失最后 SAVE_DELAY 秒内的变化，只是之后多一次整图匹配。
+缓存位置连续匹配失败时定期整图复查：图标换了位置则更新，仍找不到则降低可信度，低于下限后淘汰。
+安装脚本 scripts/rebuild_conda_env.ps1 最后会运行 python -m src.util.roi_cache_util，用 assets/screenshot 下的参考截图预先生成缓存；更新参考截图后可手动再运行一次。
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+from src.util import file_util
+
+logger = logging.getLogger(__name__)
+
+ROI_CACHE_FILE_NAME = "roi_cache.json"
+# 整图匹配分数高于该值才缓存位置
+PUT_CONFIDENCE = 0.9
+# 缓存位置连续匹配失败该次数后整图复查一次
+VERIFY_INTERVAL = 5
+# 复查仍找不到时可信度乘以该系数
+DECAY = 0.8
+# 可信度低于该值时淘汰
+EVICT_SCORE = 0.5
+# 缓存变化后延迟该秒数再写文件，期间的多次变化合并为一次写入
+SAVE_DELAY = 2.0
+
+
+class RoiEntry:
+    __slots__ = ("roi", "score", "misses")
+
+    def __init__(self, roi: tuple[int, int, int, int], score: float):
+        # 相对搜索区域的位置 (x1, y1, x2, y2)
+        self.roi = roi
+        # 可信度，初始为整图匹配分数
+        self.score = score
+        # 连续匹配失败次数，不保存
+        self.misses = 0
+
+
+def _resolution_key(resolution: tuple[int, ...]) -> str:
+    """缩放后画面的 shape[:2] -> 宽x高"""
+    return f"{resolution[1]}x{resolution[0]}"
+
+
+class RoiCache:
+
+    def __init__(self, path: str | None = None):
+        """
+        :param path: 缓存文件路径，为None时只在内存中缓存
+        """
+        self._path = path
+        self._lock = threading.Lock()
+        # "宽x高" -> 模板键 -> 缓存
+        self._entries: dict[str, dict[str, RoiEntry]] = {}
+        self._dirty = False
+        self._save_timer: threading.Timer | None = None
+        if path is not None:
+            self.load()
+            atexit.register(self.flush)
+
+    def get(self, resolution: tuple[int, ...], key: str) -> RoiEntry | None:
+        """
+        :param resolution: 缩放后画面的 shape[:2]
+        :param key: 模板键，同一模板在不同搜索区域使用时键需不同
+        """
+        entries = self._entries.get(_resolution_key(resolution))
+        return None if entries is None else entries.get(key)
+
+    def put(self, resolution: tuple[int, ...], key: str, roi: tuple[int, int, int, int], confidence: float) -> bool:
+        """整图匹配结果，分数足够高时缓存，返回是否缓存"""
+        if confidence < PUT_CONFIDENCE:
+            return False
+        roi = tuple(int(i) for i in roi)
+        with self._lock:
+            entries = self._entries.setdefault(_resolution_key(resolution), {})
+            entry = entries.get(key)
+            changed = entry is None or entry.roi != roi
+            entries[key] = RoiEntry(roi, float(confidence))
+        if changed:
+            logger.debug("Put roi cache: %s %s %s", _resolution_key(resolution), key, roi)
+            self._schedule_save()
+        return True
+
+    def hit(self, resolution: tuple[int, ...], key: str, confidence: float):
+        """缓存位置匹配成功，恢复可信度"""
+        with self._lock:  # 后台保存线程同时在读取
+            if (entry := self.get(resolution, key)) is not None:
+                entry.score = float(confidence)
+                entry.misses = 0
+
+    def miss(self, resolution: tuple[int, ...], key: str) -> bool:
+        """缓存位置匹配失败，返回是否需要整图复查"""
+        with self._lock:
+            if (entry := self.get(resolution, key)) is None:
+                return True
+            entry.misses += 1
+            return entry.misses % VERIFY_INTERVAL == 0
+
+    def decay(self, resolution: tuple[int, ...], key: str):
+        """整图复查仍找不到，降低可信度，过低时淘汰"""
+        with self._lock:
+            if (entry := self.get(resolution, key)) is None:
+                return
+            entry.score *= DECAY
+            if entry.score >= EVICT_SCORE:
+                return
+            self._entries.get(_resolution_key(resolution), {}).pop(key, None)
+        logger.debug("Evict roi cache: %s %s, score: %.3f", _resolution_key(resolution), key, entry.score)
+        self._schedule_save()
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._entries.values())
+
+    def load(self):
+        if self._path is None or not os.path.exists(self._path):
+            return
+        try:
+            data = json.loads(Path(self._path).read_text(encoding="utf-8"))
+            entries = {
+                resolution: {key: RoiEntry(tuple(item["roi"]), item["score"]) for key, item in items.items()}
+                for resolution, items in data.items()
+            }
+        except Exception:
+            logger.warning("读取热区缓存失败，重新生成: %s", self._path, exc_info=True)
+            return
+        with self._lock:
+            self._entries = entries
+        logger.debug("Load roi cache: %s entries", len(self))
+
+    def _schedule_save(self):
+        """延迟写入，不在匹配的调用线程中写文件"""
+        if self._path is None:
+            return
+        with self._lock:
+            self._dirty = True
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(SAVE_DELAY, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self):
+        """有未写入的变化时立即写入"""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if not self._dirty:
+                return
+            self._dirty = False
+        self.save()
+
+    def save(self):
+        """写入临时文件后替换，多个任务进程同时写入不会读到半个文件"""
+        if self._path is None:
+            return
+        with self._lock:
+            data = {
+                resolution: {key: {"roi": list(entry.roi), "score": round(entry.score, 4)}
+                             for key, entry in entries.items()}
+                for resolution, entries in self._entries.items() if entries
+            }
+        try:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            tmp_path = f"{self._path}.{os.getpid()}.tmp"
+            Path(tmp_path).write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+            os.replace(tmp_path, self._path)
+        except OSError:
+            logger.warning("保存热区缓存失败: %s", self._path, exc_info=True)
+
+
+_roi_cache: RoiCache | None = None
+
+
+def get_roi_cache() -> RoiCache:
+    """进程内共用，首次使用时读取缓存文件"""
+    global _roi_cache
+    if _roi_cache is None:
+        _roi_cache = RoiCache(file_util.get_temp(ROI_CACHE_FILE_NAME))
+    return _roi_cache
+
+
+def _collect_pages() -> list:
+    """各服务中开启了热区缓存的页面，只调用页面构建方法，页面动作不会执行，无需注入服务"""
+    from src.service.auto_pickup_service import AutoPickupServiceImpl
+    from src.service.auto_story_service import AutoStoryServiceImpl
+    from src.service.page_event_service import PageEventAbstractService
+
+    builder = object.__new__(AutoPickupServiceImpl)
+    pages = [getattr(builder, name)() for name in dir(PageEventAbstractService) if name.startswith("build_")]
+    story = object.__new__(AutoStoryServiceImpl)
+    story._story_pages = []
+    story._build_story_pages()
+    pages.extend(story._story_pages)
+    return [page for page in pages if any(i.open_roi_cache for i in page.targetImages + page.excludeImages)]
+
+
+def warm():
+    """用页面登记的参考截图预先生成热区缓存"""
+    count = sum(page.warm_roi_cache(get_roi_cache()) for page in _collect_pages())
+    print(f"roi cache: {count} entries warmed, {len(get_roi_cache())} total")
+
+
+if __name__ == '__main__':
+    warm()
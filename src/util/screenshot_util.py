@@ -1,14 +1,98 @@
 import ctypes
 import logging
+import time
+import tracemalloc
+from ctypes import wintypes
 
 import numpy as np
-import win32con
-import win32gui
-import win32ui
+
+try:
+    import win32con
+    import win32gui
+    import win32ui
+except ImportError:  # 非Windows平台，只能以回放模式运行，不会调用到截图函数
+    win32con = win32gui = win32ui = None
+
+from src.util.capture_util import GdiAdapter, Capturer
 
 logger = logging.getLogger(__name__)
 
 
+class Win32GdiAdapter(GdiAdapter):
+    """PrintWindow截图，DC与位图在窗口大小不变时持续复用"""
+
+    def __init__(self, hwnd):
+        self.hwnd = hwnd
+        self._hwnd_dc = None
+        self._mfc_dc = None
+        self._save_dc = None
+        self._save_bitmap = None
+        self._size: tuple[int, int] | None = None
+        # ROI用的内存DC与位图，按宽高缓存：{(w, h): (dc, bitmap)}
+        self._roi_dc_cache: dict[tuple[int, int], tuple] = {}
+        self._get_bitmap_bits = ctypes.windll.gdi32.GetBitmapBits
+        self._get_bitmap_bits.argtypes = [wintypes.HBITMAP, wintypes.LONG, wintypes.LPVOID]
+        self._get_bitmap_bits.restype = wintypes.LONG
+
+    def get_client_wh(self) -> tuple[int, int]:
+        left, top, right, bottom = win32gui.GetClientRect(self.hwnd)
+        return right - left, bottom - top
+
+    def create(self, width: int, height: int):
+        self._hwnd_dc = win32gui.GetWindowDC(self.hwnd)
+        self._mfc_dc = win32ui.CreateDCFromHandle(self._hwnd_dc)
+        self._save_dc = self._mfc_dc.CreateCompatibleDC()
+        self._save_bitmap = win32ui.CreateBitmap()
+        self._save_bitmap.CreateCompatibleBitmap(self._mfc_dc, width, height)
+        self._save_dc.SelectObject(self._save_bitmap)
+        self._size = (width, height)
+        bits_pixel = self._save_bitmap.GetInfo()['bmBitsPixel']
+        if bits_pixel != 32:
+            self.release()
+            raise NotImplementedError(f"不支持的颜色深度: {bits_pixel}位/像素")
+
+    def capture(self):
+        ctypes.windll.user32.PrintWindow(self.hwnd, self._save_dc.GetSafeHdc(), 3)
+
+    def read_bits(self, out: np.ndarray, x: int = 0, y: int = 0):
+        h, w = out.shape[:2]
+        if (x, y, w, h) == (0, 0, *self._size):
+            bitmap = self._save_bitmap
+        else:
+            # 只把ROI拷到同尺寸的小位图，读回内存的数据量与ROI大小一致
+            if (roi := self._roi_dc_cache.get((w, h))) is None:
+                roi_dc = self._mfc_dc.CreateCompatibleDC()
+                roi_bitmap = win32ui.CreateBitmap()
+                roi_bitmap.CreateCompatibleBitmap(self._mfc_dc, w, h)
+                roi_dc.SelectObject(roi_bitmap)
+                roi = self._roi_dc_cache[(w, h)] = (roi_dc, roi_bitmap)
+            roi_dc, bitmap = roi
+            roi_dc.BitBlt((0, 0), (w, h), self._save_dc, (x, y), win32con.SRCCOPY)
+        # 32位位图每行没有填充字节，直接写入预分配的BGRA缓冲，不经过bytes
+        copied = self._get_bitmap_bits(bitmap.GetHandle(), out.nbytes, out.ctypes.data)
+        if copied != out.nbytes:
+            raise OSError(f"GetBitmapBits copied {copied} of {out.nbytes} bytes")
+
+    def release(self):
+        for roi_dc, roi_bitmap in self._roi_dc_cache.values():
+            win32gui.DeleteObject(roi_bitmap.GetHandle())
+            roi_dc.DeleteDC()
+        self._roi_dc_cache = {}
+        if self._save_bitmap is not None:
+            win32gui.DeleteObject(self._save_bitmap.GetHandle())
+        if self._save_dc is not None:
+            self._save_dc.DeleteDC()
+        if self._mfc_dc is not None:
+            self._mfc_dc.DeleteDC()
+        if self._hwnd_dc is not None:
+            win32gui.ReleaseDC(self.hwnd, self._hwnd_dc)
+        self._hwnd_dc = self._mfc_dc = self._save_dc = self._save_bitmap = None
+
+
+def create_capturer(hwnd) -> Capturer:
+    return Capturer(Win32GdiAdapter(hwnd))
+
+
 def screenshot(hwnd, region: tuple[int, int, int, int] | None = None) -> np.ndarray:
     """ 截图，返回只读BGR图片 """
     if region is None:
@@ -120,3 +204,36 @@ def screenshot_bitblt(hwnd, region: tuple[int, int, int, int] | None = None) ->
     img = img[:, :, :3]
 
     return img
+
+
+def benchmark(hwnd, times: int = 100):
+    """对比每次新建GDI对象的 screenshot 与复用缓冲的 Capturer：每次调用耗时与内存分配"""
+
+    def _run(name: str, func):
+        func()  # 预热，Capturer首次调用会创建缓冲
+        latencies = []
+        alloc_bytes = []
+        tracemalloc.start()
+        for _ in range(times):
+            base, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            start_time = time.perf_counter()
+            # 下游 cvtColor/resize 需要连续内存，非连续视图在这里会再拷贝一次
+            np.ascontiguousarray(func())
+            latencies.append(time.perf_counter() - start_time)
+            alloc_bytes.append(tracemalloc.get_traced_memory()[1] - base)
+        tracemalloc.stop()
+        print(f"{name}: avg {np.mean(latencies) * 1000:.3f} ms, p95 {np.percentile(latencies, 95) * 1000:.3f} ms, "
+              f"alloc peak {np.mean(alloc_bytes) / 1024 / 1024:.2f} MB/call")
+
+    capturer = create_capturer(hwnd)
+    _run("screenshot", lambda: screenshot(hwnd))
+    _run("Capturer", capturer.capture)
+    capturer.release()
+
+
+if __name__ == '__main__':
+    from src.util import hwnd_util
+
+    hwnd_util.enable_dpi_awareness()
+    benchmark(hwnd_util.get_hwnd())
@@ -0,0 +1,172 @@
+"""
+ONNX Runtime 会话池
+
+按模型路径缓存 InferenceSession，多个调用方共用同一个会话；超出内存预算时按最近最少使用淘汰。
+可提前在后台线程创建下一个要用的模型的会话，切换模型时不必在主流程中同步等待。
+会话占用内存无法直接获取，按模型文件大小乘以系数估算。
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Callable
+
+from onnxruntime import InferenceSession
+
+logger = logging.getLogger(__name__)
+
+# 会话内存约为模型文件的倍数，含权重副本与推理缓冲
+MEMORY_FACTOR = 2.0
+
+
+class SessionPool:
+
+    def __init__(self, factory: Callable[[str], InferenceSession], memory_budget: int = 512 * 1024 * 1024,
+                 memory_factor: float = MEMORY_FACTOR):
+        """
+        :param factory: 按模型路径创建会话
+        :param memory_budget: 内存预算字节数，至少保留最近使用的一个会话
+        :param memory_factor: 会话内存 = 模型文件大小 * memory_factor
+        """
+        self._factory = factory
+        self._memory_budget = memory_budget
+        self._memory_factor = memory_factor
+        self._lock = threading.RLock()
+        # 模型路径 -> (会话, 估算内存)，最近使用的在末尾
+        self._sessions: OrderedDict[str, tuple[InferenceSession, int]] = OrderedDict()
+        # 正在后台创建的会话
+        self._loading: dict[str, Future] = {}
+        self._executor: ThreadPoolExecutor | None = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, model_path: str) -> InferenceSession:
+        """获取会话，正在预加载时等待预加载完成，否则同步创建"""
+        with self._lock:
+            if (item := self._sessions.get(model_path)) is not None:
+                self._sessions.move_to_end(model_path)
+                self.hits += 1
+                return item[0]
+            future = self._loading.get(model_path)
+            self.misses += 1
+        if future is not None:
+            logger.debug("Wait for preloading session: %s", model_path)
+            return future.result()
+        return self._load(model_path)
+
+    def preload(self, model_path: str) -> Future | None:
+        """后台创建会话，已缓存或正在创建时不重复创建"""
+        with self._lock:
+            if model_path in self._sessions:
+                return None
+            if (future := self._loading.get(model_path)) is not None:
+                return future
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="SessionPool")
+            future = self._loading[model_path] = self._executor.submit(self._load, model_path)
+            future.add_done_callback(partial(_log_preload_error, model_path))
+            logger.debug("Preload session: %s", model_path)
+            return future
+
+    def _load(self, model_path: str) -> InferenceSession:
+        start_time = time.perf_counter()
+        try:
+            session = self._factory(model_path)
+        finally:
+            with self._lock:
+                self._loading.pop(model_path, None)
+        memory = int(os.path.getsize(model_path) * self._memory_factor)
+        logger.debug("Session creation time: %.3f seconds, %s", time.perf_counter() - start_time, model_path)
+        with self._lock:
+            if (item := self._sessions.get(model_path)) is not None:  # 并发创建了同一个模型，用先创建好的
+                return item[0]
+            self._sessions[model_path] = (session, memory)
+            self._evict(keep=model_path)
+        return session
+
+    def _evict(self, keep: str):
+        while self.memory > self._memory_budget and len(self._sessions) > 1:
+            model_path = next(iter(self._sessions))
+            if model_path == keep:
+                self._sessions.move_to_end(model_path)
+                model_path = next(iter(self._sessions))
+            self._sessions.pop(model_path)
+            self.evictions += 1
+            logger.debug("Evict session: %s", model_path)
+
+    @property
+    def memory(self) -> int:
+        """已缓存会话的估算内存字节数"""
+        with self._lock:
+            return sum(memory for _, memory in self._sessions.values())
+
+    def __contains__(self, model_path: str) -> bool:
+        with self._lock:
+            return model_path in self._sessions
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def _log_preload_error(model_path: str, future: Future):
+    """预加载失败时没有调用方取结果，在这里输出异常，之后 get 会重新同步创建"""
+    if not future.cancelled() and (error := future.exception()) is not None:
+        logger.error("预加载会话失败: %s", model_path, exc_info=error)
+
+
+def _create_tiny_model(path: str, size: int = 64):
+    """生成一个很小的 ONNX 模型（一次矩阵乘），用于在CPU上验证会话池，需要安装 onnx"""
+    import numpy as np
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+
+    weight = numpy_helper.from_array(np.random.rand(size, size).astype(np.float32), name="weight")
+    graph = helper.make_graph(
+        [helper.make_node("MatMul", ["input", "weight"], ["output"])],
+        "tiny",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, [1, size])],
+        [helper.make_tensor_value_info("output", TensorProto.FLOAT, [1, size])],
+        initializer=[weight],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, path)
+
+
+def _demo():
+    """三个小模型、预算只够两个，验证复用、淘汰与预加载"""
+    import tempfile
+    from src.util import yolo_util
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = [os.path.join(temp_dir, f"tiny_{i}.onnx") for i in range(3)]
+        for path in paths:
+            _create_tiny_model(path)
+        model_memory = int(os.path.getsize(paths[0]) * MEMORY_FACTOR)
+        pool = SessionPool(lambda path: yolo_util.create_ort_session(path, providers=["CPUExecutionProvider"]),
+                           memory_budget=model_memory * 2)
+        assert pool.get(paths[0]) is pool.get(paths[0])
+        pool.preload(paths[1]).result()
+        assert paths[1] in pool and pool.misses == 1
+        pool.get(paths[2])
+        assert paths[0] not in pool and len(pool) == 2 and pool.evictions == 1
+        pool.shutdown()
+        print(f"hits: {pool.hits}, misses: {pool.misses}, evictions: {pool.evictions}, memory: {pool.memory} bytes")
+
+
+if __name__ == '__main__':
+    _demo()
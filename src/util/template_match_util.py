@@ -0,0 +1,304 @@
+"""
+模板匹配
+
+模板读取后转为灰度图缓存，带透明区域的模板同时缓存Alpha掩码；画面的灰度图由调用方按帧共用，
+同一帧匹配多个模板时只转换一次灰度。结果与 img_util.match_template 相同：(confidence, (x1, y1, x2, y2))
+
+金字塔匹配：先在缩小的画面上找出几个候选峰值，再只在候选点附近的小窗口内用原尺寸精确匹配，
+整图搜索时耗时约为全尺寸匹配的几分之一。缩小倍数按模板尺寸自动选择，模板太小或搜索区域太小时直接全尺寸匹配。
+多尺度：模板按 1280x720 截取，其他分辨率的画面按比例缩放模板（结果缓存），不缩放整张画面。
+"""
+import logging
+from typing import Sequence
+
+import cv2
+import numpy as np
+
+from src.util import file_util, img_util
+
+logger = logging.getLogger(__name__)
+
+MatchResult = tuple[float, tuple[int, int, int, int]]
+
+# 模板截取时的画面宽度
+BASE_WIDTH = 1280
+# 金字塔最大缩小倍数
+PYRAMID_MAX_FACTOR = 4
+# 缩小后模板短边不小于该值，否则特征太少，粗匹配不可靠
+PYRAMID_MIN_SIDE = 8
+# 粗匹配的候选峰值数
+PYRAMID_CANDIDATES = 3
+
+
+class Template:
+    """预处理后的模板"""
+
+    __slots__ = ("name", "gray", "mask", "w", "h", "_scaled", "_coarse")
+
+    def __init__(self, img: np.ndarray | None, name: str | None = None):
+        """
+        :param img: BGR/BGRA 模板图片
+        """
+        self.name = name
+        self._scaled: dict[float, Template] = {}
+        self._coarse: dict[int, Template] = {}
+        if img is None:
+            return
+        self.gray: np.ndarray = img_util.bgr2gray(img)
+        # 全不透明的Alpha通道不需要掩码，结果与不带掩码相同且更快
+        self.mask: np.ndarray | None = None
+        if img.ndim == 3 and img.shape[2] == 4 and (img[:, :, 3] < 255).any():
+            self.mask = np.ascontiguousarray(img[:, :, 3])
+        self.h, self.w = self.gray.shape[:2]
+
+    @classmethod
+    def _resized(cls, template: "Template", w: int, h: int) -> "Template":
+        interpolation = cv2.INTER_AREA if w < template.w else cv2.INTER_LINEAR
+        resized = cls(None, template.name)
+        resized.gray = cv2.resize(template.gray, (w, h), interpolation=interpolation)
+        resized.mask = None if template.mask is None else cv2.resize(
+            template.mask, (w, h), interpolation=cv2.INTER_NEAREST)
+        resized.h, resized.w = h, w
+        return resized
+
+    def scaled(self, scale: float) -> "Template":
+        """按画面与 BASE_WIDTH 的比例缩放后的模板"""
+        if scale == 1.0:
+            return self
+        if (template := self._scaled.get(scale)) is None:
+            w, h = max(1, round(self.w * scale)), max(1, round(self.h * scale))
+            template = self._scaled[scale] = Template._resized(self, w, h)
+        return template
+
+    def pyramid_factor(self) -> int:
+        """粗匹配缩小倍数，1 表示模板太小不做金字塔匹配"""
+        factor = PYRAMID_MAX_FACTOR
+        while factor > 1 and min(self.w, self.h) // factor < PYRAMID_MIN_SIDE:
+            factor //= 2
+        return factor
+
+    def coarse(self, factor: int) -> "Template":
+        if (template := self._coarse.get(factor)) is None:
+            template = self._coarse[factor] = Template._resized(self, self.w // factor, self.h // factor)
+        return template
+
+
+def client_scale(width: int, base_width: int = BASE_WIDTH) -> float:
+    """画面宽度相对模板截取宽度的缩放比例，保留两位小数以便复用缓存的缩放模板"""
+    return round(width / base_width, 2)
+
+
+def _match(gray: np.ndarray, template: Template) -> tuple[np.ndarray, float, tuple[int, int]]:
+    result = cv2.matchTemplate(gray, template.gray, cv2.TM_CCOEFF_NORMED, mask=template.mask)
+    if template.mask is not None:  # 带掩码时平坦区域会得到 inf/nan
+        result = np.nan_to_num(result, nan=0.0, posinf=0.0, neginf=0.0)
+    _, max_val, _, max_loc = cv2.minMaxLoc(result)
+    return result, max_val, max_loc
+
+
+class TemplateMatcher:
+    """模板缓存与匹配"""
+
+    def __init__(self):
+        # 模板名 -> 模板
+        self._named: dict[str, Template] = {}
+        # id(图片) -> (图片, 模板)，持有图片引用，避免 id 被复用
+        self._arrays: dict[int, tuple[np.ndarray, Template]] = {}
+        # 最近一帧整图的缩小图：(灰度图, {缩小倍数: 缩小图})，同一帧多个模板共用
+        self._coarse_frame: tuple[np.ndarray, dict[int, np.ndarray]] | None = None
+
+    def get(self, template: str | np.ndarray | Template) -> Template:
+        """
+        :param template: assets/template 下的文件名，或已读取的模板图片
+        """
+        if isinstance(template, Template):
+            return template
+        if isinstance(template, str):
+            if (cached := self._named.get(template)) is None:
+                img = img_util.read_img(file_util.get_assets_template(template))
+                cached = self._named[template] = Template(img, template)
+            return cached
+        if (item := self._arrays.get(id(template))) is None or item[0] is not template:
+            item = self._arrays[id(template)] = (template, Template(template))
+        return item[1]
+
+    def match(self, gray: np.ndarray, template: str | np.ndarray | Template,
+              region: tuple[int, int, int, int] | None = None, scale: float = 1.0) -> MatchResult:
+        """
+        全尺寸匹配
+        :param gray: 画面灰度图
+        :param region: 搜索区域 (x1, y1, x2, y2)，返回的坐标相对该区域
+        :param scale: 模板缩放比例，见 client_scale
+        :return: 最高匹配分与位置；搜索区域比模板小时返回 (0.0, (0, 0, 0, 0))
+        """
+        template = self.get(template).scaled(scale)
+        if region is not None:
+            gray = gray[region[1]:region[3], region[0]:region[2]]
+        if gray.shape[0] < template.h or gray.shape[1] < template.w:
+            return 0.0, (0, 0, 0, 0)
+        _, max_val, max_loc = _match(gray, template)
+        return max_val, (max_loc[0], max_loc[1], max_loc[0] + template.w, max_loc[1] + template.h)
+
+    def _coarse_gray(self, gray: np.ndarray, factor: int, cache: bool) -> np.ndarray:
+        if not cache:
+            return cv2.resize(gray, (gray.shape[1] // factor, gray.shape[0] // factor), interpolation=cv2.INTER_AREA)
+        if self._coarse_frame is None or self._coarse_frame[0] is not gray:
+            self._coarse_frame = (gray, {})
+        levels = self._coarse_frame[1]
+        if (coarse := levels.get(factor)) is None:
+            coarse = levels[factor] = self._coarse_gray(gray, factor, False)
+        return coarse
+
+    def match_pyramid(self, gray: np.ndarray, template: str | np.ndarray | Template,
+                      region: tuple[int, int, int, int] | None = None, scale: float = 1.0,
+                      candidates: int = PYRAMID_CANDIDATES) -> MatchResult:
+        """
+        金字塔匹配，参数与结果同 match；模板太小或搜索区域不够大时退化为 match
+        :param candidates: 粗匹配后精确匹配的候选峰值数
+        """
+        template = self.get(template).scaled(scale)
+        factor = template.pyramid_factor()
+        search = gray if region is None else gray[region[1]:region[3], region[0]:region[2]]
+        search_h, search_w = search.shape[:2]
+        # 搜索区域与模板差不多大时，粗匹配省不了多少
+        if factor == 1 or search_h < template.h * 2 or search_w < template.w * 2:
+            return self.match(search, template)
+        coarse_template = template.coarse(factor)
+        # 整图搜索时缓存本帧的缩小图，同一帧的其他模板直接使用
+        coarse_gray = self._coarse_gray(search, factor, cache=region is None)
+        result, _, _ = _match(coarse_gray, coarse_template)
+
+        # 精确匹配窗口向四周多留出的像素，覆盖缩小带来的定位误差
+        margin = factor * 2
+        best_val, best_loc = -1.0, (0, 0)
+        for _ in range(candidates):
+            _, peak_val, _, peak_loc = cv2.minMaxLoc(result)
+            if peak_val <= -1.0:
+                break
+            x, y = peak_loc[0] * factor, peak_loc[1] * factor
+            x1, y1 = max(0, x - margin), max(0, y - margin)
+            x2 = min(search_w, x + template.w + margin + factor)
+            y2 = min(search_h, y + template.h + margin + factor)
+            if x2 - x1 >= template.w and y2 - y1 >= template.h:
+                _, max_val, max_loc = _match(search[y1:y2, x1:x2], template)
+                if max_val > best_val:
+                    best_val, best_loc = max_val, (x1 + max_loc[0], y1 + max_loc[1])
+            # 抑制该峰值附近，下一个候选取其他位置
+            px, py = peak_loc
+            result[max(0, py - coarse_template.h // 2):py + coarse_template.h // 2 + 1,
+                   max(0, px - coarse_template.w // 2):px + coarse_template.w // 2 + 1] = -1.0
+        if best_val < 0.0:
+            return self.match(search, template)
+        return best_val, (best_loc[0], best_loc[1], best_loc[0] + template.w, best_loc[1] + template.h)
+
+    def match_multi_scale(self, gray: np.ndarray, template: str | np.ndarray | Template, scales: Sequence[float],
+                          region: tuple[int, int, int, int] | None = None, pyramid: bool = True) -> MatchResult:
+        """按多个缩放比例匹配模板，返回分数最高的结果，用于画面比例不确定时"""
+        match = self.match_pyramid if pyramid else self.match
+        return max((match(gray, template, region, scale) for scale in scales), key=lambda result: result[0])
+
+    def match_many(self, gray: np.ndarray, templates: list[str | np.ndarray | Template],
+                   region: tuple[int, int, int, int] | None = None, scale: float = 1.0,
+                   pyramid: bool = False) -> list[MatchResult]:
+        """同一帧匹配多个模板，按顺序返回每个模板的结果"""
+        match = self.match_pyramid if pyramid else self.match
+        return [match(gray, template, region, scale) for template in templates]
+
+
+# 进程内共用
+_matcher = TemplateMatcher()
+
+
+def get_matcher() -> TemplateMatcher:
+    return _matcher
+
+
+def _synthetic_frame(rng: np.random.Generator, templates: list[np.ndarray], width: int = BASE_WIDTH,
+                     height: int = 720) -> np.ndarray:
+    """模拟游戏画面：渐变背景、随机色块、噪声，随机贴上若干模板作为干扰"""
+    x = np.linspace(0, 1, width, dtype=np.float32)
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    base = (60 + 80 * x + 60 * y)[..., None] * rng.uniform(0.6, 1.0, 3).astype(np.float32)
+    frame = np.clip(base, 0, 255).astype(np.uint8)
+    for _ in range(40):
+        x1, y1 = int(rng.integers(0, width - 40)), int(rng.integers(0, height - 40))
+        w, h = int(rng.integers(10, 200)), int(rng.integers(10, 120))
+        frame[y1:y1 + h, x1:x1 + w] = rng.integers(0, 256, 3)
+    frame = np.clip(frame + rng.normal(0, 6, frame.shape), 0, 255).astype(np.uint8)
+    for template in templates:
+        h, w = template.shape[:2]
+        x1, y1 = int(rng.integers(0, width - w)), int(rng.integers(0, height - h))
+        frame[y1:y1 + h, x1:x1 + w] = template[:, :, :3]
+    return frame
+
+
+def benchmark(frames: int = 20, threshold: float = 0.8):
+    """
+    与 img_util.match_template 对比 assets/template 下模板的整图匹配耗时与结果
+    每帧贴入目标模板（阳性）或不贴（阴性），校验阳性位置一致、阈值判断一致
+    另用 1920x1080 画面对比：缩放整张画面后匹配 vs 缩放模板多尺度匹配
+    """
+    import os
+    import time
+
+    rng = np.random.default_rng(0)
+    names = sorted(os.listdir(file_util.get_assets_template("")))
+    imgs = {name: img_util.read_img(file_util.get_assets_template(name)) for name in names}
+    matcher = TemplateMatcher()
+    for name in names:
+        template = matcher.get(name)
+        others = [imgs[other] for other in rng.choice(names, 4) if other != name]
+        cases = []
+        for i in range(frames):
+            positive = i % 2 == 0
+            frame = _synthetic_frame(rng, others)
+            expected_pos = None
+            if positive:
+                h, w = template.h, template.w
+                x1, y1 = int(rng.integers(0, frame.shape[1] - w)), int(rng.integers(0, frame.shape[0] - h))
+                frame[y1:y1 + h, x1:x1 + w] = imgs[name][:, :, :3]
+                expected_pos = (x1, y1, x1 + w, y1 + h)
+            cases.append((frame, expected_pos))
+
+        def run(func) -> tuple[float, list[MatchResult]]:
+            results = []
+            start = time.perf_counter()
+            for frame, _ in cases:
+                results.append(func(frame))
+            return (time.perf_counter() - start) * 1000 / len(cases), results
+
+        full_ms, full_results = run(lambda frame: img_util.match_template(frame, imgs[name]))
+        # 灰度图按帧共用，不计入各自耗时
+        grays = {id(frame): img_util.bgr2gray(frame) for frame, _ in cases}
+        pyramid_ms, pyramid_results = run(lambda frame: matcher.match_pyramid(grays[id(frame)], name))
+        for (frame, expected_pos), full, pyramid in zip(cases, full_results, pyramid_results):
+            if (full[0] >= threshold) != (pyramid[0] >= threshold):
+                raise AssertionError(f"Threshold mismatch: {name}, full: {full}, pyramid: {pyramid}")
+            if expected_pos is not None and (full[1] != pyramid[1] or abs(full[0] - pyramid[0]) > 1e-4):
+                raise AssertionError(f"Position mismatch: {name}, full: {full}, pyramid: {pyramid}")
+        print(f"{name:<40} factor: {template.pyramid_factor()}, full: {full_ms:.3f} ms, "
+              f"pyramid: {pyramid_ms:.3f} ms ({full_ms / pyramid_ms:.1f}x)")
+
+    # 1920x1080 画面
+    scale = client_scale(1920)
+    for name in names:
+        frame_1280 = _synthetic_frame(rng, [imgs[name]])
+        frame = cv2.resize(frame_1280, (1920, 1080), interpolation=cv2.INTER_LINEAR)
+        expected = img_util.match_template(frame_1280, imgs[name])
+        start = time.perf_counter()
+        resized = img_util.match_template(img_util.resize_by_weight(frame, BASE_WIDTH), imgs[name])
+        resized_ms = (time.perf_counter() - start) * 1000
+        gray = img_util.bgr2gray(frame)
+        matcher.match_pyramid(gray, name, scale=scale)  # 生成缩放模板缓存
+        start = time.perf_counter()
+        scaled = matcher.match_pyramid(gray, name, scale=scale)
+        scaled_ms = (time.perf_counter() - start) * 1000
+        scaled_pos = tuple(round(v / scale) for v in scaled[1])
+        if scaled[0] < threshold or max(abs(a - b) for a, b in zip(scaled_pos, expected[1])) > 2:
+            raise AssertionError(f"Multi-scale mismatch: {name}, expected: {expected}, scaled: {scaled}")
+        print(f"1920x1080 {name:<30} resize frame: {resized[0]:.3f} {resized_ms:.3f} ms, "
+              f"scale template: {scaled[0]:.3f} {scaled_ms:.3f} ms")
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,143 @@
+"""
+自适应帧率调度
+
+按状态（空闲、战斗、吸收、剧情对话等）设定目标帧率，每帧处理完后只睡剩余的时间，处理耗时计入帧间隔。
+画面连续不变时逐步拉长间隔，最低降到 min_fps，画面一变立即恢复；执行操作或按键后短时间提高到 boost_fps。
+睡眠先用 time.sleep 睡到截止时间前 SPIN_SECONDS，再让出CPU自旋到截止时间，减小系统定时器粒度带来的抖动。
+实际帧间隔记入 metrics_util 的 interval 阶段，可从中得到实际帧率和抖动。
+"""
+import logging
+import math
+import time
+
+import numpy as np
+
+from src.util import frame_diff_util, metrics_util
+
+logger = logging.getLogger(__name__)
+
+IDLE = "idle"
+MOVING = "moving"
+FIGHT = "fight"
+ABSORBING = "absorbing"
+DIALOG = "dialog"
+
+# 截止时间前这么多秒改为自旋
+SPIN_SECONDS = 0.002
+# 画面连续不变这么多帧后开始降帧
+BACKOFF_AFTER = 3
+# 每多一帧不变，间隔乘以该系数
+BACKOFF_FACTOR = 1.5
+# 实际帧率、抖动的统计窗口帧数
+STATS_WINDOW = 120
+
+
+class TickScheduler:
+    """
+    使用：
+        scheduler = TickScheduler({IDLE: 15})
+        while running:
+            frame = capture()
+            scheduler.observe(frame.img)  # 可选，画面不变时降帧
+            if action(frame):
+                scheduler.boost()
+            scheduler.wait()
+    """
+
+    def __init__(self, rates: dict[str, float], state: str | None = None, min_fps: float = 2.0,
+                 boost_fps: float | None = None, boost_seconds: float = 1.0, diff_threshold: float = 1.0):
+        """
+        :param rates: 状态 -> 目标帧率
+        :param state: 初始状态，默认为 rates 的第一个
+        :param min_fps: 画面不变时最低降到的帧率，不高于状态帧率
+        :param boost_fps: 操作后的帧率，默认为各状态中的最高帧率
+        :param boost_seconds: 操作后提高帧率的持续秒数
+        :param diff_threshold: 画面变化阈值，见 frame_diff_util
+        """
+        if not rates or min(rates.values()) <= 0:
+            raise ValueError(f"Invalid rates: {rates}")
+        self.rates = dict(rates)
+        self.state = state if state is not None else next(iter(rates))
+        self.min_fps = min_fps
+        self.boost_fps = boost_fps if boost_fps is not None else max(rates.values())
+        self.boost_seconds = boost_seconds
+        self.diff_threshold = diff_threshold
+
+        self._boost_until = 0.0
+        self._unchanged = 0
+        self._signature: np.ndarray | None = None
+        # 本帧开始时间，即上一帧的截止时间
+        self._tick_start: float | None = None
+        # 最近的实际帧间隔、与目标的偏差，环形
+        self._intervals = np.zeros(STATS_WINDOW, np.float64)
+        self._errors = np.zeros(STATS_WINDOW, np.float64)
+        self._count = 0
+
+    def set_state(self, state: str):
+        if state not in self.rates:
+            raise KeyError(f"Unknown state: {state}")
+        if state != self.state:
+            logger.debug("Tick state: %s -> %s", self.state, state)
+            self.state = state
+            self._unchanged = 0
+
+    def boost(self, seconds: float | None = None):
+        """操作后画面即将变化，短时间提高帧率，并取消降帧"""
+        self._boost_until = time.perf_counter() + (self.boost_seconds if seconds is None else seconds)
+        self._unchanged = 0
+
+    def pause(self):
+        """暂停期间（如窗口不在前台）不计入帧间隔，下一次 wait 重新开始计时"""
+        self._tick_start = None
+
+    def observe(self, img: np.ndarray) -> bool:
+        """记录本帧画面，返回与上一帧相比是否有变化"""
+        sig = frame_diff_util.signature(img)
+        changed = frame_diff_util.is_changed(self._signature, sig, self.diff_threshold)
+        self._signature = sig
+        self._unchanged = 0 if changed else self._unchanged + 1
+        return changed
+
+    def interval(self) -> float:
+        """当前的目标帧间隔秒数"""
+        if time.perf_counter() < self._boost_until:
+            return 1 / max(self.boost_fps, self.rates[self.state])
+        fps = self.rates[self.state]
+        if self._unchanged > BACKOFF_AFTER:
+            fps = max(min(self.min_fps, fps), fps / BACKOFF_FACTOR ** (self._unchanged - BACKOFF_AFTER))
+        return 1 / fps
+
+    def wait(self):
+        """睡到本帧开始后一个帧间隔，处理慢于目标时不睡，也不在之后补帧"""
+        now = time.perf_counter()
+        target = self.interval()
+        if self._tick_start is None:
+            self._tick_start = now
+            return
+        deadline = self._tick_start + target
+        if (remaining := deadline - now) > SPIN_SECONDS:
+            time.sleep(remaining - SPIN_SECONDS)
+        while (now := time.perf_counter()) < deadline:
+            time.sleep(0)
+        self._record(now - self._tick_start, target)
+        self._tick_start = now
+
+    def _record(self, interval: float, target: float):
+        index = self._count % STATS_WINDOW
+        self._intervals[index] = interval
+        self._errors[index] = interval - target
+        self._count += 1
+        metrics_util.get_metrics().record("interval", interval)
+
+    def stats(self) -> dict[str, float]:
+        """最近 STATS_WINDOW 帧的实际帧率、抖动（实际间隔与目标间隔之差的标准差）秒数"""
+        count = min(self._count, STATS_WINDOW)
+        if count == 0:
+            return {"fps": 0.0, "jitter": 0.0, "target_fps": 1 / self.interval()}
+        intervals = self._intervals[:count]
+        mean = float(intervals.mean())
+        return {
+            "fps": 1 / mean if mean > 0 else math.inf,
+            "jitter": float(self._errors[:count].std()),
+            "target_fps": 1 / self.interval(),
+        }
@@ -2,14 +2,28 @@ import functools
 import logging
 import time
 
+from src.util import metrics_util
+
 logger = logging.getLogger(__name__)
 
 # 记录每个函数的调用数据
 _func_stats = {}
 
+# 是否逐次输出耗时日志，频繁调用的函数每帧都会输出，默认关闭
+_log_enabled = False
+
+
+def set_log_enabled(enabled: bool):
+    global _log_enabled
+    _log_enabled = enabled
 
-def timeit(_func=None, *, ignore: int = 0):
-    """耗时计时器，分别计算每个函数的平均耗时（跳过前 ignore 次调用）"""
+
+def timeit(_func=None, *, ignore: int = 0, stage: str | None = None):
+    """
+    耗时计时器，分别计算每个函数的平均耗时（跳过前 ignore 次调用）
+    :param ignore: 前几次调用不计入平均值
+    :param stage: 阶段名，指定时耗时同时记入每帧耗时统计 metrics_util
+    """
 
     def decorator_timeit(func):
         @functools.wraps(func)
@@ -19,9 +33,15 @@ def timeit(_func=None, *, ignore: int = 0):
                 _func_stats[func] = {"count": 0, "total_time": 0.0}
 
             stats = _func_stats[func]
-            start_time = time.perf_counter()
-            result = func(*args, **kwargs)
-            end_time = time.perf_counter()
+            if stage is None:
+                start_time = time.perf_counter()
+                result = func(*args, **kwargs)
+                end_time = time.perf_counter()
+            else:
+                with metrics_util.stage(stage):
+                    start_time = time.perf_counter()
+                    result = func(*args, **kwargs)
+                    end_time = time.perf_counter()
 
             elapsed_time = end_time - start_time
             stats["count"] += 1
@@ -29,11 +49,12 @@ def timeit(_func=None, *, ignore: int = 0):
             # 从第 ignore+1 次调用开始计算平均耗时
             if stats["count"] > ignore:
                 stats["total_time"] += elapsed_time
-                avg_time = stats["total_time"] / (stats["count"] - ignore)
-                logger.debug(
-                    f"{func.__name__} 耗时: {elapsed_time:.6f} 秒, 第 {stats['count']} 次调用平均耗时: {avg_time:.6f} 秒")
-            else:
-                logger.debug(f"{func.__name__} 耗时: {elapsed_time:.6f} 秒 (第{stats['count']}次不计入平均值)")
+                if _log_enabled and logger.isEnabledFor(logging.DEBUG):
+                    avg_time = stats["total_time"] / (stats["count"] - ignore)
+                    logger.debug("%s 耗时: %.6f 秒, 第 %s 次调用平均耗时: %.6f 秒",
+                                 func.__name__, elapsed_time, stats["count"], avg_time)
+            elif _log_enabled and logger.isEnabledFor(logging.DEBUG):
+                logger.debug("%s 耗时: %.6f 秒 (第%s次不计入平均值)", func.__name__, elapsed_time, stats["count"])
             return result
 
         return wrapper
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from src.util.capture_util import Capturer, FakeGdiAdapter
+
+
+def test_buffer_reuse():
+    adapter = FakeGdiAdapter(wh=(320, 180))
+    capturer = Capturer(adapter, buffers=2)
+    first = capturer.capture()
+    second = capturer.capture()
+    third = capturer.capture()
+    # 两个缓冲轮流使用，上一次的结果在下一次截图后仍然有效
+    assert first is not second
+    assert third is first
+    assert adapter.create_count == 1
+    assert capturer.rebuild_count == 1
+
+
+def test_buffer_reuse_per_region():
+    adapter = FakeGdiAdapter(wh=(320, 180))
+    capturer = Capturer(adapter, buffers=1)
+    full = capturer.capture()
+    roi = capturer.capture((0, 0, 100, 50))
+    # 整窗与各个ROI各有一套缓冲，互不覆盖
+    assert capturer.capture() is full
+    assert capturer.capture((0, 0, 100, 50)) is roi
+    # 同尺寸的ROI共用缓冲，位置不同也会覆盖
+    assert capturer.capture((50, 50, 150, 100)) is roi
+    np.testing.assert_array_equal(roi, adapter.frame[50:100, 50:150, :3])
+    assert adapter.create_count == 1
+
+
+def test_rebuild_on_resize():
+    adapter = FakeGdiAdapter(wh=(320, 180))
+    capturer = Capturer(adapter)
+    old = capturer.capture()
+    adapter.frame = FakeGdiAdapter.gradient((640, 360))
+    img = capturer.capture()
+    assert img.shape == (360, 640, 3)
+    assert img is not old
+    assert capturer.rebuild_count == 2
+    assert adapter.create_count == 2
+    assert adapter.release_count == 1
+    capturer.release()
+    assert adapter.release_count == 2
+
+
+def test_invalid_buffers():
+    with pytest.raises(ValueError):
+        Capturer(FakeGdiAdapter(wh=(32, 18)), buffers=0)
+
+
+def test_result_is_read_only():
+    adapter = FakeGdiAdapter(wh=(320, 180))
+    capturer = Capturer(adapter)
+    img = capturer.capture()
+    assert not img.flags.writeable
+    with pytest.raises(ValueError):
+        img[0, 0] = 0
+    # 轮到该缓冲时截图器仍可写入
+    capturer.capture()
+    assert capturer.capture() is img
+    np.testing.assert_array_equal(img, adapter.frame[..., :3])
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from src.util.capture_util import Capturer, FakeGdiAdapter, clip_region
+
+
+def test_full_frame():
+    adapter = FakeGdiAdapter(wh=(320, 180))
+    img = Capturer(adapter).capture()
+    assert img.shape == (180, 320, 3)
+    assert img.flags.c_contiguous
+    np.testing.assert_array_equal(img, adapter.frame[..., :3])
+
+
+@pytest.mark.parametrize("region", [
+    (0, 0, 320, 180),
+    (10, 20, 110, 70),
+    (300, 170, 320, 180),
+    (250, 150, 400, 300),  # 超出客户区，裁到边界
+    (-5, -5, 30, 40),
+])
+def test_roi_crop(region):
+    adapter = FakeGdiAdapter(wh=(320, 180))
+    img = Capturer(adapter).capture(region)
+    x1, y1, x2, y2 = clip_region(region, (320, 180))
+    assert img.shape == (y2 - y1, x2 - x1, 3)
+    np.testing.assert_array_equal(img, adapter.frame[y1:y2, x1:x2, :3])
+
+
+def test_roi_coordinates_on_large_window():
+    # 渐变图的第三通道编码了 x // 256 与 y // 256，超过256的坐标也能校验
+    adapter = FakeGdiAdapter(wh=(1920, 1080))
+    img = Capturer(adapter).capture((1000, 600, 1300, 700))
+    np.testing.assert_array_equal(img[0, 0], [1000 % 256, 600 % 256, 1000 // 256 + 600 // 256 * 16])
+    np.testing.assert_array_equal(img, adapter.frame[600:700, 1000:1300, :3])
+
+
+def test_clip_region():
+    assert clip_region(None, (320, 180)) == (0, 0, 320, 180)
+    assert clip_region((400, 200, 500, 300), (320, 180)) == (319, 179, 320, 180)
+    assert clip_region((50, 50, 10, 10), (320, 180)) == (50, 50, 51, 51)